@@ -0,0 +1,84 @@
+# batch.py
+import argparse
+import asyncio
+import json
+from llm_client.batch_runner import BatchRunner
+from llm_client.clients.openai_client import client_factory
+from llm_client.clients.http_pool import close_all_clients
+from llm_client.core.config_loader import ConfigLoader
+from llm_client.core.logger import setup_logger
+from llm_client.core.tokenizer import get_tokenizer
+from llm_client.core.exceptions import LLMAppError
+import logging
+
+def print_report(report):
+    summary = report.as_dict()
+    latency, ttft = summary["latency_s"], summary["ttft_s"]
+    print("-" * 50)
+    print(f"完成: {report.completed}  失败: {report.failed}  跳过(已完成): {report.skipped}")
+    print(f"总耗时: {summary['wall_time_s']:.2f}s")
+    print(f"吞吐量: {summary['requests_per_second']:.2f} req/s, {summary['tokens_per_second']:.1f} tokens/s")
+    print(f"端到端延迟 (s): p50={latency['p50']:.3f}  p95={latency['p95']:.3f}  p99={latency['p99']:.3f}")
+    print(f"首Token延迟 (s): p50={ttft['p50']:.3f}  p95={ttft['p95']:.3f}  p99={ttft['p99']:.3f}")
+
+def main():
+    try:
+        config_loader = ConfigLoader(
+            app_config_path='configs/app_config.yaml',
+            models_config_path='configs/models_config.yaml'
+        )
+        app_config = config_loader.app_config
+        setup_logger(app_config.get('logging', {}))
+
+        model_choices = list(config_loader.models.keys())
+        parser = argparse.ArgumentParser(description="对JSONL文件中的请求进行并发批量推理")
+        parser.add_argument("input", type=str, help="输入JSONL文件，每行包含 messages 或 prompt 字段")
+        parser.add_argument("-o", "--output", type=str, required=True, help="输出JSONL文件")
+        parser.add_argument(
+            "-m", "--model", type=str, default=model_choices[0] if model_choices else None,
+            choices=model_choices, help="要使用的模型ID"
+        )
+        parser.add_argument("-r", "--role", type=str, default=None,
+                            choices=list(config_loader.instructions.keys()),
+                            help="为不含系统消息的请求添加的系统角色ID")
+        parser.add_argument("-c", "--concurrency", type=int, default=8, help="最大并发请求数")
+        parser.add_argument("--no-resume", action="store_true", help="忽略已有输出，从头开始运行")
+        parser.add_argument("--report-json", type=str, default=None, help="将汇总统计另存为JSON文件")
+        args = parser.parse_args()
+
+        if not args.model:
+            print("配置文件中未定义任何模型，程序无法启动。")
+            return
+
+        model_config = config_loader.get_model_config(args.model)
+        system_prompt = config_loader.get_instruction(args.role).template if args.role else None
+        client = client_factory(model_config, app_config.get('client', {}))
+        runner = BatchRunner(
+            client,
+            get_tokenizer(model_config.tokenizer),
+            system_prompt=system_prompt,
+            concurrency=args.concurrency
+        )
+
+        async def run_batch():
+            try:
+                return await runner.run(args.input, args.output, resume=not args.no_resume)
+            finally:
+                await client.close()
+                await close_all_clients()
+
+        report = asyncio.run(run_batch())
+        print_report(report)
+        if args.report_json:
+            with open(args.report_json, 'w', encoding='utf-8') as f:
+                json.dump(report.as_dict(), f, ensure_ascii=False, indent=2)
+
+    except LLMAppError as e:
+        print(f"\n[批处理启动失败]: {e}")
+        logging.basicConfig()
+        logging.critical(f"批处理启动失败: {e}", exc_info=True)
+    except KeyboardInterrupt:
+        print("\n批处理已中断，已完成的结果已写入输出文件，重新运行即可续跑。")
+
+if __name__ == "__main__":
+    main()
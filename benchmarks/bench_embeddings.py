@@ -0,0 +1,132 @@
+# benchmarks/bench_embeddings.py
+"""
+嵌入微批合并的基准。
+
+用法 (在项目根目录):
+    # 完全离线: 用 HashingEmbedder 加固定的每请求延迟模拟远程嵌入服务
+    python -m benchmarks.bench_embeddings --callers 64 --texts 4096
+
+    # 经由 OpenAICompatibleClient 请求本地替身服务器的 /v1/embeddings
+    python -m benchmarks.bench_embeddings --spawn-mock --callers 64 --texts 4096
+
+1. HashingEmbedder 在不同批大小下的编码吞吐量 (texts/s)。
+2. 多个并发调用方各自逐条请求嵌入时，不合并 (max_batch_size=1) 与微批合并两种情况下
+   的吞吐量、实际发送的请求数、平均批大小以及单次调用延迟。
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from benchmarks.load_test import spawn_mock_server
+from llm_client.clients.embeddings import HashingEmbedder, MicroBatcher
+from llm_client.clients.http_pool import close_all_clients
+from llm_client.clients.openai_client import client_factory
+from llm_client.core.config_loader import ConfigLoader, EmbeddingConfig
+from llm_client.core.stats import summarize
+
+SAMPLE_TEXT = "检索增强生成把与问题相关的文档片段拼接到提示词中，第 {i} 段介绍向量检索的基本流程。"
+
+
+def bench_encode(embedder: HashingEmbedder, total: int, batch_size: int) -> float:
+    texts = [SAMPLE_TEXT.format(i=i) for i in range(total)]
+    start = time.perf_counter()
+    for offset in range(0, total, batch_size):
+        embedder.encode(texts[offset:offset + batch_size])
+    return total / (time.perf_counter() - start)
+
+
+async def run_callers(embed, callers: int, total: int) -> Dict:
+    """callers 个调用方并发地逐条请求嵌入，直到一共完成 total 条。"""
+    latencies = []
+    counter = iter(range(total))
+
+    async def caller():
+        for i in counter:
+            start = time.perf_counter()
+            await embed([SAMPLE_TEXT.format(i=i)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    elapsed = time.perf_counter() - start
+    return {"texts_per_second": total / elapsed, "latency_ms": summarize(t * 1000 for t in latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入微批合并基准")
+    parser.add_argument("--callers", type=int, default=64, help="并发调用方数")
+    parser.add_argument("--texts", type=int, default=4096, help="总文本条数")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait", type=float, default=0.005, help="微批最长等待时间 (秒)")
+    parser.add_argument("--dim", type=int, default=256, help="HashingEmbedder 的维度")
+    parser.add_argument("--request-latency", type=float, default=0.01,
+                        help="离线模式下模拟的每个嵌入请求的固定开销 (秒)")
+    parser.add_argument("--spawn-mock", action="store_true", help="在子进程中启动替身服务器并经由客户端请求")
+    parser.add_argument("--model", type=str, default=None, help="models_config.yaml 中的模型ID，默认第一个")
+    parser.add_argument("--mock-port", type=int, default=8100)
+    args = parser.parse_args()
+    logging.getLogger("LLM_APP").setLevel(logging.ERROR)
+
+    embedder = HashingEmbedder(args.dim)
+    print(f"{'批大小':>8}{'编码吞吐 (texts/s)':>22}")
+    for batch_size in (1, 8, 64, 256):
+        print(f"{batch_size:>8}{bench_encode(embedder, args.texts, batch_size):>22,.0f}")
+
+    mock_process = None
+    if args.spawn_mock:
+        mock_args = argparse.Namespace(
+            mock_port=args.mock_port, mock_token_rate=0, mock_ttft=0.01, mock_chunk_size=8,
+            max_tokens=16, mock_error_rate=0.0,
+        )
+        mock_process = spawn_mock_server(mock_args, [
+            "--embedding-dim", str(args.dim), "--embed-latency", str(args.request_latency),
+        ])
+    try:
+        async def run_mode(max_batch_size: int) -> Dict:
+            if args.spawn_mock:
+                config_loader = ConfigLoader('configs/app_config.yaml', 'configs/models_config.yaml')
+                model_config = config_loader.get_model_config(args.model or next(iter(config_loader.models)))
+                api_base = f"http://127.0.0.1:{args.mock_port}/v1"
+                model_config = model_config.model_copy(update={
+                    "api_base": api_base, "api_bases": [api_base],
+                    "embedding": EmbeddingConfig(max_batch_size=max_batch_size, max_wait=args.max_wait),
+                })
+                client = client_factory(model_config, {"http": config_loader.app_config.get('client', {}).get('http')})
+                try:
+                    result = await run_callers(client.embed, args.callers, args.texts)
+                    result.update(client._embed_batcher.stats())
+                finally:
+                    await client.close()
+                    await close_all_clients()
+                return result
+
+            async def remote_batch(texts):
+                await asyncio.sleep(args.request_latency)
+                return embedder.encode(texts)
+
+            batcher = MicroBatcher(remote_batch, max_batch_size, args.max_wait)
+            result = await run_callers(batcher.embed, args.callers, args.texts)
+            result.update(batcher.stats())
+            return result
+
+        results = {
+            "不合并": asyncio.run(run_mode(1)),
+            f"微批 (<= {args.max_batch_size})": asyncio.run(run_mode(args.max_batch_size)),
+        }
+    finally:
+        if mock_process:
+            mock_process.terminate()
+            mock_process.wait()
+
+    target = "替身服务器" if args.spawn_mock else f"模拟服务 (每请求 {args.request_latency * 1000:.0f} ms)"
+    print(f"\n{args.callers} 个并发调用方逐条请求 {args.texts} 条文本，目标: {target}")
+    print(f"{'模式':<16}{'texts/s':>12}{'请求数':>10}{'平均批大小':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<16}{r['texts_per_second']:>12,.0f}{r['batches']:>10}{r['mean_batch_size']:>12.1f}"
+              f"{r['latency_ms']['p50']:>12.1f}{r['latency_ms']['p95']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
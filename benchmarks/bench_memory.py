@@ -0,0 +1,51 @@
+# benchmarks/bench_memory.py
+"""
+ConversationMemory 每轮开销的微基准。
+
+用法 (在项目根目录):
+    python -m benchmarks.bench_memory
+
+对不同长度的对话历史，测量一轮 (add_message + get_messages) 的平均耗时。
+增量Token计数后，每轮耗时应与历史长度基本无关。
+"""
+import argparse
+import logging
+import time
+
+from llm_client.core.memory import ConversationMemory
+
+SAMPLE_MESSAGE = "请解释一下 Python 中的异步生成器是如何工作的，并给出一个简单的例子。" * 4
+
+
+def bench_turns(history_len: int, turns: int, token_limit: int) -> float:
+    """返回在已有 history_len 条消息的记忆上，每轮的平均耗时 (微秒)。"""
+    memory = ConversationMemory("You are a helpful assistant.", token_limit=token_limit)
+    for i in range(history_len):
+        memory.add_message("user" if i % 2 == 0 else "assistant", SAMPLE_MESSAGE)
+
+    start = time.perf_counter()
+    for _ in range(turns):
+        memory.add_message("user", SAMPLE_MESSAGE)
+        memory.get_messages()
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ConversationMemory 每轮开销基准")
+    parser.add_argument("--turns", type=int, default=200, help="每个历史长度下测量的轮数")
+    parser.add_argument("--token-limit", type=int, default=3000, help="上下文Token限制")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    args = parser.parse_args()
+
+    # 窗口已满时每轮都会产生截断警告，基准测试中将其屏蔽
+    logging.getLogger("LLM_APP").setLevel(logging.ERROR)
+
+    print(f"{'历史消息数':>12} | {'每轮耗时 (us)':>14}")
+    print("-" * 30)
+    for size in args.sizes:
+        per_turn = bench_turns(size, args.turns, args.token_limit)
+        print(f"{size:>12} | {per_turn:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
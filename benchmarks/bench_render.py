@@ -0,0 +1,91 @@
+# benchmarks/bench_render.py
+"""
+流式渲染吞吐量基准: 测量终端UI每秒能处理多少个流式块。
+
+用法 (在项目根目录):
+    python -m benchmarks.bench_render --chunks 20000
+
+输出写入一个模拟终端 (内存缓冲区)，比较三种方式:
+  - legacy:   每个块调用一次 console.print 并做字符串拼接 (旧实现)
+  - plain:    StreamRenderer 纯文本模式，按帧率批量输出
+  - markdown: StreamRenderer 实时 Markdown 模式，只重绘末尾段落
+"""
+import argparse
+import io
+import time
+
+from rich.console import Console
+
+from llm_client.ui.cli import StreamRenderer
+
+PARAGRAPH = (
+    "流式渲染需要在高解码速率下保持终端输出的开销足够低。"
+    "This sentence is repeated to build a realistic **markdown** reply with `inline code`."
+)
+
+
+def make_chunks(count: int):
+    """生成类似模型输出的小块文本，每隔一段插入空行和代码块。"""
+    words = PARAGRAPH.split()
+    chunks = []
+    for i in range(count):
+        chunks.append(words[i % len(words)] + " ")
+        if i % 200 == 199:
+            chunks.append("\n\n")
+        if i % 1000 == 999:
+            chunks.append("```python\nprint('hello')\n```\n\n")
+    return chunks
+
+
+def make_console() -> Console:
+    return Console(file=io.StringIO(), force_terminal=True, width=120)
+
+
+def bench_legacy(chunks) -> float:
+    console = make_console()
+    start = time.perf_counter()
+    full_response = ""
+    for chunk in chunks:
+        console.print(chunk, end="")
+        full_response += chunk
+    console.print()
+    return time.perf_counter() - start
+
+
+def bench_renderer(chunks, markdown: bool, fps: float, decode_rate: float) -> float:
+    """decode_rate > 0 时按该速率 (块/秒) 模拟解码节奏，用于观察帧率上限下的开销。"""
+    console = make_console()
+    start = time.perf_counter()
+    with StreamRenderer(console, markdown=markdown, refresh_per_second=fps) as renderer:
+        for i, chunk in enumerate(chunks):
+            if decode_rate > 0:
+                target = start + i / decode_rate
+                while time.perf_counter() < target:
+                    pass
+            renderer.feed(chunk)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式渲染吞吐量基准")
+    parser.add_argument("--chunks", type=int, default=20000, help="流式块的数量")
+    parser.add_argument("--fps", type=float, default=20, help="StreamRenderer 的刷新帧率")
+    parser.add_argument("--decode-rate", type=float, default=0,
+                        help="模拟的解码速率 (块/秒)，0 表示尽可能快地送入")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    results = {
+        "legacy": bench_legacy(chunks),
+        "plain": bench_renderer(chunks, False, args.fps, args.decode_rate),
+        "markdown": bench_renderer(chunks, True, args.fps, args.decode_rate),
+    }
+
+    print(f"{'模式':<10} | {'耗时 (s)':>10} | {'块/秒':>12}")
+    print("-" * 40)
+    for name, elapsed in results.items():
+        print(f"{name:<10} | {elapsed:>10.3f} | {len(chunks) / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_startup.py
+"""
+客户端冷启动耗时基准，同时作为启动耗时的回归检查。
+
+用法 (在项目根目录):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20 --target-ms 400 --top 20
+
+1. 用 `python -X importtime` 导入 main.py，按顶层包汇总各模块的导入耗时，
+   并检查 openai、yaml、prometheus_client 等不应出现在启动路径上的模块是否被导入。
+2. 在全新的子进程中执行从解释器启动到可以接受第一条输入为止的步骤
+   (加载配置、创建客户端与对话记忆)，分别测量没有配置缓存和命中配置缓存时的墙钟耗时。
+
+命中配置缓存时的启动耗时中位数超过 --target-ms，或启动路径上出现了不应导入的模块时，
+以非零状态码退出，可直接接入 CI。
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from llm_client.core.stats import summarize
+
+# 这些模块只在发送第一个请求、使用 Markdown 渲染或启用指标端点时才需要
+DEFAULT_FORBIDDEN = ("openai", "httpx", "yaml", "prometheus_client", "markdown_it", "sqlite3")
+
+# 与 main.py 启动到第一个输入提示之前的步骤一致，但不进入交互循环
+STARTUP_SNIPPET = """
+import sys
+from llm_client.app import CommandLineApp
+from llm_client.clients.openai_client import client_factory
+from llm_client.core.config_loader import ConfigLoader
+from llm_client.core.storage import ConversationHistory
+
+loader = ConfigLoader('configs/app_config.yaml', 'configs/models_config.yaml', cache_path=sys.argv[1])
+model_id = next(iter(loader.models))
+app = CommandLineApp(loader, ConversationHistory(storage_dir=sys.argv[2]), loader.app_config.get('memory', {}))
+app.client = client_factory(loader.get_model_config(model_id), loader.app_config.get('client', {}))
+app.current_model_id = model_id
+app.memory = app._create_memory(loader.get_instruction('default').template)
+"""
+
+
+def import_breakdown(module: str) -> Tuple[List[Tuple[str, int]], Dict[str, int]]:
+    """
+    返回 (按顶层包汇总的自身导入耗时 (微秒)，降序; 各模块的累计导入耗时)。
+    按自身耗时汇总时各包之和等于总导入耗时，不会因嵌套导入重复计算。
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    by_package: Dict[str, int] = defaultdict(int)
+    cumulative: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        by_package[name.split(".")[0]] += int(self_us)
+        cumulative[name] = int(cumulative_us)
+    return sorted(by_package.items(), key=lambda item: item[1], reverse=True), cumulative
+
+
+def time_startup(cache_path: str, history_dir: str, keep_cache: bool) -> float:
+    """在新的子进程中执行一次启动，返回墙钟耗时 (毫秒)。"""
+    if not keep_cache and os.path.exists(cache_path):
+        os.remove(cache_path)
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", STARTUP_SNIPPET, cache_path, history_dir],
+        check=True, stdout=subprocess.DEVNULL,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="客户端冷启动耗时基准")
+    parser.add_argument("--runs", type=int, default=10, help="每种情况的启动次数")
+    parser.add_argument("--top", type=int, default=15, help="导入耗时明细中显示的包数")
+    parser.add_argument("--target-ms", type=float, default=500.0,
+                        help="命中配置缓存时启动耗时中位数的上限 (毫秒)，0 表示不检查")
+    parser.add_argument("--forbid", nargs="*", default=list(DEFAULT_FORBIDDEN),
+                        help="不应出现在启动路径上的模块")
+    args = parser.parse_args()
+
+    packages, cumulative = import_breakdown("main")
+    total_us = sum(us for _, us in packages)
+    print(f"导入 main.py 的耗时明细 (合计 {total_us / 1000:.1f} ms):")
+    print(f"{'包':<28}{'自身耗时 (ms)':>16}{'占比':>8}")
+    for name, us in packages[:args.top]:
+        print(f"{name:<28}{us / 1000:>16.1f}{us / total_us:>8.1%}")
+
+    failures = []
+    leaked = [name for name in args.forbid if name in cumulative]
+    for name in leaked:
+        failures.append(f"启动路径上导入了 {name} ({cumulative[name] / 1000:.1f} ms)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "config_cache.msgpack")
+        history_dir = os.path.join(tmp, "history")
+        cold = [time_startup(cache_path, history_dir, keep_cache=False) for _ in range(args.runs)]
+        warm = [time_startup(cache_path, history_dir, keep_cache=True) for _ in range(args.runs)]
+
+    print(f"\n{'启动 (墙钟)':<20}{'p50 (ms)':>12}{'p95 (ms)':>12}{'max (ms)':>12}")
+    for label, samples in (("无配置缓存", cold), ("命中配置缓存", warm)):
+        s = summarize(samples)
+        print(f"{label:<20}{s['p50']:>12.1f}{s['p95']:>12.1f}{s['max']:>12.1f}")
+
+    warm_p50 = summarize(warm)["p50"]
+    if args.target_ms and warm_p50 > args.target_ms:
+        failures.append(f"启动耗时中位数 {warm_p50:.1f} ms 超过目标 {args.target_ms:.0f} ms")
+
+    if failures:
+        print("\n未通过:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print(f"\n通过: 启动耗时中位数 {warm_p50:.1f} ms" + (f" (目标 {args.target_ms:.0f} ms)" if args.target_ms else ""))
+
+
+if __name__ == "__main__":
+    main()
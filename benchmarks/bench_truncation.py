@@ -0,0 +1,129 @@
+# benchmarks/bench_truncation.py
+"""
+比较 sliding 与 chunked 两种截断策略对前缀缓存命中率与首Token延迟的影响。
+
+用法 (在项目根目录):
+    # 启动带前缀缓存模拟的本地替身服务器并比较两种策略
+    python -m benchmarks.bench_truncation --spawn-mock --turns 60 --prefill-rate 2000
+
+    # 针对真实的 vLLM (需以 --enable-prefix-caching 启动) 比较
+    python -m benchmarks.bench_truncation --model qwen3-4b-local --turns 40
+
+每个策略各进行一段多轮对话。前缀缓存命中率由本地按与替身服务器相同的规则计算，
+首Token延迟为客户端实测值。
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from benchmarks.load_test import spawn_mock_server
+from benchmarks.mock_server import PrefixCache
+from llm_client.clients.http_pool import close_all_clients
+from llm_client.clients.openai_client import client_factory
+from llm_client.core.config_loader import ConfigLoader
+from llm_client.core.memory import ConversationMemory
+from llm_client.core.stats import summarize
+from llm_client.core.tokenizer import CharEstimateTokenizer
+
+USER_MESSAGE = "请继续介绍前缀缓存的工作原理，并补充一个与上文不同的例子。第 {turn} 轮。" * 6
+
+
+async def run_policy(client, policy: str, args) -> Dict:
+    tokenizer = CharEstimateTokenizer()  # 与替身服务器的Token估算一致
+    memory = ConversationMemory(
+        f"You are a helpful assistant. (benchmark: {policy})", args.token_limit, tokenizer,
+        truncation_policy=policy, low_watermark=args.low_watermark,
+    )
+    cache = PrefixCache(max_entries=100000)
+    ttfts, prompt_tokens, cached_tokens = [], 0, 0
+    for turn in range(args.turns):
+        memory.add_message("user", USER_MESSAGE.format(turn=turn))
+        messages = memory.get_messages()
+        counts = [tokenizer.count(m["content"]) for m in messages]
+        prompt_tokens += sum(counts)
+        cached_tokens += cache.lookup_and_insert(messages, counts)
+
+        start = time.perf_counter()
+        ttft: Optional[float] = None
+        parts = []
+        async for chunk in client.get_streaming_chat_completion(messages):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            parts.append(chunk)
+        ttfts.append(ttft)
+        reply = "".join(parts)
+        memory.add_message("assistant", reply)
+        # 把回复也计入缓存，与服务器在生成后保留 KV 的行为一致
+        cache.lookup_and_insert(messages + [memory.history[-1]], counts + [tokenizer.count(reply)])
+
+    # 前几轮窗口尚未填满，两种策略的行为相同，只统计窗口满后的轮次更能反映差异
+    return {
+        "ttft_ms": summarize(t * 1000 for t in ttfts[args.warmup_turns:]),
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "prefill_tokens": prompt_tokens - cached_tokens,
+        "cache_hit_rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截断策略与前缀缓存基准")
+    parser.add_argument("--model", type=str, default=None, help="models_config.yaml 中的模型ID，默认第一个")
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--warmup-turns", type=int, default=10, help="统计首Token延迟时跳过的前几轮")
+    parser.add_argument("--token-limit", type=int, default=3000)
+    parser.add_argument("--low-watermark", type=float, default=0.6)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--spawn-mock", action="store_true", help="在子进程中启动带前缀缓存模拟的替身服务器")
+    parser.add_argument("--mock-port", type=int, default=8100)
+    parser.add_argument("--prefill-rate", type=float, default=2000.0, help="替身服务器的预填充速度 (tokens/s)")
+    args = parser.parse_args()
+    logging.getLogger("LLM_APP").setLevel(logging.ERROR)
+
+    config_loader = ConfigLoader('configs/app_config.yaml', 'configs/models_config.yaml')
+    model_config = config_loader.get_model_config(args.model or next(iter(config_loader.models)))
+    updates = {"parameters": model_config.parameters.model_copy(update={"max_tokens": args.max_tokens})}
+    if args.spawn_mock:
+        api_base = f"http://127.0.0.1:{args.mock_port}/v1"
+        updates.update({"api_base": api_base, "api_bases": [api_base]})
+    model_config = model_config.model_copy(update=updates)
+    client_config = dict(config_loader.app_config.get('client', {}))
+    client_config["cache"] = {"enabled": False}
+
+    mock_process = None
+    if args.spawn_mock:
+        mock_args = argparse.Namespace(
+            mock_port=args.mock_port, mock_token_rate=0, mock_ttft=0.01, mock_chunk_size=8,
+            max_tokens=args.max_tokens, mock_error_rate=0.0,
+        )
+        mock_process = spawn_mock_server(mock_args, ["--prefill-rate", str(args.prefill_rate), "--prefix-cache"])
+    try:
+        async def run():
+            client = client_factory(model_config, client_config)
+            try:
+                return {policy: await run_policy(client, policy, args) for policy in ("sliding", "chunked")}
+            finally:
+                await client.close()
+                await close_all_clients()
+
+        results = asyncio.run(run())
+    finally:
+        if mock_process:
+            mock_process.terminate()
+            mock_process.wait()
+
+    print(f"{'策略':<10}{'缓存命中率':>12}{'prefill Token':>16}{'TTFT p50 (ms)':>16}{'TTFT p95 (ms)':>16}")
+    for policy, r in results.items():
+        print(f"{policy:<10}{r['cache_hit_rate']:>12.1%}{r['prefill_tokens']:>16}"
+              f"{r['ttft_ms']['p50']:>16.1f}{r['ttft_ms']['p95']:>16.1f}")
+    sliding, chunked = results["sliding"], results["chunked"]
+    if sliding["prefill_tokens"] and sliding["ttft_ms"]["p50"]:
+        print(f"\nchunked 相对 sliding: prefill Token减少 "
+              f"{1 - chunked['prefill_tokens'] / sliding['prefill_tokens']:.1%}，"
+              f"TTFT p50 降低 {1 - chunked['ttft_ms']['p50'] / sliding['ttft_ms']['p50']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_vector_store.py
+"""
+MmapVectorStore 的查询延迟与内存占用基准。
+
+用法 (在项目根目录):
+    python -m benchmarks.bench_vector_store --sizes 100000 1000000 --dim 384 --dtype float32
+    python -m benchmarks.bench_vector_store --sizes 100000 1000000 --dtype int8
+
+对每个规模，先用随机向量分批追加构建存储 (位于临时目录，结束后删除)，
+然后分别测量单条查询与批量查询的 top-k 延迟，以及进程常驻内存 (RSS)。
+1M x 384 的 float32 存储约占 1.5GB 磁盘空间。
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from llm_client.core.stats import summarize
+from llm_client.integrations.vector_store import MmapVectorStore
+
+
+def rss_mb() -> float:
+    """当前进程的常驻内存 (MB)，读取 /proc 以避免额外依赖。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_store(directory: str, size: int, dim: int, dtype: str, batch: int = 50000) -> float:
+    store = MmapVectorStore(directory, dim=dim, dtype=dtype)
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for offset in range(0, size, batch):
+        n = min(batch, size - offset)
+        vectors = rng.standard_normal((n, dim), dtype=np.float32)
+        store.add(vectors, [f"chunk-{offset + i}" for i in range(n)])
+    return time.perf_counter() - start
+
+
+def bench_queries(store: MmapVectorStore, dim: int, batch_size: int, rounds: int, k: int):
+    rng = np.random.default_rng(1)
+    latencies = []
+    for _ in range(rounds):
+        queries = rng.standard_normal((batch_size, dim), dtype=np.float32)
+        start = time.perf_counter()
+        store.search(queries, k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MmapVectorStore 查询延迟与RSS基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--dtype", choices=["float32", "int8"], default="float32")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32, help="批量查询的查询数")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"dim={args.dim} dtype={args.dtype} k={args.k}")
+    print(f"{'向量数':>10} | {'构建(s)':>8} | {'单查询 p50/p95 (ms)':>20} | "
+          f"{'批量x' + str(args.batch) + ' p50/p95 (ms)':>22} | {'RSS (MB)':>9}")
+    print("-" * 84)
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix="bench_vectors_")
+        try:
+            build_time = build_store(directory, size, args.dim, args.dtype)
+            # 重新打开存储，模拟冷启动后只通过内存映射访问
+            store = MmapVectorStore(directory)
+            rss_before = rss_mb()
+            single = bench_queries(store, args.dim, 1, args.rounds, args.k)
+            batched = bench_queries(store, args.dim, args.batch, args.rounds, args.k)
+            rss_after = rss_mb()
+            print(f"{size:>10} | {build_time:>8.1f} | {single['p50']:>9.1f} / {single['p95']:<8.1f} | "
+                  f"{batched['p50']:>10.1f} / {batched['p95']:<9.1f} | {rss_before:>4.0f}->{rss_after:<4.0f}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# benchmarks/load_test.py
+"""
+负载测试: 以可配置的并发驱动 client_factory 客户端与 ConversationMemory，
+统计吞吐量、延迟分位数以及本进程的 CPU 与内存占用，并将结果保存为JSON以便比较回归。
+
+用法 (在项目根目录):
+    # 自动启动本地替身服务器并压测
+    python -m benchmarks.load_test --spawn-mock --concurrency 64 --requests 2000
+
+    # 压测已有的服务器 (例如真实的 vLLM)
+    python -m benchmarks.load_test --model qwen3-4b-local --concurrency 16 --requests 200
+
+    # 与上一次的结果比较，任一关键指标劣化超过阈值时以非零状态码退出
+    python -m benchmarks.load_test --spawn-mock --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+
+from llm_client.clients.base_client import CLIENT_ERROR_PREFIX
+from llm_client.clients.http_pool import close_all_clients
+from llm_client.clients.openai_client import client_factory
+from llm_client.core.config_loader import ConfigLoader
+from llm_client.core.memory import ConversationMemory
+from llm_client.core.stats import summarize
+from llm_client.core.tokenizer import get_tokenizer
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+# 比较回归时检查的指标: (路径, 数值越大越好)
+COMPARED_METRICS = [
+    (("throughput", "requests_per_second"), True),
+    (("throughput", "tokens_per_second"), True),
+    (("ttft_ms", "p50"), False),
+    (("ttft_ms", "p99"), False),
+    (("e2e_ms", "p50"), False),
+    (("e2e_ms", "p99"), False),
+    (("client_cpu", "cpu_ms_per_request"), False),
+]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def spawn_mock_server(args, extra_args=()) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.mock_server",
+        "--port", str(args.mock_port),
+        "--token-rate", str(args.mock_token_rate),
+        "--ttft", str(args.mock_ttft),
+        "--chunk-size", str(args.mock_chunk_size),
+        "--max-tokens", str(args.max_tokens),
+        "--error-rate", str(args.mock_error_rate),
+        *extra_args,
+    ]
+    process = subprocess.Popen(command)
+    url = f"http://127.0.0.1:{args.mock_port}/health"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("替身服务器启动失败。")
+        try:
+            if requests.get(url, timeout=0.5).status_code == 200:
+                return process
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("等待替身服务器就绪超时。")
+
+
+class LoadGenerator:
+    """每个虚拟用户持有一份 ConversationMemory，进行多轮对话直到总请求数用完。"""
+
+    def __init__(self, client, tokenizer, system_prompt: str, token_limit: int,
+                 turns: int, prompt: str):
+        self.client = client
+        self.tokenizer = tokenizer
+        self.system_prompt = system_prompt
+        self.token_limit = token_limit
+        self.turns = turns
+        self.prompt = prompt
+        self.remaining = 0
+        self.ttfts: List[float] = []
+        self.latencies: List[float] = []
+        self.completion_tokens = 0
+        self.errors = 0
+
+    async def _user(self):
+        while self.remaining > 0:
+            memory = ConversationMemory(self.system_prompt, self.token_limit, self.tokenizer)
+            for turn in range(self.turns):
+                if self.remaining <= 0:
+                    return
+                self.remaining -= 1
+                memory.add_message("user", f"{self.prompt} (turn {turn})")
+                start = time.perf_counter()
+                ttft = None
+                parts = []
+                async for chunk in self.client.get_streaming_chat_completion(memory.get_messages(), memory.session_id):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    parts.append(chunk)
+                latency = time.perf_counter() - start
+                if not parts or parts[-1].startswith(CLIENT_ERROR_PREFIX):
+                    self.errors += 1
+                    break
+                before = memory.total_tokens
+                memory.add_message("assistant", "".join(parts))
+                self.ttfts.append(ttft)
+                self.latencies.append(latency)
+                self.completion_tokens += memory.total_tokens - before
+
+    async def run(self, total_requests: int, concurrency: int) -> Dict:
+        self.remaining = total_requests
+        cpu_start = time.process_time()
+        rss_start = rss_mb()
+        start = time.perf_counter()
+        await asyncio.gather(*(self._user() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        completed = len(self.latencies)
+        return {
+            "completed": completed,
+            "errors": self.errors,
+            "wall_time_s": wall,
+            "throughput": {
+                "requests_per_second": completed / wall if wall else 0.0,
+                "tokens_per_second": self.completion_tokens / wall if wall else 0.0,
+            },
+            "ttft_ms": summarize(t * 1000 for t in self.ttfts),
+            "e2e_ms": summarize(t * 1000 for t in self.latencies),
+            "client_cpu": {
+                "cpu_seconds": cpu,
+                "cpu_utilization": cpu / wall if wall else 0.0,
+                "cpu_ms_per_request": cpu * 1000 / completed if completed else 0.0,
+            },
+            "client_memory_mb": {"rss_start": rss_start, "rss_end": rss_mb()},
+        }
+
+
+def compare(result: Dict, baseline_path: str, threshold: float) -> bool:
+    """打印与基线的差异，返回是否存在超过阈值的劣化。"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["summary"]
+    regressed = False
+    print(f"\n与基线 {baseline_path} 比较 (阈值 {threshold:.0%}):")
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = baseline, result
+        for key in path:
+            old, new = old.get(key, {}), new.get(key, {})
+        if not isinstance(old, (int, float)) or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "劣化" if worse > threshold else ""
+        regressed = regressed or worse > threshold
+        print(f"  {'.'.join(path):<35} {old:>10.2f} -> {new:>10.2f} ({change:+.1%}) {flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 客户端负载测试")
+    parser.add_argument("--model", type=str, default=None, help="models_config.yaml 中的模型ID，默认第一个")
+    parser.add_argument("--api-base", type=str, default=None, help="覆盖模型配置中的 api_base")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=4, help="每个虚拟用户每段对话的轮数")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--token-limit", type=int, default=3000, help="ConversationMemory 的上下文Token限制")
+    parser.add_argument("--prompt", type=str, default="Write a short paragraph about load testing.")
+    parser.add_argument("--spawn-mock", action="store_true", help="在子进程中启动本地替身服务器")
+    parser.add_argument("--mock-port", type=int, default=8100)
+    parser.add_argument("--mock-token-rate", type=float, default=100.0)
+    parser.add_argument("--mock-ttft", type=float, default=0.05)
+    parser.add_argument("--mock-chunk-size", type=int, default=1)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", type=str, default=None, help="结果JSON路径，默认 benchmarks/results/<时间>.json")
+    parser.add_argument("--compare", type=str, default=None, help="用于比较的基线结果JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定回归的相对劣化阈值")
+    args = parser.parse_args()
+
+    config_loader = ConfigLoader('configs/app_config.yaml', 'configs/models_config.yaml')
+    model_id = args.model or next(iter(config_loader.models))
+    model_config = config_loader.get_model_config(model_id)
+    api_base = args.api_base or (f"http://127.0.0.1:{args.mock_port}/v1" if args.spawn_mock else None)
+    updates = {"parameters": model_config.parameters.model_copy(update={"max_tokens": args.max_tokens})}
+    if api_base:
+        updates.update({"api_base": api_base, "api_bases": [api_base]})
+    model_config = model_config.model_copy(update=updates)
+    client_config = dict(config_loader.app_config.get('client', {}))
+    client_config["cache"] = {"enabled": False}  # 缓存会掩盖真实的请求开销
+
+    mock_process: Optional[subprocess.Popen] = spawn_mock_server(args) if args.spawn_mock else None
+    try:
+        client = client_factory(model_config, client_config)
+        generator = LoadGenerator(
+            client, get_tokenizer(model_config.tokenizer),
+            config_loader.get_instruction("default").template if "default" in config_loader.instructions else "",
+            args.token_limit, args.turns, args.prompt,
+        )
+
+        async def run():
+            try:
+                return await generator.run(args.requests, args.concurrency)
+            finally:
+                await client.close()
+                await close_all_clients()
+
+        summary = asyncio.run(run())
+    finally:
+        if mock_process:
+            mock_process.terminate()
+            mock_process.wait()
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "model": model_id,
+        "api_base": model_config.api_base,
+        "summary": summary,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    ttft, e2e, cpu = summary["ttft_ms"], summary["e2e_ms"], summary["client_cpu"]
+    print(f"完成 {summary['completed']} 个请求 (错误 {summary['errors']})，耗时 {summary['wall_time_s']:.2f}s")
+    print(f"吞吐量: {summary['throughput']['requests_per_second']:.1f} req/s, "
+          f"{summary['throughput']['tokens_per_second']:.0f} tokens/s")
+    print(f"首Token延迟 (ms): p50={ttft['p50']:.1f} p95={ttft['p95']:.1f} p99={ttft['p99']:.1f}")
+    print(f"端到端延迟 (ms): p50={e2e['p50']:.1f} p95={e2e['p95']:.1f} p99={e2e['p99']:.1f}")
+    print(f"客户端CPU: {cpu['cpu_utilization']:.0%} ({cpu['cpu_ms_per_request']:.2f} ms/请求), "
+          f"RSS: {summary['client_memory_mb']['rss_start']:.0f} -> {summary['client_memory_mb']['rss_end']:.0f} MB")
+    print(f"结果已保存至: {output}")
+
+    if args.compare and compare(summary, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
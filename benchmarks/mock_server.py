@@ -0,0 +1,242 @@
+# benchmarks/mock_server.py
+"""
+本地的 OpenAI 兼容流式服务器替身，用于在没有 GPU / vLLM 的环境中测量框架自身的开销。
+
+用法 (在项目根目录):
+    python -m benchmarks.mock_server --port 8100 --token-rate 50 --ttft 0.2 --chunk-size 1 --error-rate 0.01
+
+提供以下接口:
+  - GET  /health
+  - GET  /v1/models
+  - POST /v1/chat/completions  (支持 stream=True 的 SSE 流与非流式响应)
+  - POST /v1/embeddings        (由本地 HashingEmbedder 计算，支持 float 与 base64 两种编码)
+
+生成的回复由固定词表循环组成，长度为请求的 max_tokens 与 --max-tokens 中的较小值。
+
+设置 --prefill-rate 后，首Token延迟额外包含 prompt Token数 / prefill-rate 的预填充时间；
+同时指定 --prefix-cache 时模拟 vLLM 的自动前缀缓存: 与之前请求逐条消息相同的前缀不再计入预填充，
+命中的Token数在 usage.prompt_tokens_details.cached_tokens 中返回。
+
+嵌入请求的延迟为 --embed-latency (每个请求的固定开销) 加上 文本条数 / --embed-rate。
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from llm_client.clients.embeddings import HashingEmbedder
+
+WORDS = ("the", " quick", " brown", " fox", " jumps", " over", " the", " lazy", " dog", ".")
+
+
+@dataclass
+class MockSettings:
+    token_rate: float = 50.0        # 每个请求的解码速度 (tokens/s)，0 表示不限速
+    ttft: float = 0.2               # 首Token延迟 (秒)
+    chunk_size: int = 1             # 每个SSE块包含的Token数
+    max_tokens: int = 256           # 单个回复的最大Token数
+    error_rate: float = 0.0         # 在流开始前返回错误的概率
+    error_status: int = 500         # 注入错误的 HTTP 状态码 (例如 429、503)
+    midstream_error_rate: float = 0.0  # 在流中途断开的概率
+    model_name: str = "mock-model"
+    prefill_rate: float = 0.0       # 预填充速度 (prompt tokens/s)，0 表示预填充不耗时
+    prefix_cache: bool = False      # 是否模拟前缀缓存
+    prefix_cache_entries: int = 100000  # 前缀缓存最多保存的前缀数 (LRU)
+    embedding_dim: int = 256        # 嵌入向量维度
+    embed_latency: float = 0.01     # 每个嵌入请求的固定开销 (秒)
+    embed_rate: float = 0.0         # 嵌入速度 (texts/s)，0 表示不计算耗时
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+
+class PrefixCache:
+    """
+    以消息为粒度的前缀缓存模拟: 对每个消息前缀计算链式哈希，
+    与之前某个请求的前缀逐条相同的部分视为命中。
+    (vLLM 以固定大小的Token块为粒度，这里以消息为粒度近似。)
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, None]" = OrderedDict()
+
+    def lookup_and_insert(self, messages, token_counts) -> int:
+        cached, hit = 0, True
+        digest = b""
+        for message, tokens in zip(messages, token_counts):
+            digest = hashlib.sha1(
+                digest + json.dumps([message.get("role"), message.get("content")]).encode()
+            ).digest()
+            if hit and digest in self._entries:
+                self._entries.move_to_end(digest)
+                cached += tokens
+                continue
+            hit = False
+            self._entries[digest] = None
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return cached
+
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI-Compatible Server")
+    prefix_cache = PrefixCache(settings.prefix_cache_entries) if settings.prefix_cache else None
+    embedder = HashingEmbedder(settings.embedding_dim)
+    # 流式请求计数: 客户端在生成结束前断开的请求计入 aborted，对应 vLLM 中止请求
+    streams = {"active": 0, "completed": 0, "aborted": 0}
+
+    def chunk_payload(request_id: str, content=None, finish_reason=None, usage=None):
+        choices = [] if usage else [{
+            "index": 0,
+            "delta": {"content": content} if content is not None else {},
+            "finish_reason": finish_reason,
+        }]
+        payload = {
+            "id": request_id, "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": settings.model_name, "choices": choices,
+        }
+        if usage:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "streams": streams}
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": settings.model_name, "object": "model", "owned_by": "mock"}]}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        if random.random() < settings.error_rate:
+            return JSONResponse(status_code=settings.error_status,
+                                content={"error": {"message": "injected error", "type": "server_error"}})
+        await asyncio.sleep(settings.embed_latency + (len(texts) / settings.embed_rate if settings.embed_rate else 0))
+        vectors = embedder.encode(texts)
+        if body.get("encoding_format") == "base64":
+            encoded = [base64.b64encode(v.astype("<f4").tobytes()).decode() for v in vectors]
+        else:
+            encoded = vectors.tolist()
+        prompt_tokens = sum(estimate_tokens(t) for t in texts)
+        return {
+            "object": "list", "model": body.get("model", settings.model_name),
+            "data": [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(encoded)],
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        token_counts = [estimate_tokens(m.get("content") or "") for m in messages]
+        prompt_tokens = sum(token_counts)
+        cached_tokens = prefix_cache.lookup_and_insert(messages, token_counts) if prefix_cache else 0
+        prefill = (prompt_tokens - cached_tokens) / settings.prefill_rate if settings.prefill_rate else 0.0
+        completion_tokens = min(body.get("max_tokens") or settings.max_tokens, settings.max_tokens)
+        tokens = [WORDS[i % len(WORDS)] for i in range(completion_tokens)]
+        if prefix_cache:
+            # 生成结果的 KV 同样会被缓存，下一轮带上这条回复的请求可以命中
+            reply = {"role": "assistant", "content": "".join(tokens)}
+            prefix_cache.lookup_and_insert(messages + [reply], token_counts + [completion_tokens])
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        request_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if random.random() < settings.error_rate:
+            return JSONResponse(status_code=settings.error_status,
+                                content={"error": {"message": "injected error", "type": "server_error"}})
+
+        if not body.get("stream"):
+            await asyncio.sleep(settings.ttft + prefill + (completion_tokens / settings.token_rate if settings.token_rate else 0))
+            return {
+                "id": request_id, "object": "chat.completion", "created": int(time.time()),
+                "model": settings.model_name,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "length"}],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        fail_at = random.randrange(completion_tokens) if random.random() < settings.midstream_error_rate else None
+
+        async def stream():
+            streams["active"] += 1
+            status = "aborted"
+            try:
+                await asyncio.sleep(settings.ttft + prefill)
+                start = time.perf_counter()
+                for i in range(0, completion_tokens, settings.chunk_size):
+                    if fail_at is not None and i >= fail_at:
+                        raise RuntimeError("injected mid-stream error")
+                    if settings.token_rate:
+                        # 按绝对时间对齐，避免 sleep 误差累积
+                        delay = start + i / settings.token_rate - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    yield chunk_payload(request_id, "".join(tokens[i:i + settings.chunk_size]))
+                yield chunk_payload(request_id, finish_reason="length")
+                if include_usage:
+                    yield chunk_payload(request_id, usage=usage)
+                yield "data: [DONE]\n\n"
+                status = "completed"
+            finally:
+                streams["active"] -= 1
+                streams[status] += 1
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地流式服务器替身")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="每个请求的解码速度 (tokens/s)，0 为不限速")
+    parser.add_argument("--ttft", type=float, default=0.2, help="首Token延迟 (秒)")
+    parser.add_argument("--chunk-size", type=int, default=1, help="每个SSE块包含的Token数")
+    parser.add_argument("--max-tokens", type=int, default=256, help="单个回复的最大Token数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="流开始前返回错误的概率")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误的 HTTP 状态码")
+    parser.add_argument("--midstream-error-rate", type=float, default=0.0, help="流中途断开的概率")
+    parser.add_argument("--model-name", type=str, default="mock-model")
+    parser.add_argument("--prefill-rate", type=float, default=0.0, help="预填充速度 (prompt tokens/s)，0 为不计预填充时间")
+    parser.add_argument("--prefix-cache", action="store_true", help="模拟推理服务器的自动前缀缓存")
+    parser.add_argument("--embedding-dim", type=int, default=256, help="嵌入向量维度")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="每个嵌入请求的固定开销 (秒)")
+    parser.add_argument("--embed-rate", type=float, default=0.0, help="嵌入速度 (texts/s)，0 为不计耗时")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        token_rate=args.token_rate, ttft=args.ttft, chunk_size=max(1, args.chunk_size),
+        max_tokens=args.max_tokens, error_rate=args.error_rate, error_status=args.error_status,
+        midstream_error_rate=args.midstream_error_rate, model_name=args.model_name,
+        prefill_rate=args.prefill_rate, prefix_cache=args.prefix_cache,
+        embedding_dim=args.embedding_dim, embed_latency=args.embed_latency, embed_rate=args.embed_rate,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
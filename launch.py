@@ -5,13 +5,44 @@ import signal
 import sys
 import os
 import argparse
-import requests
+import json
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from rich.console import Console
+from rich.table import Table
 from llm_client.core.config_loader import ConfigLoader
 from llm_client.core.exceptions import LLMAppError
 
-def stream_output(pipe, prefix, log_file):
+# vLLM (uvicorn) 启动完成时输出的日志行
+READY_MARKER = "Application startup complete."
+
+
+class StartupTimeline:
+    """记录启动过程中每个阶段的耗时，并在启动客户端前打印。"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, phase: str, detail: str = ""):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - self.start, detail))
+        self.last = now
+
+    def report(self, console: Console):
+        table = Table(title="[bold]启动耗时[/bold]")
+        table.add_column("阶段", style="cyan")
+        table.add_column("耗时 (s)", justify="right")
+        table.add_column("累计 (s)", justify="right")
+        table.add_column("说明")
+        for phase, duration, elapsed, detail in self.phases:
+            table.add_row(phase, f"{duration:.2f}", f"{elapsed:.2f}", detail)
+        console.print(table)
+
+
+def stream_output(pipe, prefix, log_file, ready_event: threading.Event = None):
     """从子进程的管道中读取输出，写入日志文件，并有选择地打印到控制台"""
     try:
         for line in iter(pipe.readline, ''):
@@ -19,6 +50,10 @@ def stream_output(pipe, prefix, log_file):
             if log_file:
                 log_file.write(line)
 
+            # 服务器打印启动完成的日志时立即通知等待方，不必等下一次健康检查
+            if ready_event is not None and READY_MARKER in line:
+                ready_event.set()
+
             # 过滤INFO级别日志
             line_upper = line.upper()
             if 'ERROR' in line_upper or 'WARNING' in line_upper:
@@ -28,9 +63,21 @@ def stream_output(pipe, prefix, log_file):
         print(f"Error streaming output from {prefix}: {e}")
 
 
-def start_vllm_server(model_path: str, host: str, port: int, log_file, 
-                        max_model_len: int = None, gpu_memory_utilization: float = 0.90):
-    """在后台启动VLLM服务器，并实时显示其日志"""
+def build_server_command(server_config: dict, model_path: str, host: str, port: int,
+                         max_model_len: int = None, gpu_memory_utilization: float = 0.90) -> list:
+    """
+    构造服务器启动命令。vllm_server.command 配置为列表时按其中的占位符
+    ({python} {model} {host} {port} {max_model_len} {gpu_memory_utilization}) 生成命令，
+    便于在没有GPU的环境中用替身进程测试；否则启动 vLLM 的 OpenAI 兼容服务器。
+    """
+    template = server_config.get("command")
+    if template:
+        values = {
+            "python": sys.executable, "model": model_path, "host": host, "port": port,
+            "max_model_len": max_model_len or "", "gpu_memory_utilization": gpu_memory_utilization,
+        }
+        return [str(part).format(**values) for part in template]
+
     command = [
         sys.executable,
         "-m", "vllm.entrypoints.openai.api_server",
@@ -43,15 +90,11 @@ def start_vllm_server(model_path: str, host: str, port: int, log_file,
     
     if max_model_len:
         command.extend(["--max-model-len", str(max_model_len)])
-    
-    print(f"🚀 正在后台启动VLLM服务器...")
-    print(f"   模型路径: {model_path}")
-    print(f"   监听地址: http://{host}:{port}")
-    if max_model_len:
-        print(f"   最大模型长度: {max_model_len} tokens")
-    print(f"   服务器日志将保存在: {log_file.name}") 
-    print("-" * 50)
+    return command
 
+
+def start_vllm_server(command: list, log_file, prefix: str = "VLLM"):
+    """在后台启动VLLM服务器，并实时显示其日志"""
     preexec_fn = os.setsid if sys.platform != "win32" else None
     
     server_process = subprocess.Popen(
@@ -65,33 +108,270 @@ def start_vllm_server(model_path: str, host: str, port: int, log_file,
         errors='replace'
     )
 
-    # 创建并启动线程
-    stdout_thread = threading.Thread(target=stream_output, args=(server_process.stdout, "VLLM-Server", log_file), daemon=True)
-    stderr_thread = threading.Thread(target=stream_output, args=(server_process.stderr, "VLLM-Error", log_file), daemon=True)
+    # 创建并启动线程 (uvicorn 的日志输出到 stderr，两个管道都监听启动完成的日志行)
+    ready_event = threading.Event()
+    stdout_thread = threading.Thread(target=stream_output, args=(server_process.stdout, f"{prefix}-Server", log_file, ready_event), daemon=True)
+    stderr_thread = threading.Thread(target=stream_output, args=(server_process.stderr, f"{prefix}-Error", log_file, ready_event), daemon=True)
     stdout_thread.start()
     stderr_thread.start()
 
-    return server_process
+    return server_process, ready_event
 
-def wait_for_server_ready(server_process, server_url, console: Console, timeout: int = 120):
-    """使用rich.status等待VLLM服务器准备就绪"""
-    with console.status("[bold yellow]⏳ 正在等待服务器响应...", spinner="dots12") as status:
+def wait_for_server_ready(server_process, server_url, console: Console = None, timeout: int = 120,
+                          ready_event: threading.Event = None):
+    """
+    使用rich.status等待VLLM服务器准备就绪，返回检测到就绪的方式 (未就绪时返回 None)。
+    健康检查的间隔从 50ms 开始指数增长到最多 1s；日志中出现启动完成的行时立即再检查一次。
+    console 为 None 时不显示等待动画 (由调用方统一显示)。
+    """
+    # requests 只在启动本地服务器时需要，远程模型直接启动客户端，不必承担其导入耗时
+    import requests
+
+    status_context = console.status("[bold yellow]⏳ 正在等待服务器响应...", spinner="dots12") if console else nullcontext()
+    with status_context as status:
         start_time = time.time()
-        
+        delay = 0.05
+
         while time.time() - start_time < timeout:
             if server_process.poll() is not None:
-                return False 
-                
+                return None
+
+            from_log = ready_event is not None and ready_event.is_set()
             try:
-                response = requests.get(server_url, timeout=2)
+                response = requests.get(server_url, timeout=1)
                 if response.status_code == 200:
-                    return True
+                    return "日志" if from_log else "健康检查"
             except requests.exceptions.RequestException:
                 pass
-            
-            time.sleep(2)
-            
-    return False
+
+            if from_log:
+                # 日志已报告启动完成但接口尚未响应，短间隔重试
+                time.sleep(0.05)
+            elif ready_event is not None:
+                ready_event.wait(delay)
+            else:
+                time.sleep(delay)
+            delay = min(delay * 1.5, 1.0)
+
+    return None
+
+def warm_up_server(api_base: str, model_name: str, prompts: list, max_tokens: int = 1,
+                   concurrency: int = 8, timeout: float = 60.0) -> int:
+    """
+    并发发送预热请求，使服务器完成首次请求的初始化并把这些前缀写入前缀缓存。
+    prompts 为消息列表的列表，返回成功的请求数。
+    """
+    import requests
+
+    url = f"{api_base.rstrip('/')}/chat/completions"
+
+    def send(messages) -> bool:
+        try:
+            response = requests.post(url, json={
+                "model": model_name, "messages": messages, "max_tokens": max_tokens, "temperature": 0,
+            }, timeout=timeout)
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(send, prompts))
+
+def build_warmup_prompts(config_loader: ConfigLoader, warmup_config: dict) -> list:
+    """按配置为每个角色的系统提示词 (以及额外的用户提示词) 构造预热请求。"""
+    roles = warmup_config.get('roles') or list(config_loader.instructions.keys())
+    user_prompts = warmup_config.get('prompts') or ["你好"]
+    prompts = []
+    for role in roles:
+        if role not in config_loader.instructions:
+            continue
+        system_prompt = config_loader.get_instruction(role).template
+        for user_prompt in user_prompts:
+            prompts.append([{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}])
+    return prompts
+
+class ServerReplica:
+    """一个服务器副本的进程与健康状态。"""
+
+    def __init__(self, index: int, port: int, api_base: str, log_path: str):
+        self.index = index
+        self.port = port
+        self.api_base = api_base
+        self.log_path = log_path
+        self.log_file = None
+        self.process = None
+        self.ready_event = None
+        self.healthy = False
+        self.restarts = 0
+        self.healthy_since = None
+        self.next_restart = None
+
+
+def kill_process_group(process):
+    """结束服务器进程及其所在进程组中的全部子进程。"""
+    if process is None or process.poll() is not None:
+        return
+    if sys.platform != "win32":
+        try:
+            os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    else:
+        process.terminate()
+
+
+class ReplicaSupervisor:
+    """
+    在连续端口上启动 N 个服务器副本并持续监控:
+    进程退出的副本按指数退避重启，健康副本列表变化时写入 endpoints_file 供客户端读取。
+    """
+
+    def __init__(self, command_factory, ports: list, health_host: str, log_dir: str,
+                 model_name: str, supervisor_config: dict = None):
+        supervisor_config = supervisor_config or {}
+        self.command_factory = command_factory
+        self.model_name = model_name
+        self.endpoints_file = supervisor_config.get("endpoints_file")
+        self.health_interval = supervisor_config.get("health_interval", 5.0)
+        self.restart_initial = supervisor_config.get("restart_backoff_initial", 1.0)
+        self.restart_max = supervisor_config.get("restart_backoff_max", 60.0)
+        # 副本持续健康超过该时间后重启计数清零，退避重新从初始值开始
+        self.stable_after = supervisor_config.get("stable_after", 60.0)
+        single = len(ports) == 1
+        self.replicas = [
+            ServerReplica(
+                i, port, f"http://{health_host}:{port}/v1",
+                os.path.join(log_dir, "vllm_server.log" if single else f"vllm_server_{port}.log")
+            )
+            for i, port in enumerate(ports)
+        ]
+        self._stop = threading.Event()
+        self._monitor_thread = None
+        self._published = None
+
+    def _spawn(self, replica: ServerReplica):
+        # 首次启动时覆盖旧日志，重启时追加，保留崩溃前的输出
+        mode = 'w' if replica.log_file is None else 'a'
+        if replica.log_file is not None:
+            replica.log_file.close()
+        replica.log_file = open(replica.log_path, mode, buffering=1, encoding='utf-8')
+        replica.process, replica.ready_event = start_vllm_server(
+            self.command_factory(replica.port), replica.log_file, prefix=f"VLLM-{replica.port}"
+        )
+        replica.healthy = False
+        replica.healthy_since = None
+        replica.next_restart = None
+
+    def start(self):
+        for replica in self.replicas:
+            self._spawn(replica)
+
+    def wait_until_ready(self, console: Console, timeout: int = 120) -> dict:
+        """并行等待所有副本就绪，返回 {副本: 检测方式}，只包含已就绪的副本。"""
+        def wait(replica):
+            return wait_for_server_ready(
+                replica.process, replica.api_base[:-len("/v1")] + "/health",
+                timeout=timeout, ready_event=replica.ready_event
+            )
+
+        with console.status("[bold yellow]⏳ 正在等待服务器响应...", spinner="dots12"):
+            with ThreadPoolExecutor(max_workers=len(self.replicas)) as pool:
+                results = list(pool.map(wait, self.replicas))
+        ready = {}
+        for replica, detected_by in zip(self.replicas, results):
+            if detected_by:
+                replica.healthy = True
+                replica.healthy_since = time.monotonic()
+                ready[replica] = detected_by
+        self.publish()
+        return ready
+
+    def publish(self):
+        """把副本列表与健康状态原子地写入 endpoints_file。"""
+        if not self.endpoints_file:
+            return
+        endpoints = [
+            {"api_base": r.api_base, "healthy": r.healthy, "restarts": r.restarts,
+             "pid": r.process.pid if r.process else None}
+            for r in self.replicas
+        ]
+        state = [(e["api_base"], e["healthy"]) for e in endpoints]
+        if state == self._published:
+            return
+        os.makedirs(os.path.dirname(self.endpoints_file) or ".", exist_ok=True)
+        tmp_path = self.endpoints_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # supervisor_pid 让客户端识别启动器被强制结束后遗留的文件
+            json.dump({"model_name": self.model_name, "updated": time.time(), "supervisor_pid": os.getpid(),
+                       "endpoints": endpoints}, f, indent=2)
+        os.replace(tmp_path, self.endpoints_file)
+        self._published = state
+
+    def _check(self, replica: ServerReplica):
+        import requests
+
+        now = time.monotonic()
+        if replica.process.poll() is not None:
+            if replica.next_restart is None:
+                delay = min(self.restart_max, self.restart_initial * 2 ** replica.restarts)
+                replica.next_restart = now + delay
+                replica.healthy = False
+                print(f"[Supervisor] 副本 {replica.port} 已退出 (退出码 {replica.process.returncode})，{delay:.1f}s 后重启。")
+            elif now >= replica.next_restart:
+                replica.restarts += 1
+                print(f"[Supervisor] 正在重启副本 {replica.port} (第 {replica.restarts} 次)...")
+                self._spawn(replica)
+            return
+
+        try:
+            healthy = requests.get(replica.api_base[:-len("/v1")] + "/health", timeout=2).status_code == 200
+        except requests.exceptions.RequestException:
+            healthy = False
+        if healthy and not replica.healthy:
+            replica.healthy_since = now
+        replica.healthy = healthy
+        if healthy and replica.restarts and now - replica.healthy_since > self.stable_after:
+            replica.restarts = 0
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.health_interval):
+            for replica in self.replicas:
+                self._check(replica)
+            self.publish()
+
+    def start_monitoring(self):
+        self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor_thread.start()
+
+    def wait_forever(self):
+        while not self._stop.wait(1.0):
+            pass
+
+    def stop(self):
+        self._stop.set()
+        if self._monitor_thread is not None:
+            self._monitor_thread.join(timeout=self.health_interval + 5)
+        for replica in self.replicas:
+            kill_process_group(replica.process)
+            if replica.log_file is not None:
+                replica.log_file.close()
+        if self.endpoints_file and os.path.exists(self.endpoints_file):
+            os.remove(self.endpoints_file)
+
+
+def run_client(model_id: str, role_id: str) -> int:
+    """
+    以子进程方式运行客户端，启动器保持运行以监控服务器副本。
+    Ctrl+C 由客户端处理，启动器在等待期间忽略它，客户端退出后再统一清理。
+    """
+    command = [sys.executable, "main.py", "--model", model_id, "--role", role_id]
+    print("\n🚀 正在启动客户端...")
+    print("-" * 50)
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        return subprocess.call(command)
+    finally:
+        signal.signal(signal.SIGINT, previous)
 
 def start_client(model_id: str, role_id: str):
     """在前台启动客户端应用"""
@@ -108,7 +388,8 @@ def start_client(model_id: str, role_id: str):
 
 def main():
     console = Console()
-    server_process = None
+    supervisor = None
+    timeline = StartupTimeline()
     try:
         # 1. 加载配置
         config_loader = ConfigLoader(
@@ -122,20 +403,20 @@ def main():
         default_role = defaults.get('default_role', 'default')
         default_gpu_util = defaults.get('default_gpu_utilization', 0.70)
         default_max_len = defaults.get('default_max_model_len', None)
+        warmup_config = defaults.get('warmup', {}) or {}
         
         # 2. 设置日志目录
         log_dir = app_config.get("logging", {}).get("dir", "logs")
         os.makedirs(log_dir, exist_ok=True)  # 创建日志目录（如果不存在）
-        vllm_log_path = os.path.join(log_dir, "vllm_server.log")
 
         # 3. 获取服务器配置
         server_config = app_config.get("vllm_server", {})
         server_host = server_config.get("host", "127.0.0.1")
         server_port = server_config.get("port", 8000)
+        replica_count = max(1, int(server_config.get("replicas", 1)))
         
         # 4. 智能处理健康检查的URL
         health_check_host = "127.0.0.1" if server_host == "0.0.0.0" else server_host
-        server_url = f"http://{health_check_host}:{server_port}/health" # 使用 /health 接口
         
         # 5. 设置命令行参数解析
         parser = argparse.ArgumentParser(description="一键启动VLLM服务器和客户端")
@@ -150,36 +431,75 @@ def main():
         parser.add_argument("-r", "--role", type=str, default=default_role, help="客户端要使用的初始角色ID")
         parser.add_argument("--max-model-len", type=int, default=default_max_len, help="手动设置模型的最大序列长度以适应显存 (例如 8192)")
         parser.add_argument("--gpu-memory-utilization", type=float, default=default_gpu_util, help="设置vLLM可以使用的GPU显存比例 (0.0 到 1.0)")
+        parser.add_argument("--no-warmup", action="store_true", help="跳过服务器就绪后的预热请求")
+        parser.add_argument("--replicas", type=int, default=replica_count, help="在连续端口上启动的服务器副本数")
+        parser.add_argument("--no-client", action="store_true", help="只启动并监控服务器副本，不启动交互式客户端")
         
         args = parser.parse_args()
+        timeline.mark("加载配置")
 
         if not args.model:
             console.print("[bold red]❌ 错误: 配置文件中未定义任何模型。")
             sys.exit(1)
 
         # 6. 启动流程
-        with open(vllm_log_path, 'w', buffering=1, encoding='utf-8') as log_file:
-            model_config = config_loader.get_model_config(args.model)
-            
-            is_local = "localhost" in getattr(model_config, 'api_base', '') or "127.0.0.1" in getattr(model_config, 'api_base', '')
-
-            if not is_local:
-                console.print(f"✅ 模型 '{args.model}' 是一个远程API模型，无需启动本地服务器。")
-                start_client(args.model, args.role)
-                return
-
-            server_process = start_vllm_server(
-                model_config.model_name, server_host, server_port, log_file,
+        model_config = config_loader.get_model_config(args.model)
+        
+        is_local = "localhost" in getattr(model_config, 'api_base', '') or "127.0.0.1" in getattr(model_config, 'api_base', '')
+
+        if not is_local:
+            console.print(f"✅ 模型 '{args.model}' 是一个远程API模型，无需启动本地服务器。")
+            start_client(args.model, args.role)
+            return
+
+        ports = [server_port + i for i in range(max(1, args.replicas))]
+        print(f"🚀 正在后台启动VLLM服务器...")
+        print(f"   模型路径: {model_config.model_name}")
+        print(f"   监听地址: " + ", ".join(f"http://{server_host}:{port}" for port in ports))
+        if args.max_model_len:
+            print(f"   最大模型长度: {args.max_model_len} tokens")
+        print(f"   服务器日志将保存在: {log_dir}/")
+        print("-" * 50)
+
+        supervisor = ReplicaSupervisor(
+            lambda port: build_server_command(
+                server_config, model_config.model_name, server_host, port,
                 args.max_model_len, args.gpu_memory_utilization
-            )
+            ),
+            ports, health_check_host, log_dir, model_config.model_name, server_config.get("supervisor")
+        )
+        supervisor.start()
+        timeline.mark("启动服务器进程", f"{len(ports)} 个副本")
 
-            # 等待服务器准备就绪
-            if wait_for_server_ready(server_process, server_url, console):
-                console.print("[bold green]✅ 服务器已就绪！")
-                start_client(args.model, args.role)
-            else:
-                console.print(f"\n[bold red]❌ 服务器启动超时或意外退出！请检查 'logs/vllm_server.log' 文件获取详细错误。")
-                raise RuntimeError("无法启动VLLM服务器。")
+        # 等待服务器准备就绪
+        ready = supervisor.wait_until_ready(console, server_config.get("startup_timeout", 120))
+        if not ready:
+            console.print(f"\n[bold red]❌ 服务器启动超时或意外退出！请检查 '{log_dir}' 下的服务器日志获取详细错误。")
+            raise RuntimeError("无法启动VLLM服务器。")
+        detected = ", ".join(sorted(set(ready.values())))
+        timeline.mark("等待服务器就绪", f"{len(ready)}/{len(ports)} 个副本，由{detected}检测到")
+        console.print(f"[bold green]✅ 服务器已就绪！({len(ready)}/{len(ports)} 个副本)")
+
+        if warmup_config.get('enabled', False) and not args.no_warmup:
+            prompts = build_warmup_prompts(config_loader, warmup_config)
+            # 前缀缓存在每个副本上独立，逐个副本预热
+            with console.status("[bold yellow]🔥 正在预热服务器...", spinner="dots12"):
+                succeeded = sum(
+                    warm_up_server(
+                        replica.api_base, model_config.model_name, prompts,
+                        warmup_config.get('max_tokens', 1), warmup_config.get('concurrency', 8)
+                    )
+                    for replica in ready
+                )
+            timeline.mark("预热", f"{succeeded}/{len(prompts) * len(ready)} 个请求成功")
+
+        supervisor.start_monitoring()
+        timeline.report(console)
+        if args.no_client:
+            console.print("服务器副本运行中，按 Ctrl+C 停止。")
+            supervisor.wait_forever()
+        else:
+            run_client(args.model, args.role)
 
     except (Exception, KeyboardInterrupt) as e:
         if isinstance(e, KeyboardInterrupt):
@@ -187,15 +507,9 @@ def main():
         elif not isinstance(e, RuntimeError):
             console.print(f"\n[bold red]❌ 发生错误: {e}")
     finally:
-        if server_process and server_process.poll() is None:
-            console.print(f"🧹 正在关闭后台VLLM服务器 (PID: {server_process.pid})...")
-            if sys.platform != "win32":
-                try:
-                    os.killpg(os.getpgid(server_process.pid), signal.SIGTERM)
-                except ProcessLookupError:
-                    pass
-            else:
-                server_process.terminate()
+        if supervisor is not None:
+            console.print(f"🧹 正在关闭后台VLLM服务器...")
+            supervisor.stop()
             console.print("✅ 清理完成。")
 
 if __name__ == "__main__":
@@ -2,17 +2,30 @@
 
 import argparse
 import asyncio
-from rich.live import Live
-from rich.markdown import Markdown
+import os
+import signal
+import sys
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
 
 from .core.config_loader import ConfigLoader
-from .core.storage import ConversationHistory
+from .core.storage import ConversationHistory, JOURNAL_SUFFIX, load_session_tail
 from .core.exceptions import LLMAppError
-from .core.memory import ConversationMemory
+from .core.memory import ConversationMemory, truncation_options
+from .core.summarizer import HistorySummarizer
+from .core import metrics
+from .core.tokenizer import get_tokenizer
+from .clients.generation import Generation
 from .clients.openai_client import client_factory
+from .clients.http_pool import close_all_clients
 from .ui.cli import RichCLI_UI
+from rich.markup import escape
 import logging
 
+if TYPE_CHECKING:
+    from .core.search_index import HistorySearchIndex
+
 logger = logging.getLogger("LLM_APP")
 
 class CommandLineApp:
@@ -22,24 +35,29 @@ class CommandLineApp:
         self.config_loader = config_loader
         self.history_saver = history_saver
         self.memory_config = memory_config
-        self.ui = RichCLI_UI()
+        self.ui = RichCLI_UI(config_loader.app_config.get('ui', {}))
         self.client = None
         self.memory: ConversationMemory = None
         self.current_model_id = None
         self.current_role_id = None # 新增
+        self.journal = None  # 日志模式下当前会话的追加式日志，收到第一条消息时才创建
+        # 非日志模式下上次保存后新增的消息数; 恢复的会话在有新消息前不会被重复保存为新的历史文件
+        self.unsaved_messages = 0
+        self.search_index: "HistorySearchIndex" = None  # 第一次 /search 时创建
+        self.summarizer: HistorySummarizer = None  # 仅在 memory.mode 为 summary 时创建
 
-    async def start_session(self, model_id: str, role_id: str):
+    async def start_session(self, model_id: str, role_id: str, resume: Optional[int] = None):
         try:
             model_config = self.config_loader.get_model_config(model_id)
-            self.client = client_factory(model_config)
+            self.client = client_factory(model_config, self.config_loader.app_config.get('client', {}))
+            metrics.start_metrics_server(self.config_loader.app_config.get('metrics'))
+            if self.memory_config.get('mode', 'window') == 'summary':
+                self.summarizer = HistorySummarizer(self.client, self.memory_config.get('summary'))
             self.current_model_id = model_id
             self.current_role_id = role_id # 记录当前角色
             
             system_prompt = self.config_loader.get_instruction(role_id) # 从 config_loader 获取
-            self.memory = ConversationMemory(
-                system_prompt=system_prompt.template,
-                token_limit=self.memory_config.get('max_context_tokens', 3000)
-            )
+            self.memory = self._create_memory(system_prompt.template)
             
             self.ui.display_welcome(model_config.display_name, system_prompt.display_name)
             logger.info(f"新会话启动. 模型: {model_id}, 角色: {role_id}")
@@ -49,7 +67,118 @@ class CommandLineApp:
             self.ui.display_system_message(f"启动失败: {e}", "Error")
             return
         
-        await self.main_loop()
+        try:
+            if resume is not None:
+                await self.resume_session(resume)
+            await self.main_loop()
+        finally:
+            if self.summarizer is not None:
+                await self.summarizer.close()
+            await self.client.close()
+            await close_all_clients()
+
+    def _create_memory(self, system_prompt: str) -> ConversationMemory:
+        """为当前模型创建对话记忆，分词器按模型配置从共享注册表中获取。"""
+        model_config = self.config_loader.get_model_config(self.current_model_id)
+        tokenizer = get_tokenizer(model_config.tokenizer)
+        # 在后台加载分词器，用户输入第一条消息时通常已加载完毕
+        tokenizer.preload()
+        return ConversationMemory(
+            system_prompt=system_prompt,
+            token_limit=self.memory_config.get('max_context_tokens', 3000),
+            tokenizer=tokenizer,
+            **truncation_options(self.memory_config)
+        )
+
+    def _remember(self, role: str, content: str):
+        """把消息加入对话记忆；日志模式下同时追加写入会话日志，并记录由记忆算出的Token数。"""
+        tokens = self.memory.add_message(role, content)
+        self.unsaved_messages += 1
+        if self.history_saver.journal_enabled:
+            if self.journal is None:
+                self.journal = self.history_saver.start_session(
+                    self.current_model_id, self.current_role_id, self.memory.tokenizer.name
+                )
+                self.journal.append(self.memory.system_prompt, self.memory.system_prompt_tokens)
+                # 从无法续写的历史恢复的会话: 新日志从已载入的消息开始
+                for message, count in zip(self.memory.history[:-1], self.memory.token_counts[:-1]):
+                    self.journal.append(message, count)
+            self.journal.append({"role": role, "content": content}, tokens)
+
+    async def resume_session(self, number: int):
+        """恢复会话索引中第 number 个最近的会话 (从 1 开始)，只载入能放入上下文窗口的末尾部分。"""
+        sessions = await asyncio.to_thread(self.history_saver.list_sessions, max(number, 10))
+        if not 1 <= number <= len(sessions):
+            self.ui.display_system_message(f"没有第 {number} 个历史会话，输入 /resume 查看列表。", "Warning")
+            return
+        entry = sessions[number - 1]
+        path = self.history_saver.session_path(entry)
+        tokenizer = get_tokenizer(self.config_loader.get_model_config(self.current_model_id).tokenizer)
+        try:
+            tail = await asyncio.to_thread(
+                load_session_tail, path, tokenizer, self.memory_config.get('max_context_tokens', 3000)
+            )
+        except (OSError, ValueError, LLMAppError) as e:
+            self.ui.display_system_message(f"无法读取历史会话 '{path}': {e}", "Error")
+            return
+
+        await self.save_history(farewell=False)
+        role_id = entry.get("role") if entry.get("role") in self.config_loader.instructions else self.current_role_id
+        system_prompt = tail.system_prompt or {"content": self.config_loader.get_instruction(role_id).template}
+        self.memory = self._create_memory(system_prompt["content"])
+        self.memory.add_messages(tail.messages, tail.token_counts)
+        self.unsaved_messages = 0
+        self.current_role_id = role_id
+        # 记录的Token数与当前分词器一致时在原日志末尾续写，否则第一条新消息时创建新日志
+        if (self.history_saver.journal_enabled and path.endswith(JOURNAL_SUFFIX)
+                and tail.meta.get("tokenizer") == tokenizer.name):
+            try:
+                self.journal = self.history_saver.reopen_session(entry)
+            except LLMAppError as e:
+                logger.error(f"无法续写对话日志: {e}")
+
+        note = "，更早的消息超出上下文限制未载入" if tail.truncated else ""
+        self.ui.display_system_message(
+            f"已恢复会话 '{escape(entry.get('title') or entry['path'])}' ({entry.get('model')}, {entry.get('updated')}):\n"
+            f"载入最近 {len(tail.messages)} 条消息，共 {sum(tail.token_counts)} 个Token{note}。",
+            "Session Resumed"
+        )
+        if tail.messages and tail.messages[-1]["role"] == "assistant":
+            self.ui.display_last_reply(tail.messages[-1]["content"])
+
+    @contextmanager
+    def _stop_on_interrupt(self, generation: Generation):
+        """
+        生成期间按 Ctrl-C 或输入 /stop 只停止当前生成，不退出程序。
+        SIGINT 处理函数在主线程中执行，经 call_soon_threadsafe 交给事件循环取消生成；
+        /stop 通过监听终端输入读取 (Windows 的事件循环不支持监听标准输入，此时只能使用 Ctrl-C)。
+        """
+        loop = asyncio.get_running_loop()
+        previous_handler = signal.getsignal(signal.SIGINT)
+        signal.signal(signal.SIGINT, lambda signum, frame: loop.call_soon_threadsafe(generation.cancel))
+
+        def on_input():
+            data = os.read(stdin_fd, 4096)
+            if not data:
+                loop.remove_reader(stdin_fd)
+                return
+            # 其他输入在生成期间被忽略
+            if any(line.strip().lower() == "/stop" for line in data.decode('utf-8', errors='ignore').splitlines()):
+                generation.cancel()
+
+        stdin_fd = None
+        if sys.stdin is not None and sys.stdin.isatty():
+            try:
+                loop.add_reader(sys.stdin.fileno(), on_input)
+                stdin_fd = sys.stdin.fileno()
+            except NotImplementedError:
+                pass
+        try:
+            yield
+        finally:
+            signal.signal(signal.SIGINT, previous_handler)
+            if stdin_fd is not None:
+                loop.remove_reader(stdin_fd)
 
     async def main_loop(self):
         while True:
@@ -59,36 +188,49 @@ class CommandLineApp:
                     await self.handle_command(user_input)
                     continue
                 
-                self.memory.add_message("user", user_input)
+                self._remember("user", user_input)
                 
                 self.ui.display_assistant_header()
                 
-                full_response = ""
                 # 因为INFO日志被屏蔽，我们可以安全地直接打印流式内容
-                async for chunk in self.client.get_streaming_chat_completion(self.memory.get_messages()):
-                    # 使用UI方法直接打印块，实现打字机效果
-                    self.ui.console.print(chunk, end="")
-                    full_response += chunk
-                
-                # 流式结束后打印一个换行符，保持格式整洁
-                self.ui.console.print()
+                # 渲染器按固定帧率批量输出，并在结束时打印换行符
+                generation = self.client.generate(self.memory.get_messages(), session_id=self.memory.session_id)
+                with self._stop_on_interrupt(generation), self.ui.create_stream_renderer() as renderer:
+                    async with generation:
+                        async for chunk in generation:
+                            renderer.feed(chunk)
 
-                self.memory.add_message("assistant", full_response)
+                if generation.cancelled:
+                    self.ui.display_system_message("已停止生成，已收到的部分回复保留在对话中。", "Stopped")
+                # 被停止时同样保留部分回复，使下一轮对话的上下文与用户看到的内容一致
+                self._remember("assistant", renderer.text)
+                if self.summarizer is not None:
+                    # 在等待用户下一条输入期间于后台摘要被截断的轮次
+                    self.summarizer.schedule(self.memory)
 
             except (KeyboardInterrupt, EOFError):
                 break
         
-        self.save_history()
+        await self.save_history()
 
-    def save_history(self):
-        if len(self.memory.history) > 0:
+    async def save_history(self, farewell: bool = True):
+        if self.journal is not None:
+            # 日志模式下消息已经逐条写入，这里只需结束当前日志
+            try:
+                await asyncio.to_thread(self.history_saver.end_session, self.journal)
+            except LLMAppError as e:
+                logger.error(f"无法保存对话历史: {e}")
+            self.journal = None
+        elif self.unsaved_messages and self.memory.history and not self.history_saver.journal_enabled:
             try:
                 # 传递完整的对话历史（包括系统提示）进行保存
                 full_conversation = [self.memory.system_prompt] + self.memory.history
-                self.history_saver.save(full_conversation, self.current_model_id)
+                await asyncio.to_thread(self.history_saver.save, full_conversation, self.current_model_id)
+                self.unsaved_messages = 0
             except LLMAppError as e:
                 logger.error(f"无法保存对话历史: {e}")
-        self.ui.display_system_message("再见!", "Session Ended")
+        if farewell:
+            self.ui.display_system_message("再见!", "Session Ended")
 
     async def handle_command(self, command: str):
         parts = command.lower().strip().split()
@@ -96,16 +238,73 @@ class CommandLineApp:
 
         if cmd in ['/exit', '/quit']:
             raise KeyboardInterrupt
+        elif cmd == '/stop':
+            # 生成期间的 /stop 由 _stop_on_interrupt 处理，走到这里说明没有正在进行的生成
+            self.ui.display_system_message("当前没有正在进行的生成。", "Info")
         elif cmd == '/help':
             # 从 config_loader 获取指令列表
             instructions = self.config_loader.instructions
             self.ui.display_help([f"{name} - {inst.display_name}" for name, inst in instructions.items()])
         elif cmd == '/clear':
             self.memory.clear()
+            if self.journal is not None:
+                self.journal.mark_cleared()
             self.ui.display_system_message("当前对话历史已清空。")
         elif cmd == '/save':
-            self.save_history()
+            if self.history_saver.journal_enabled:
+                # 日志模式下对话会自动持续保存，手动保存只需确保已写入磁盘
+                await asyncio.to_thread(self.history_saver.flush)
+            else:
+                await self.save_history()
             self.ui.display_system_message("对话已手动保存。")
+        elif cmd == '/cache':
+            cache = getattr(self.client, 'cache', None)
+            if cache is None:
+                self.ui.display_system_message("补全缓存未启用 (见 app_config.yaml 中的 client.cache)。", "Info")
+            else:
+                stats = cache.stats
+                self.ui.display_system_message(
+                    f"内存命中: {stats['memory_hits']}  磁盘命中: {stats['disk_hits']}  未命中: {stats['misses']}\n"
+                    f"命中率: {stats['hit_rate']:.1%}  内存条目数: {stats['memory_entries']}",
+                    "Completion Cache"
+                )
+        elif cmd == '/search':
+            query = command.strip()[len(parts[0]):].strip()
+            if not query:
+                self.ui.display_system_message("用法: /search <关键词>", "Info")
+                return
+            try:
+                if self.search_index is None:
+                    from .core.search_index import HistorySearchIndex
+
+                    storage_config = self.config_loader.app_config.get('storage', {})
+                    self.search_index = HistorySearchIndex(
+                        self.history_saver.storage_dir, storage_config.get('search_index_path')
+                    )
+                # 让当前会话已写入日志的消息也能被搜到
+                await asyncio.to_thread(self.history_saver.flush)
+                start = time.perf_counter()
+                # 先增量索引新增或变化的文件再查询，在工作线程中进行
+                results = await asyncio.to_thread(self.search_index.refresh_and_search, query)
+                self.ui.display_search_results(query, results, (time.perf_counter() - start) * 1000)
+            except LLMAppError as e:
+                self.ui.display_system_message(f"搜索失败: {e}", "Error")
+        elif cmd == '/stats':
+            self.ui.display_stats(metrics.snapshot())
+            if self.summarizer is not None:
+                self.ui.display_system_message(
+                    f"摘要覆盖的消息数: {self.memory.summarized_upto}  摘要Token数: {self.memory.summary_tokens}\n"
+                    f"上次请求节省Token: {self.memory.last_tokens_saved}  累计节省Token: {self.memory.tokens_saved_total}",
+                    "History Summary"
+                )
+        elif cmd == '/resume':
+            if len(parts) == 1:
+                sessions = await asyncio.to_thread(self.history_saver.list_sessions)
+                self.ui.display_sessions(sessions)
+            elif parts[1].isdigit():
+                await self.resume_session(int(parts[1]))
+            else:
+                self.ui.display_system_message("用法: /resume [编号]", "Info")
         elif cmd == '/roles':
             self.ui.display_help([]) # 只显示角色列表部分
         elif cmd == '/role':
@@ -115,16 +314,14 @@ class CommandLineApp:
                     # 检查角色是否存在
                     new_prompt = self.config_loader.get_instruction(role_id)
                     
-                    self.save_history() # 保存旧会话
+                    await self.save_history() # 保存旧会话
                     
                     # 开始新会话，重用当前模型
                     self.ui.display_system_message(f"正在切换到角色 '{role_id}' 并开始新会话...")
                     
                     # 重置记忆
-                    self.memory = ConversationMemory(
-                        system_prompt=new_prompt.template,
-                        token_limit=self.memory_config.get('max_context_tokens', 3000)
-                    )
+                    self.memory = self._create_memory(new_prompt.template)
+                    self.unsaved_messages = 0
                     self.current_role_id = role_id
                     self.ui.display_welcome(
                         self.config_loader.get_model_config(self.current_model_id).display_name,
@@ -154,10 +351,15 @@ class CommandLineApp:
             choices=role_choices, help="要使用的系统角色ID"
         )
 
+        parser.add_argument(
+            "--resume", type=int, nargs="?", const=1, default=None, metavar="N",
+            help="恢复第 N 个最近的历史会话 (默认最近一个)，/resume 可查看列表"
+        )
+
         args = parser.parse_args()
         
         if not args.model:
             self.ui.display_system_message("配置文件中未定义任何模型，程序无法启动。", "Critical Error")
             return
 
-        asyncio.run(self.start_session(args.model, args.role))
\ No newline at end of file
+        asyncio.run(self.start_session(args.model, args.role, args.resume))
\ No newline at end of file
@@ -0,0 +1,203 @@
+# llm_client/batch_runner.py
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import logging
+
+from .clients.base_client import BaseLLMClient, CLIENT_ERROR_PREFIX
+from .core.exceptions import StorageError
+from .core.stats import summarize
+from .core.tokenizer import BaseTokenizer
+
+logger = logging.getLogger("LLM_APP")
+
+
+@dataclass
+class BatchReport:
+    """一次批处理运行的汇总统计"""
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    completion_tokens: int = 0
+    wall_time: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    ttfts: List[float] = field(default_factory=list)
+
+    @property
+    def requests_per_second(self) -> float:
+        return (self.completed + self.failed) / self.wall_time if self.wall_time else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.completion_tokens / self.wall_time if self.wall_time else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "completion_tokens": self.completion_tokens,
+            "wall_time_s": round(self.wall_time, 3),
+            "requests_per_second": round(self.requests_per_second, 3),
+            "tokens_per_second": round(self.tokens_per_second, 3),
+            "latency_s": summarize(self.latencies),
+            "ttft_s": summarize(self.ttfts),
+        }
+
+
+def load_finished_ids(output_path: str) -> Set[str]:
+    """
+    读取已有输出文件中成功完成的请求ID，用于断点续跑。
+    同一ID以最后一条记录为准，最后一次失败 (带 error 字段) 的请求会被重新执行。
+    中断时可能留下半行数据，这里将其截掉，保证后续追加从完整的行开始。
+    """
+    finished: Set[str] = set()
+    if not os.path.exists(output_path):
+        return finished
+
+    valid_size = 0
+    with open(output_path, 'rb') as f:
+        for raw_line in f:
+            if not raw_line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw_line)
+            except json.JSONDecodeError:
+                break
+            if "error" in record:
+                finished.discard(str(record["id"]))
+            else:
+                finished.add(str(record["id"]))
+            valid_size += len(raw_line)
+
+    if valid_size != os.path.getsize(output_path):
+        logger.warning(f"输出文件 '{output_path}' 末尾存在不完整的记录，已截断。")
+        with open(output_path, 'r+b') as f:
+            f.truncate(valid_size)
+    return finished
+
+
+def iter_requests(input_path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    逐行流式读取输入JSONL，不会一次性把整个文件载入内存。
+    每行需包含 `messages` (OpenAI格式) 或 `prompt` 字段；没有 `id` 时使用行号。
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"输入文件第 {line_no} 行不是合法的JSON，已跳过: {e}")
+                continue
+            yield str(request.get("id", line_no)), request
+
+
+class BatchRunner:
+    """
+    并发批量推理。输入请求通过有界队列流入固定数量的工作协程，
+    结果按完成顺序逐条追加写入输出JSONL。
+    """
+
+    def __init__(self, client: BaseLLMClient, tokenizer: BaseTokenizer,
+                 system_prompt: Optional[str] = None, concurrency: int = 8):
+        self.client = client
+        self.tokenizer = tokenizer
+        self.system_prompt = system_prompt
+        self.concurrency = max(1, concurrency)
+        self.report = BatchReport()
+
+    def _build_messages(self, request: Dict[str, Any]) -> List[Dict[str, str]]:
+        messages = request.get("messages")
+        if messages is None:
+            messages = [{"role": "user", "content": request["prompt"]}]
+        if self.system_prompt and not any(m.get("role") == "system" for m in messages):
+            messages = [{"role": "system", "content": self.system_prompt}] + messages
+        return messages
+
+    async def _run_one(self, request_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        ttft = None
+        chunks: List[str] = []
+        error = None
+        try:
+            async for chunk in self.client.get_streaming_chat_completion(self._build_messages(request)):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                chunks.append(chunk)
+        except Exception as e:
+            error = str(e)
+        latency = time.perf_counter() - start
+
+        response = "".join(chunks)
+        # 客户端把请求异常以文本的形式混在流中返回，据此识别失败的请求
+        if error is None and chunks and chunks[-1].startswith(CLIENT_ERROR_PREFIX):
+            error = response.strip()
+
+        record = {"id": request_id, "response": response, "latency_s": round(latency, 4)}
+        if error is not None:
+            record["error"] = error
+            self.report.failed += 1
+        else:
+            tokens = self.tokenizer.count(response)
+            record["ttft_s"] = round(ttft or latency, 4)
+            record["completion_tokens"] = tokens
+            self.report.completed += 1
+            self.report.completion_tokens += tokens
+            self.report.latencies.append(latency)
+            self.report.ttfts.append(ttft or latency)
+        return record
+
+    async def run(self, input_path: str, output_path: str, resume: bool = True) -> BatchReport:
+        if resume:
+            finished = load_finished_ids(output_path)
+        else:
+            finished = set()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        if finished:
+            logger.info(f"断点续跑: 跳过 {len(finished)} 条已完成的请求。")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        start = time.perf_counter()
+
+        try:
+            out_file = open(output_path, 'a', encoding='utf-8')
+        except OSError as e:
+            raise StorageError(f"无法打开输出文件 '{output_path}': {e}")
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    queue.task_done()
+                    return
+                record = await self._run_one(*item)
+                # 每条结果完成后立即落盘，中断后可以据此续跑
+                out_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out_file.flush()
+                queue.task_done()
+
+        with out_file:
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                for request_id, request in iter_requests(input_path):
+                    if request_id in finished:
+                        self.report.skipped += 1
+                        continue
+                    await queue.put((request_id, request))
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+                self.report.wall_time = time.perf_counter() - start
+
+        return self.report
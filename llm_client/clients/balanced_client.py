@@ -0,0 +1,375 @@
+# llm_client/clients/balanced_client.py
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncGenerator, Callable, Deque, Dict, List, Optional, Tuple
+import logging
+
+from .base_client import BaseLLMClient
+from .http_pool import close_client
+from .rate_limiter import is_client_error, is_server_error
+from llm_client.core import metrics
+from llm_client.core.config_loader import OpenAICompatibleConfig
+from llm_client.core.stats import percentile
+
+logger = logging.getLogger("LLM_APP")
+
+# 两次检查端点列表文件是否变化的最小间隔 (秒)
+ENDPOINTS_CHECK_INTERVAL = 1.0
+
+
+class Endpoint:
+    """负载均衡中的一个副本，记录其在途请求数与健康状态。"""
+
+    def __init__(self, client: BaseLLMClient):
+        self.client = client
+        self.api_base: str = client.config.api_base
+        self.in_flight = 0
+        self.healthy = True
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.api_base}, in_flight={self.in_flight}, healthy={self.healthy})"
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # Windows 上 os.kill 会结束目标进程，无法用来探测
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_published_endpoints(path: Optional[str], model_name: str) -> Optional[List[Dict]]:
+    """
+    读取 launch.py 的副本监控器发布的端点列表 [{api_base, healthy, ...}]。
+    文件不存在、属于其他模型，或发布它的启动器已经退出 (例如被强制结束后遗留的文件) 时返回 None。
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            published = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"无法读取端点列表文件 '{path}': {e}")
+        return None
+    endpoints = [e for e in published.get("endpoints", []) if e.get("api_base")]
+    if published.get("model_name") != model_name or not endpoints:
+        return None
+    pid = published.get("supervisor_pid")
+    if not pid or not _process_alive(pid):
+        logger.warning(f"端点列表文件 '{path}' 的启动器 (pid {pid}) 已不在运行，忽略该文件。")
+        return None
+    return endpoints
+
+
+class LoadBalancedClient(BaseLLMClient):
+    """
+    在同一模型的多个副本之间分发请求。
+    默认选择在途请求最少的健康副本；开启 sticky_sessions 后，带 session_id 的请求按对话固定副本。
+    首个Token返回之前的失败会换到其他副本重试，之后的失败直接返回错误文本。
+    请求本身有误 (不可重试的 4xx) 时直接返回错误，不切换副本，也不把副本标记为不可用。
+    只有连接错误和 5xx 会把副本标记为不可用；429 等限流响应只换到其他副本重试。
+    开启 hedging 后，首个Token在阈值内未返回时会向下一个副本发送同一请求，
+    采用先返回首个Token的一方，另一方的流被关闭以释放服务器算力。
+    配置了 endpoints_file 并提供 endpoint_factory 时，运行期间跟随启动器发布的端点列表:
+    文件变化后增删副本，并采用其中的健康状态。
+    """
+
+    def __init__(self, config: OpenAICompatibleConfig, endpoint_clients: List[BaseLLMClient],
+                 endpoint_factory: Optional[Callable[[str], BaseLLMClient]] = None):
+        super().__init__(config)
+        self.config: OpenAICompatibleConfig = config
+        self.lb_config = config.load_balancing
+        self.endpoints = [Endpoint(client) for client in endpoint_clients]
+        self._endpoint_factory = endpoint_factory
+        self._endpoints_mtime: Optional[int] = None
+        self._endpoints_checked = 0.0
+        # 已从端点列表移除、等待在途请求结束后关闭的副本
+        self._retired: List[Endpoint] = []
+        if endpoint_factory is not None and config.endpoints_file:
+            self._endpoints_mtime = self._file_mtime()
+        self._health_task: Optional[asyncio.Task] = None
+        self.hedge_config = config.hedging
+        # 最近的首Token延迟观测值，用于自适应的对冲阈值
+        self._ttft_samples: Deque[float] = deque(maxlen=self.hedge_config.window)
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        logger.info(f"负载均衡客户端已为模型 '{config.display_name}' 初始化，副本: {[e.api_base for e in self.endpoints]}")
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.config.endpoints_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh_endpoints(self):
+        """端点列表文件变化时 (最多每 ENDPOINTS_CHECK_INTERVAL 秒检查一次) 同步副本列表与健康状态。"""
+        if self._endpoint_factory is None or not self.config.endpoints_file:
+            return
+        now = time.monotonic()
+        if now - self._endpoints_checked < ENDPOINTS_CHECK_INTERVAL:
+            return
+        self._endpoints_checked = now
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._endpoints_mtime:
+            return
+        self._endpoints_mtime = mtime
+        published = read_published_endpoints(self.config.endpoints_file, self.config.model_name)
+        if published is None:
+            return
+        current = {e.api_base: e for e in self.endpoints}
+        endpoints = []
+        for entry in published:
+            endpoint = current.get(entry["api_base"])
+            if endpoint is None:
+                endpoint = Endpoint(self._endpoint_factory(entry["api_base"]))
+                logger.info(f"端点列表新增副本 {endpoint.api_base}。")
+            healthy = bool(entry.get("healthy", True))
+            if healthy != endpoint.healthy:
+                logger.warning(f"副本 {endpoint.api_base} 状态变更 (启动器发布): {'健康' if healthy else '不可用'}")
+            endpoint.healthy = healthy
+            endpoints.append(endpoint)
+        removed = set(current) - {e.api_base for e in endpoints}
+        if removed:
+            # 正在进行的请求持有各自的 Endpoint 引用，不受影响；其客户端在在途请求结束后由健康检查循环关闭
+            logger.info(f"端点列表移除副本 {sorted(removed)}。")
+            self._retired.extend(current[api_base] for api_base in removed)
+        self.endpoints = endpoints
+
+    async def _close_retired(self, force: bool = False):
+        """关闭已移除且没有在途请求 (force 时为全部) 的副本的客户端与连接池。"""
+        retired, self._retired = self._retired, []
+        active = {e.api_base for e in self.endpoints}
+        for endpoint in retired:
+            if endpoint.in_flight > 0 and not force:
+                self._retired.append(endpoint)
+                continue
+            await endpoint.client.close()
+            # 同一地址重新加入列表时 (副本在原端口重启) 连接池仍在使用
+            if endpoint.api_base not in active:
+                await close_client(endpoint.api_base, endpoint.client.config.api_key)
+
+    def _ensure_health_checks(self):
+        # 健康检查任务依赖运行中的事件循环，因此在第一次请求时才启动
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.lb_config.health_check_interval)
+            await self._close_retired()
+            # 等待期间副本列表可能因端点列表文件变化被替换，按发起检查时的列表对应结果
+            endpoints = list(self.endpoints)
+            results = await asyncio.gather(
+                *(e.client.check_availability() for e in endpoints), return_exceptions=True
+            )
+            for endpoint, ok in zip(endpoints, results):
+                healthy = ok is True
+                if healthy != endpoint.healthy:
+                    logger.warning(f"副本 {endpoint.api_base} 状态变更: {'健康' if healthy else '不可用'}")
+                endpoint.healthy = healthy
+
+    def _candidates(self, session_id: Optional[str]) -> List[Endpoint]:
+        """按优先级返回可尝试的副本列表。所有副本都不健康时仍然全部尝试。"""
+        self._refresh_endpoints()
+        pool = [e for e in self.endpoints if e.healthy] or list(self.endpoints)
+        if self.lb_config.sticky_sessions and session_id:
+            # 最高随机权重 (rendezvous) 哈希: 副本增减时只有少量对话需要迁移
+            return sorted(
+                pool,
+                key=lambda e: hashlib.sha1(f"{session_id}:{e.api_base}".encode('utf-8')).digest(),
+                reverse=True
+            )
+        return sorted(pool, key=lambda e: e.in_flight)
+
+    @staticmethod
+    def _mark_failed(endpoint: Endpoint, error: Exception):
+        # 只有连接错误和 5xx 说明副本本身有问题，健康检查恢复后重新启用；
+        # 429/408/409 只是暂时繁忙，交给限流器处理，不把健康的副本移出轮换
+        if is_server_error(error):
+            endpoint.healthy = False
+
+    async def check_availability(self) -> bool:
+        endpoints = list(self.endpoints)
+        results = await asyncio.gather(*(e.client.check_availability() for e in endpoints))
+        for endpoint, ok in zip(endpoints, results):
+            endpoint.healthy = ok
+        return any(results)
+
+    def hedge_delay(self) -> float:
+        """当前的对冲阈值 (秒)。"""
+        if self.hedge_config.delay is not None:
+            return self.hedge_config.delay
+        if len(self._ttft_samples) < self.hedge_config.min_samples:
+            return self.hedge_config.initial_delay
+        observed = percentile(sorted(self._ttft_samples), self.hedge_config.quantile)
+        return max(self.hedge_config.min_delay, observed)
+
+    async def _hedged_stream(
+        self, messages: List[Dict[str, str]], candidates: List[Endpoint]
+    ) -> AsyncGenerator[str, None]:
+        """
+        等待首个Token时同时监听所有已发出的请求: 超过阈值则发出一个对冲请求，
+        某个请求在首个Token前失败则立即换下一个副本。任一请求返回首个Token后，其余请求全部取消。
+        """
+        start = time.perf_counter()
+        pending: Dict[asyncio.Future, Tuple[Endpoint, AsyncGenerator]] = {}
+        next_index = 0
+        hedge_endpoint: Optional[Endpoint] = None
+        winner: Optional[Tuple[Endpoint, AsyncGenerator]] = None
+        first_chunk: Optional[str] = None
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            stream = endpoint.client.stream_chat_completion(messages)
+            endpoint.in_flight += 1
+            pending[asyncio.ensure_future(stream.__anext__())] = (endpoint, stream)
+            return endpoint
+
+        async def discard(task: asyncio.Future, endpoint: Endpoint, stream: AsyncGenerator):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await stream.aclose()
+            endpoint.in_flight -= 1
+
+        try:
+            launch()
+            while winner is None:
+                if not pending:
+                    if next_index >= len(candidates):
+                        raise last_error
+                    launch()
+                can_hedge = hedge_endpoint is None and next_index < len(candidates)
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay() if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedge_endpoint = launch()
+                    self.hedges_fired += 1
+                    logger.info(f"首Token超过 {time.perf_counter() - start:.2f}s 未返回，向副本 {hedge_endpoint.api_base} 发送对冲请求。")
+                    continue
+                for task in done:
+                    endpoint, stream = pending.pop(task)
+                    if winner is not None:
+                        # 同时完成的另一方按失败方处理
+                        await discard(task, endpoint, stream)
+                        continue
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = (endpoint, stream)
+                        first_chunk = None if error else task.result()
+                        continue
+                    endpoint.in_flight -= 1
+                    if is_client_error(error):
+                        raise error
+                    self._mark_failed(endpoint, error)
+                    last_error = error
+                    logger.warning(f"副本 {endpoint.api_base} 请求失败 ({error})，尝试其他副本。")
+        finally:
+            for task, (endpoint, stream) in list(pending.items()):
+                await discard(task, endpoint, stream)
+            pending.clear()
+
+        endpoint, stream = winner
+        self._ttft_samples.append(time.perf_counter() - start)
+        if hedge_endpoint is not None:
+            won = endpoint is hedge_endpoint
+            self.hedges_won += int(won)
+            metrics.record_hedge(self.config.model_name, won)
+        try:
+            if first_chunk is None:
+                return
+            yield first_chunk
+            async for content in stream:
+                yield content
+        finally:
+            await stream.aclose()
+            endpoint.in_flight -= 1
+
+    async def stream_chat_completion(
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        self._ensure_health_checks()
+        if self.hedge_config.enabled and len(self.endpoints) > 1:
+            # 对冲至少需要两个副本，失败重试与对冲共用同一个候选列表
+            candidates = self._candidates(session_id)[:max(2, self.lb_config.max_failover + 1)]
+            async with aclosing(self._hedged_stream(messages, candidates)) as stream:
+                async for content in stream:
+                    yield content
+            return
+
+        candidates = self._candidates(session_id)[:self.lb_config.max_failover + 1]
+
+        for attempt, endpoint in enumerate(candidates):
+            started = False
+            endpoint.in_flight += 1
+            try:
+                async with aclosing(endpoint.client.stream_chat_completion(messages)) as stream:
+                    async for content in stream:
+                        started = True
+                        yield content
+                return
+            except Exception as e:
+                if started or attempt == len(candidates) - 1 or is_client_error(e):
+                    raise
+                # 尚未输出任何Token，可以安全地切换到下一个副本
+                self._mark_failed(endpoint, e)
+                logger.warning(f"副本 {endpoint.api_base} 请求失败 ({e})，切换到 {candidates[attempt + 1].api_base} 重试。")
+            finally:
+                endpoint.in_flight -= 1
+
+    async def embed_batch(self, texts: List[str]):
+        """整批发送给在途请求最少的健康副本，失败时换到其他副本重试。"""
+        self._ensure_health_checks()
+        self._refresh_endpoints()
+        pool = [e for e in self.endpoints if e.healthy] or list(self.endpoints)
+        candidates = sorted(pool, key=lambda e: e.in_flight)[:self.lb_config.max_failover + 1]
+        for attempt, endpoint in enumerate(candidates):
+            endpoint.in_flight += 1
+            try:
+                return await endpoint.client.embed_batch(texts)
+            except Exception as e:
+                if attempt == len(candidates) - 1 or is_client_error(e):
+                    raise
+                self._mark_failed(endpoint, e)
+                logger.warning(f"副本 {endpoint.api_base} 嵌入请求失败 ({e})，切换到 {candidates[attempt + 1].api_base} 重试。")
+            finally:
+                endpoint.in_flight -= 1
+
+    def describe_error(self, e: Exception) -> str:
+        return self.endpoints[0].client.describe_error(e)
+
+    async def get_streaming_chat_completion(
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        logger.info(f"向模型 '{self.config.model_name}' 发送流式请求 (负载均衡)...")
+        try:
+            async with aclosing(self.stream_chat_completion(messages, session_id)) as stream:
+                async for content in stream:
+                    yield content
+            logger.info("流式响应接收完毕。")
+        except Exception as e:
+            yield self.describe_error(e)
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        await self._close_retired(force=True)
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
+        await super().close()
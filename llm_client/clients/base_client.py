@@ -1,19 +1,83 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, AsyncGenerator
+from typing import TYPE_CHECKING, List, Dict, AsyncGenerator, Optional, Sequence
+from .generation import Generation
 from llm_client.core.config_loader import BaseModelConfig
 
+if TYPE_CHECKING:
+    import numpy as np
+
+# 客户端把请求异常转换为以此开头的文本块，作为流中的最后一块返回
+CLIENT_ERROR_PREFIX = "\n[错误"
+
 class BaseLLMClient(ABC):
     def __init__(self, config: BaseModelConfig):
         self.config = config
+        self._embed_batcher = None  # 第一次调用 embed() 时创建
 
     @abstractmethod
     async def get_streaming_chat_completion(
-        self, messages: List[Dict[str, str]]
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
-        """以异步生成器的方式获取流式的聊天补全。"""
+        """
+        以异步生成器的方式获取流式的聊天补全。
+        session_id 标识请求所属的对话 (如 ConversationMemory.session_id)，负载均衡据此固定副本。
+        """
         pass
 
     @abstractmethod
     def check_availability(self) -> bool:
         """检查模型服务的可用性"""
-        pass
\ No newline at end of file
+        pass
+
+    def generate(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                 max_tokens: Optional[int] = None, session_id: Optional[str] = None) -> Generation:
+        """
+        返回一个可取消的流式生成，流内容与 get_streaming_chat_completion 相同。
+        调用方可以随时 cancel()；超过 timeout 秒或生成约 max_tokens 个Token后也会自动停止，
+        两种情况下上游的HTTP流都会被关闭，推理服务器随即中止该请求。
+        """
+        tokenizer = None
+        if max_tokens is not None:
+            from llm_client.core.tokenizer import get_tokenizer
+
+            tokenizer = get_tokenizer(self.config.tokenizer)
+        return Generation(self.get_streaming_chat_completion(messages, session_id), timeout, max_tokens, tokenizer)
+
+    @abstractmethod
+    async def stream_chat_completion(
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        不做错误转换的原始流式请求，异常直接抛给调用方。
+        供负载均衡、重试等需要自行处理失败的上层客户端使用。
+        """
+        pass
+
+    async def embed_batch(self, texts: List[str]) -> "np.ndarray":
+        """
+        把一组文本作为一个请求发送，返回 (len(texts), dim) 的 float32 矩阵，异常直接抛给调用方。
+        供微批合并器和负载均衡客户端使用，一般调用方应使用 embed()。
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持嵌入。")
+
+    async def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        """
+        计算一组文本的嵌入向量，各行与输入文本一一对应。
+        并发调用方的文本按模型配置中的 embedding.max_batch_size / max_wait 合并成微批后发送。
+        """
+        if self._embed_batcher is None:
+            from .embeddings import MicroBatcher
+
+            options = self.config.embedding
+            self._embed_batcher = MicroBatcher(self.embed_batch, options.max_batch_size, options.max_wait)
+        return await self._embed_batcher.embed(texts)
+
+    def describe_error(self, e: Exception) -> str:
+        """记录异常并将其转换为流中返回给用户的错误文本。"""
+        return f"{CLIENT_ERROR_PREFIX}: {e}]"
+
+    async def close(self):
+        """释放客户端持有的后台任务等资源。"""
+        if self._embed_batcher is not None:
+            self._embed_batcher.close()
+            self._embed_batcher = None
@@ -0,0 +1,217 @@
+# llm_client/clients/cache.py
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional
+import logging
+
+from .base_client import BaseLLMClient, CLIENT_ERROR_PREFIX
+from llm_client.core.config_loader import BaseModelConfig
+
+logger = logging.getLogger("LLM_APP")
+
+
+def make_cache_key(config: BaseModelConfig, messages: List[Dict[str, str]]) -> str:
+    """由模型配置与完整消息列表 (包含系统角色) 生成稳定的缓存键。"""
+    payload = {
+        "provider": config.provider,
+        "model_name": config.model_name,
+        "api_base": getattr(config, 'api_base', None),
+        "parameters": config.parameters.model_dump(),
+        "messages": messages,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class DiskCacheTier:
+    """磁盘缓存层: 每个条目一个JSON文件，按键的前两位分子目录，读取时检查TTL。"""
+
+    def __init__(self, cache_dir: str, ttl_seconds: Optional[float]):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[List[str]]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if self._expired(entry.get("created", 0)):
+            self._remove(path)
+            return None
+        return entry["chunks"]
+
+    def put(self, key: str, chunks: List[str]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"created": time.time(), "chunks": chunks}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def evict_expired(self) -> int:
+        """清理所有过期条目，返回删除的数量。"""
+        removed = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        created = json.load(f).get("created", 0)
+                except (OSError, json.JSONDecodeError):
+                    created = 0
+                if self._expired(created):
+                    self._remove(path)
+                    removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CompletionCache:
+    """两级补全缓存: 内存LRU + 可选的磁盘层。磁盘命中的条目会被提升到内存层。"""
+
+    def __init__(self, max_entries: int = 1024, disk_dir: Optional[str] = None,
+                 ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.disk = DiskCacheTier(disk_dir, ttl_seconds) if disk_dir else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, chunks: List[str]):
+        self._memory[key] = chunks
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        chunks = self._memory.get(key)
+        if chunks is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return chunks
+        if self.disk:
+            chunks = await asyncio.to_thread(self.disk.get, key)
+            if chunks is not None:
+                self._remember(key, chunks)
+                self.disk_hits += 1
+                return chunks
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, chunks: List[str]):
+        self._remember(key, chunks)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.put, key, chunks)
+            except OSError as e:
+                logger.warning(f"写入磁盘补全缓存失败: {e}")
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+class CachedClient(BaseLLMClient):
+    """
+    为任意客户端增加补全缓存。命中时按原始分块重放为流，
+    调用方无需区分缓存回复与真实回复。
+    """
+
+    def __init__(self, inner: BaseLLMClient, cache: CompletionCache):
+        super().__init__(inner.config)
+        self.inner = inner
+        self.cache = cache
+
+    async def check_availability(self) -> bool:
+        return await self.inner.check_availability()
+
+    async def close(self):
+        await self.inner.close()
+
+    # 嵌入不经过补全缓存，直接使用内层客户端 (及其微批合并器)
+    async def embed_batch(self, texts: List[str]):
+        return await self.inner.embed_batch(texts)
+
+    async def embed(self, texts: List[str]):
+        return await self.inner.embed(texts)
+
+    async def stream_chat_completion(
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        # 原始流式请求由上层自行处理失败，不经过缓存
+        async with aclosing(self.inner.stream_chat_completion(messages, session_id)) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    async def get_streaming_chat_completion(
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        key = make_cache_key(self.config, messages)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            logger.info(f"补全缓存命中 ({key[:12]})。")
+            for chunk in cached:
+                yield chunk
+            return
+
+        chunks: List[str] = []
+        async with aclosing(self.inner.get_streaming_chat_completion(messages, session_id)) as stream:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+
+        # 只缓存完整且成功的回复 (错误文本总是流中的最后一块)
+        if chunks and not chunks[-1].startswith(CLIENT_ERROR_PREFIX):
+            await self.cache.put(key, chunks)
+
+
+# 进程级共享缓存，按配置复用，使不同会话之间也能命中
+_shared_caches: Dict[tuple, CompletionCache] = {}
+
+
+def get_completion_cache(cache_config: dict) -> CompletionCache:
+    key = (
+        cache_config.get('max_entries', 1024),
+        cache_config.get('disk_dir'),
+        cache_config.get('ttl_seconds'),
+    )
+    cache = _shared_caches.get(key)
+    if cache is None:
+        cache = CompletionCache(*key)
+        if cache.disk and cache.disk.ttl_seconds is not None:
+            # 过期条目的清理需要遍历整个缓存目录，放到后台线程进行
+            threading.Thread(target=cache.disk.evict_expired, name="completion-cache-evict", daemon=True).start()
+        _shared_caches[key] = cache
+    return cache
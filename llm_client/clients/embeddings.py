@@ -0,0 +1,192 @@
+# llm_client/clients/embeddings.py
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Sequence, Set, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("LLM_APP")
+
+
+class _EmbedRequest:
+    """一次 embed() 调用: 它的文本可能被拆到多个微批中，全部返回后才完成。"""
+    __slots__ = ("texts", "future", "vectors", "remaining")
+
+    def __init__(self, texts: List[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+        self.vectors: Optional[np.ndarray] = None
+        self.remaining = len(texts)
+
+
+class MicroBatcher:
+    """
+    把并发调用方的文本合并成微批，每批作为一个请求发送。
+    队列中凑满 max_batch_size 条文本时立即发送；不足时最多等待 max_wait 秒。
+    每个调用方拿到的向量与其输入文本一一对应。一批请求失败时，该批涉及的所有调用方都会收到同一个异常。
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+                 max_batch_size: int = 64, max_wait: float = 0.005):
+        self._embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        # (请求, 该请求中尚未发送的第一条文本的下标)
+        self._queue: Deque[Tuple[_EmbedRequest, int]] = deque()
+        self._queued = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        request = _EmbedRequest(list(texts), loop.create_future())
+        self._queue.append((request, 0))
+        self._queued += len(request.texts)
+        while self._queued >= self.max_batch_size:
+            self._dispatch()
+        if self._queued and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._on_timer)
+        return await request.future
+
+    def _on_timer(self):
+        self._timer = None
+        while self._queued:
+            self._dispatch()
+
+    def _dispatch(self):
+        """从队首取出至多 max_batch_size 条文本组成一批，在后台发送。"""
+        batch: List[str] = []
+        segments: List[Tuple[_EmbedRequest, int, int]] = []  # (请求, 请求内起始下标, 条数)
+        while self._queue and len(batch) < self.max_batch_size:
+            request, offset = self._queue.popleft()
+            if request.future.done():
+                # 调用方已取消，剩余文本不再发送
+                self._queued -= len(request.texts) - offset
+                continue
+            take = min(len(request.texts) - offset, self.max_batch_size - len(batch))
+            segments.append((request, offset, take))
+            batch.extend(request.texts[offset:offset + take])
+            if offset + take < len(request.texts):
+                self._queue.appendleft((request, offset + take))
+        self._queued -= len(batch)
+        if not self._queued and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if batch:
+            task = asyncio.ensure_future(self._run(batch, segments))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[str], segments: List[Tuple[_EmbedRequest, int, int]]):
+        self.batches += 1
+        self.texts += len(batch)
+        try:
+            vectors = np.asarray(await self._embed_batch(batch), dtype=np.float32)
+            if vectors.ndim != 2 or len(vectors) != len(batch):
+                raise ValueError(f"嵌入结果的形状 {vectors.shape} 与请求的 {len(batch)} 条文本不一致")
+        except asyncio.CancelledError:
+            for request, _, _ in segments:
+                request.future.cancel()
+            raise
+        except Exception as e:
+            for request, _, _ in segments:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        position = 0
+        for request, offset, count in segments:
+            if request.future.done():
+                position += count
+                continue
+            if request.vectors is None:
+                request.vectors = np.empty((len(request.texts), vectors.shape[1]), dtype=np.float32)
+            request.vectors[offset:offset + count] = vectors[position:position + count]
+            position += count
+            request.remaining -= count
+            if request.remaining == 0:
+                request.future.set_result(request.vectors)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+        }
+
+    def close(self):
+        """取消尚未发送和正在发送的批次，等待中的调用方收到 CancelledError。"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            request, _ = self._queue.popleft()
+            request.future.cancel()
+        self._queued = 0
+        for task in list(self._tasks):
+            task.cancel()
+
+
+class HashingEmbedder:
+    """
+    本地确定性嵌入: 字符 n-gram 经 64 位 FNV-1a 哈希映射到固定维度 (带符号的特征哈希)，再做 L2 归一化。
+    不依赖模型和网络，相同文本在任何进程中都得到相同的向量，用于离线测试和基准。
+    一批文本的全部 n-gram 在拼接后的码点数组上一次性向量化计算，批越大单条开销越小。
+    """
+
+    _FNV_OFFSET = np.uint64(14695981039346656037)
+    _FNV_PRIME = np.uint64(1099511628211)
+
+    def __init__(self, dim: int = 256, ngram_range: Tuple[int, int] = (1, 3), lowercase: bool = True):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.lowercase = lowercase
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """同步计算一批文本的嵌入，返回 (len(texts), dim) 的 float32 矩阵。"""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return out
+        codes = [np.frombuffer((t.lower() if self.lowercase else t).encode('utf-32-le'), dtype=np.uint32)
+                 for t in texts]
+        lengths = np.fromiter((len(c) for c in codes), dtype=np.int64, count=len(codes))
+        flat = np.concatenate(codes).astype(np.uint64)
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        # 每个码点在其所属文本中的位置，用于排除跨越两条文本边界的 n-gram
+        positions = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        remaining = lengths[rows] - positions
+
+        counts = np.zeros(len(texts) * self.dim, dtype=np.float64)
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            m = len(flat) - n + 1
+            if m <= 0:
+                continue
+            # 不同阶的 n-gram 使用不同的初值，避免 "a" 与 "aa" 之类的碰撞模式
+            h = np.full(m, self._FNV_OFFSET ^ np.uint64(n), dtype=np.uint64)
+            for j in range(n):
+                h = (h ^ flat[j:j + m]) * self._FNV_PRIME
+            h ^= h >> np.uint64(32)
+            valid = remaining[:m] >= n
+            h = h[valid]
+            buckets = (h % np.uint64(self.dim)).astype(np.int64) + rows[:m][valid] * self.dim
+            signs = np.where(h & np.uint64(1 << 63), -1.0, 1.0)
+            counts += np.bincount(buckets, weights=signs, minlength=len(counts))
+
+        out[:] = counts.reshape(len(texts), self.dim)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        out /= norms
+        return out
+
+    async def embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.encode(texts)
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self.encode(texts)
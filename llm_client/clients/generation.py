@@ -0,0 +1,116 @@
+# llm_client/clients/generation.py
+
+import asyncio
+from typing import AsyncGenerator, List, Optional
+import logging
+
+logger = logging.getLogger("LLM_APP")
+
+# finish_reason 的取值
+FINISH_STOP = "stop"              # 上游流正常结束 (包括客户端返回的错误文本)
+FINISH_CANCELLED = "cancelled"    # 调用方调用了 cancel()
+FINISH_TIMEOUT = "timeout"        # 超过 timeout
+FINISH_MAX_TOKENS = "max_tokens"  # 生成的Token数达到 max_tokens
+
+
+class Generation:
+    """
+    一次可取消的流式生成:
+
+        async with client.generate(messages, timeout=30, max_tokens=512) as generation:
+            async for chunk in generation:
+                ...
+        print(generation.finish_reason, generation.text)
+
+    cancel() 可以从任何协程或回调中调用 (包括经 call_soon_threadsafe 转发的信号处理函数)。
+    读取方正在等待下一块时，等待会被立即中断；随后上游流被关闭，HTTP 连接断开后推理服务器会中止该请求。
+    已经收到的部分保存在 text 中。timeout 从第一次读取时开始计时；
+    max_tokens 用模型的分词器逐块统计已生成的Token数，是近似值。
+    """
+
+    def __init__(self, stream: AsyncGenerator[str, None], timeout: Optional[float] = None,
+                 max_tokens: Optional[int] = None, tokenizer=None):
+        self._stream = stream
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self._tokenizer = tokenizer
+        self._parts: List[str] = []
+        self.tokens = 0
+        self.finish_reason: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None  # 读取方所在的任务
+        self._waiting = False                      # 读取方是否正在等待上游的下一块
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._started = False
+        self._closed = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.finish_reason in (FINISH_CANCELLED, FINISH_TIMEOUT)
+
+    def cancel(self, reason: str = FINISH_CANCELLED):
+        """停止生成。已经结束的生成不受影响。"""
+        if self.finish_reason is not None:
+            return
+        self.finish_reason = reason
+        # 只在读取方等待上游时中断它；正在处理上一块时，下一次读取前会检查 finish_reason
+        if self._waiting and self._task is not None:
+            self._task.cancel()
+
+    def __aiter__(self) -> "Generation":
+        return self
+
+    async def __anext__(self) -> str:
+        if not self._started:
+            self._started = True
+            if self.timeout:
+                self._timer = asyncio.get_running_loop().call_later(self.timeout, self.cancel, FINISH_TIMEOUT)
+        if self.finish_reason is not None:
+            await self.aclose()
+            raise StopAsyncIteration
+        self._task = asyncio.current_task()
+        self._waiting = True
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            self.finish_reason = FINISH_STOP
+            await self.aclose()
+            raise
+        except asyncio.CancelledError:
+            if not self.cancelled:
+                raise
+            # 取消来自 cancel()，而不是外部对读取方任务的取消
+            self._task.uncancel()
+            await self.aclose()
+            raise StopAsyncIteration
+        finally:
+            self._waiting = False
+
+        self._parts.append(chunk)
+        if self.max_tokens is not None and self._tokenizer is not None:
+            self.tokens += self._tokenizer.count(chunk)
+            if self.tokens >= self.max_tokens:
+                self.finish_reason = FINISH_MAX_TOKENS
+        return chunk
+
+    async def aclose(self):
+        """关闭上游流 (及其HTTP连接)。读取方提前退出循环时应调用，或使用 async with。"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+        await self._stream.aclose()
+        if self.finish_reason is None:
+            self.finish_reason = FINISH_CANCELLED
+        if self.finish_reason != FINISH_STOP:
+            logger.info(f"生成已提前结束 ({self.finish_reason})，已接收 {len(self.text)} 个字符。")
+
+    async def __aenter__(self) -> "Generation":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
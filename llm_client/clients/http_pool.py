@@ -0,0 +1,86 @@
+# llm_client/clients/http_pool.py
+
+import threading
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+import logging
+
+if TYPE_CHECKING:
+    import httpx
+    import openai
+
+logger = logging.getLogger("LLM_APP")
+
+# 进程级客户端注册表: 相同 (api_base, api_key) 的会话共享同一个 AsyncOpenAI 及其连接池
+_clients: Dict[Tuple[str, str], "openai.AsyncOpenAI"] = {}
+_preload_started = False
+
+
+def preload_sdk():
+    """
+    在后台线程中导入 openai SDK (约占启动时间的一半)。
+    客户端在第一次发送请求时才真正需要它，用户输入第一条消息时通常已导入完毕。
+    """
+    global _preload_started
+    if not _preload_started:
+        _preload_started = True
+        threading.Thread(target=lambda: __import__("openai"), name="openai-preload", daemon=True).start()
+
+
+def _build_http_client(http_config: dict) -> "httpx.AsyncClient":
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=http_config.get('max_connections', 100),
+        max_keepalive_connections=http_config.get('max_keepalive_connections', 20),
+        keepalive_expiry=http_config.get('keepalive_expiry', 30.0),
+    )
+    timeout = httpx.Timeout(
+        http_config.get('read_timeout', 600.0),
+        connect=http_config.get('connect_timeout', 5.0),
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+def get_async_openai(api_base: str, api_key: str,
+                     http_config: Optional[dict] = None) -> "openai.AsyncOpenAI":
+    """
+    获取共享的 AsyncOpenAI 客户端。第一次请求某个端点时按 http_config
+    (app_config.yaml 中的 client.http 段) 创建连接池，之后直接复用。
+    """
+    import openai
+
+    key = (api_base, api_key)
+    client = _clients.get(key)
+    if client is None or client.is_closed():
+        client = openai.AsyncOpenAI(
+            base_url=api_base,
+            api_key=api_key,
+            http_client=_build_http_client(http_config or {}),
+            # 重试由客户端层统一处理 (带抖动并与限流器联动)，SDK 自身不再重试
+            max_retries=0,
+        )
+        _clients[key] = client
+        logger.info(f"已为端点 {api_base} 创建共享HTTP连接池。")
+    return client
+
+
+async def close_client(api_base: str, api_key: str):
+    """关闭一个端点的共享客户端及其连接 (例如该副本已被移除)。之后再次获取时会重新创建。"""
+    client = _clients.pop((api_base, api_key), None)
+    if client is not None:
+        try:
+            await client.close()
+            logger.info(f"已关闭端点 {api_base} 的HTTP连接池。")
+        except Exception as e:
+            logger.warning(f"关闭端点 {api_base} 的HTTP连接池时出错: {e}")
+
+
+async def close_all_clients():
+    """关闭所有共享客户端及其连接，应在程序退出前调用。"""
+    while _clients:
+        (api_base, _), client = _clients.popitem()
+        try:
+            await client.close()
+            logger.info(f"已关闭端点 {api_base} 的HTTP连接池。")
+        except Exception as e:
+            logger.warning(f"关闭端点 {api_base} 的HTTP连接池时出错: {e}")
@@ -1,26 +1,41 @@
-import openai
-from typing import List, Dict, AsyncGenerator
+import asyncio
+from contextlib import aclosing
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, List, Dict, AsyncGenerator, Optional
 from .base_client import BaseLLMClient
+from .balanced_client import LoadBalancedClient, read_published_endpoints
+from .cache import CachedClient, get_completion_cache
+from .http_pool import get_async_openai, preload_sdk
+from .rate_limiter import get_endpoint_limiter, is_overloaded, is_retryable, retry_delay
 from llm_client.core.config_loader import OpenAICompatibleConfig
 from llm_client.core.exceptions import APIConnectionError
+from llm_client.core.metrics import RequestMetrics
 from llm_client.core.config_loader import BaseModelConfig
 import logging
 
+if TYPE_CHECKING:
+    import numpy as np
+
 logger = logging.getLogger("LLM_APP")
 
 class OpenAICompatibleClient(BaseLLMClient):
-    def __init__(self, config: OpenAICompatibleConfig):
+    def __init__(self, config: OpenAICompatibleConfig, http_config: Optional[dict] = None):
         super().__init__(config)
         self.config: OpenAICompatibleConfig = config # for type hinting
+        self.http_config = http_config
         try:
-            self.async_client = openai.AsyncOpenAI(
-                base_url=self.config.api_base,
-                api_key=self.config.api_key
-            )
+            # 同一端点的所有客户端共享一个限流器，未启用时为 None
+            self.limiter = get_endpoint_limiter(self.config.api_base, self.config.api_key, self.config.rate_limit)
             logger.info(f"OpenAI兼容客户端已为模型 '{self.config.display_name}' 初始化，目标: {self.config.api_base}")
         except Exception as e:
             raise APIConnectionError(f"初始化OpenAI客户端失败: {e}")
-    
+        # SDK 在第一次请求时才需要，先在后台导入
+        preload_sdk()
+
+    @property
+    def async_client(self):
+        # 同一端点的所有会话共享一个客户端和连接池，第一次使用时才创建
+        return get_async_openai(self.config.api_base, self.config.api_key, self.http_config)
+
     async def check_availability(self) -> bool:
         """通过尝试列出模型来检查服务的可用性。"""
         logger.info(f"正在检查API服务 '{self.config.api_base}' 的可用性...")
@@ -33,40 +48,158 @@ class OpenAICompatibleClient(BaseLLMClient):
             logger.error(f"无法连接到API服务 '{self.config.api_base}': {e}")
             return False
 
-    async def get_streaming_chat_completion(
-        self, messages: List[Dict[str, str]]
+    async def _request_with_retries(self, send: Callable[[], Awaitable[Any]], estimated_tokens: int) -> Any:
+        """
+        发送请求，开始之前的失败 (连接错误、408/409/429/5xx) 按 retry 配置重试。
+        启用限流时，成功返回后仍占用一个限流名额，由调用方在请求结束后释放；
+        失败的尝试没有消耗Token，预扣的 estimated_tokens 立即归还。
+        """
+        for attempt in range(self.config.retry.max_retries + 1):
+            if self.limiter:
+                await self.limiter.acquire(estimated_tokens)
+            try:
+                return await send()
+            except BaseException as e:
+                failed = isinstance(e, Exception)
+                if self.limiter:
+                    self.limiter.release(overloaded=failed and is_overloaded(e), unused_tokens=estimated_tokens)
+                if not failed or attempt == self.config.retry.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, attempt, self.config.retry)
+                logger.warning(f"请求 {self.config.api_base} 失败 ({e})，{delay:.2f}s 后进行第 {attempt + 1} 次重试。")
+                await asyncio.sleep(delay)
+
+    async def stream_chat_completion(
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
-        logger.info(f"向模型 '{self.config.model_name}' 发送流式请求...")
+        metrics = RequestMetrics(self.config.model_name, self.config.api_base)
+        status = "error"
+        completion_tokens = None
+        max_tokens = self.config.parameters.max_tokens
+        # 按约 3 个字符一个Token粗略估算 prompt，加上 max_tokens 作为预扣的Token数
+        estimated_tokens = sum(len(m.get('content') or '') for m in messages) // 3 + max_tokens
+        acquired = False
+        stream = None
         try:
-            stream = await self.async_client.chat.completions.create(
-                model=self.config.model_name,
-                messages=messages,
-                max_tokens=self.config.parameters.max_tokens,
-                temperature=self.config.parameters.temperature,
-                stream=True
+            stream = await self._request_with_retries(
+                lambda: self.async_client.chat.completions.create(
+                    model=self.config.model_name,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=self.config.parameters.temperature,
+                    stream=True,
+                    # 让服务器在最后一块中返回用量，用于统计准确的生成Token数
+                    stream_options={"include_usage": True}
+                ),
+                estimated_tokens
             )
+            acquired = self.limiter is not None
+
             async for chunk in stream:
+                if chunk.usage is not None:
+                    completion_tokens = chunk.usage.completion_tokens
+                if not chunk.choices:
+                    continue
                 content = chunk.choices[0].delta.content
                 if content:
+                    metrics.on_chunk()
+                    yield content
+            status = "ok"
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        finally:
+            if stream is not None and status != "ok":
+                # 提前结束时显式关闭响应: 连接断开后 vLLM 会中止该请求，不再为无人读取的Token解码
+                await stream.close()
+            metrics.finish(status, completion_tokens)
+            if acquired:
+                ttft = metrics.first - metrics.start if metrics.first is not None else None
+                unused = max_tokens - completion_tokens if completion_tokens is not None else 0
+                self.limiter.release(latency=ttft if status == "ok" else None, unused_tokens=unused)
+
+    async def embed_batch(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+
+        options = self.config.embedding
+        extra = {"dimensions": options.dimensions} if options.dimensions else {}
+        response = await self._request_with_retries(
+            lambda: self.async_client.embeddings.create(
+                model=options.model_name or self.config.model_name, input=texts, **extra
+            ),
+            sum(len(text) for text in texts) // 3 + 1
+        )
+        if self.limiter:
+            # 嵌入请求没有首Token延迟，成功时按 0 计入，使过载后收缩的并发上限可以恢复
+            self.limiter.release(latency=0.0)
+        data = sorted(response.data, key=lambda item: item.index)
+        return np.asarray([item.embedding for item in data], dtype=np.float32)
+
+    def describe_error(self, e: Exception) -> str:
+        import openai
+
+        if isinstance(e, openai.APIConnectionError):
+            logger.error(f"无法连接到API服务器: {e.__cause__}", exc_info=e)
+            return f"\n[错误: 无法连接到API服务器 {self.config.api_base}]"
+        if isinstance(e, openai.NotFoundError):
+            logger.error(f"模型未找到: {e}", exc_info=e)
+            return f"\n[错误: 模型 '{self.config.model_name}' 在服务器上未找到]"
+        logger.error(f"流式请求过程中发生未知错误: {e}", exc_info=e)
+        return f"\n[错误: {e}]"
+
+    async def get_streaming_chat_completion(
+        self, messages: List[Dict[str, str]], session_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        logger.info(f"向模型 '{self.config.model_name}' 发送流式请求...")
+        try:
+            # 调用方提前关闭本生成器时，aclosing 把关闭传递到底层流，及时断开HTTP连接
+            async with aclosing(self.stream_chat_completion(messages, session_id)) as stream:
+                async for content in stream:
                     yield content
             logger.info("流式响应接收完毕。")
-        except openai.APIConnectionError as e:
-            logger.error(f"无法连接到API服务器: {e.__cause__}", exc_info=True)
-            yield f"\n[错误: 无法连接到API服务器 {self.config.api_base}]"
-        except openai.NotFoundError as e:
-             logger.error(f"模型未找到: {e}", exc_info=True)
-             yield f"\n[错误: 模型 '{self.config.model_name}' 在服务器上未找到]"
         except Exception as e:
-            logger.error(f"流式请求过程中发生未知错误: {e}", exc_info=True)
-            yield f"\n[错误: {e}]"
+            yield self.describe_error(e)
 
-def client_factory(model_config: BaseModelConfig) -> BaseLLMClient:
-    """根据配置创建并返回相应的客户端实例"""
+def _endpoint_client(model_config: OpenAICompatibleConfig, api_base: str,
+                     http_config: Optional[dict]) -> OpenAICompatibleClient:
+    """
+    负载均衡中单个副本的客户端。副本自身不重试: 失败的请求立即交给负载均衡客户端故障转移
+    或对冲到其他副本，而不是先在故障副本上耗尽退避时间。
+    """
+    retry = model_config.retry.model_copy(update={'max_retries': 0})
+    return OpenAICompatibleClient(model_config.model_copy(update={'api_base': api_base, 'retry': retry}), http_config)
+
+def client_factory(model_config: BaseModelConfig, client_config: Optional[dict] = None) -> BaseLLMClient:
+    """
+    根据配置创建并返回相应的客户端实例。
+    client_config 对应 app_config.yaml 中的 `client` 段，用于启用缓存等客户端层功能。
+    """
+    client_config = client_config or {}
     provider = model_config.provider
     if provider == 'openai_compatible':
-        return OpenAICompatibleClient(model_config)
+        http_config = client_config.get('http')
+        # 启动器发布了该模型的副本端点列表时，用它代替配置中的 api_bases，并在运行期间跟随其变化
+        published = read_published_endpoints(model_config.endpoints_file, model_config.model_name)
+        if published:
+            bases = [e["api_base"] for e in published]
+            logger.info(f"使用端点列表文件 '{model_config.endpoints_file}' 中的 {len(bases)} 个副本: {bases}")
+            model_config = model_config.model_copy(update={"api_bases": bases, "api_base": bases[0]})
+        if published or len(model_config.api_bases) > 1:
+            # 多个副本: 每个端点一个客户端，由负载均衡客户端统一调度
+            factory = lambda base: _endpoint_client(model_config, base, http_config)
+            client = LoadBalancedClient(model_config, [factory(base) for base in model_config.api_bases],
+                                        factory if published else None)
+            for endpoint, entry in zip(client.endpoints, published or []):
+                endpoint.healthy = bool(entry.get("healthy", True))
+        else:
+            client = OpenAICompatibleClient(model_config, http_config)
     # 在这里可以添加其他客户端的工厂逻辑
     # elif provider == 'huggingface_local':
-    #     return HuggingFaceClient(model_config)
+    #     client = HuggingFaceClient(model_config)
     else:
-        raise NotImplementedError(f"提供商 '{provider}' 的客户端尚未实现。")
\ No newline at end of file
+        raise NotImplementedError(f"提供商 '{provider}' 的客户端尚未实现。")
+
+    cache_config = client_config.get('cache', {})
+    if cache_config.get('enabled', False):
+        client = CachedClient(client, get_completion_cache(cache_config))
+    return client
@@ -0,0 +1,193 @@
+# llm_client/clients/rate_limiter.py
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import logging
+
+from llm_client.core.config_loader import RateLimitConfig, RetryConfig
+
+logger = logging.getLogger("LLM_APP")
+
+
+class TokenBucket:
+    """按每分钟配额匀速补充的令牌桶，容量为一分钟的配额。"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        # 保证等待者按先来先到的顺序获得令牌
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float):
+        """归还预估多扣的令牌 (例如实际生成的Token数少于 max_tokens)。"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 自适应并发上限: 每个成功且延迟正常的请求使上限加性增加 (每个窗口约 +1)，
+    收到过载响应 (429/503) 或首Token延迟超过目标时乘性减小。
+    """
+
+    def __init__(self, config: RateLimitConfig):
+        self.min_limit = config.min_concurrency
+        self.max_limit = config.max_concurrency
+        self.limit = float(config.initial_concurrency or config.max_concurrency)
+        self.latency_target = config.latency_target
+        self.decrease_factor = config.decrease_factor
+        self.decrease_cooldown = config.decrease_cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # 已被 _wake() 唤醒、但在恢复执行前被取消: 把这次唤醒转交给下一个等待者，否则空出的名额无人使用
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        # 同一波过载会让许多在途请求同时失败，冷却期内只减小一次
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        old = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        logger.warning(f"{reason}，并发上限 {old:.1f} -> {self.limit:.1f}")
+
+    def release(self, overloaded: bool = False, latency: Optional[float] = None):
+        self.in_flight -= 1
+        if overloaded:
+            self._decrease("服务器过载")
+        elif self.latency_target is not None and latency is not None and latency > self.latency_target:
+            self._decrease(f"首Token延迟 {latency:.2f}s 超过目标 {self.latency_target:.2f}s")
+        elif latency is not None:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._wake()
+
+
+class EndpointLimiter:
+    """单个端点的限流器: 请求数与Token数令牌桶，加上自适应并发上限。"""
+
+    def __init__(self, config: RateLimitConfig):
+        self.requests = TokenBucket(config.requests_per_minute) if config.requests_per_minute else None
+        self.tokens = TokenBucket(config.tokens_per_minute) if config.tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(config)
+
+    async def acquire(self, estimated_tokens: int):
+        await self.concurrency.acquire()
+        try:
+            if self.requests:
+                await self.requests.acquire(1)
+            if self.tokens:
+                await self.tokens.acquire(estimated_tokens)
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(self, overloaded: bool = False, latency: Optional[float] = None, unused_tokens: int = 0):
+        if self.tokens and unused_tokens > 0:
+            self.tokens.refund(unused_tokens)
+        self.concurrency.release(overloaded, latency)
+
+
+# 进程级注册表: 同一端点 (api_base, api_key) 的所有客户端共享一个限流器
+_limiters: Dict[Tuple[str, str], EndpointLimiter] = {}
+
+
+def get_endpoint_limiter(api_base: str, api_key: str, config: RateLimitConfig) -> Optional[EndpointLimiter]:
+    if not config.enabled:
+        return None
+    key = (api_base, api_key)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = _limiters[key] = EndpointLimiter(config)
+        logger.info(f"已为端点 {api_base} 启用限流 (RPM={config.requests_per_minute}, "
+                    f"TPM={config.tokens_per_minute}, 并发上限={config.max_concurrency})")
+    return limiter
+
+
+# 以下函数只在请求失败时调用，此时 openai 必然已经导入，因此在函数内导入不增加启动耗时
+def is_overloaded(e: Exception) -> bool:
+    import openai
+
+    return isinstance(e, openai.APIStatusError) and e.status_code in (429, 503)
+
+
+def is_retryable(e: Exception) -> bool:
+    import openai
+
+    if isinstance(e, openai.APIConnectionError):  # 包括超时
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code in (408, 409, 429) or e.status_code >= 500
+    return False
+
+
+def is_server_error(e: Exception) -> bool:
+    """连接错误 (包括超时) 或 5xx: 副本本身有问题。429 等限流响应不算，由限流器处理。"""
+    import openai
+
+    if isinstance(e, openai.APIConnectionError):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+def is_client_error(e: Exception) -> bool:
+    """请求本身有误的 4xx (如上下文超长)，换到其他副本或重试也不会成功。"""
+    import openai
+
+    return isinstance(e, openai.APIStatusError) and 400 <= e.status_code < 500 and not is_retryable(e)
+
+
+def retry_delay(e: Exception, attempt: int, config: RetryConfig) -> float:
+    """带完全随机抖动的指数退避；服务器给出 Retry-After 时以其为下限。"""
+    import openai
+
+    delay = random.uniform(0, min(config.max_delay, config.base_delay * 2 ** attempt))
+    if isinstance(e, openai.APIStatusError):
+        try:
+            delay = max(delay, min(config.max_delay, float(e.response.headers.get("retry-after", 0))))
+        except (TypeError, ValueError):
+            pass
+    return delay
@@ -1,8 +1,9 @@
 # llm_client/core/config_loader.py
 
+import hashlib
 import os
-import yaml
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import msgpack
 from pydantic import BaseModel, Field, validator
 from .exceptions import ConfigError
 import logging
@@ -18,16 +19,90 @@ class ModelParameters(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 4096
 
+class TokenizerConfig(BaseModel):
+    # tiktoken: 使用 name 指定的编码; huggingface: 从 path 指定的本地 tokenizer.json 加载
+    type: str = "tiktoken"
+    name: Optional[str] = None
+    path: Optional[str] = None
+
+class EmbeddingConfig(BaseModel):
+    # 嵌入请求使用的模型名，为 null 时使用 model_name
+    model_name: Optional[str] = None
+    # 输出维度，仅部分模型支持 (如 text-embedding-3 系列)
+    dimensions: Optional[int] = None
+    # 并发调用方的文本合并成微批发送: 凑满 max_batch_size 条，或最早的一条等待超过 max_wait 秒
+    max_batch_size: int = 64
+    max_wait: float = 0.005
+
 class BaseModelConfig(BaseModel):
     provider: str
     display_name: str
     model_name: str
     parameters: ModelParameters
+    tokenizer: Optional[TokenizerConfig] = None
+    embedding: EmbeddingConfig = Field(default_factory=EmbeddingConfig)
+
+class LoadBalancingConfig(BaseModel):
+    # 按会话固定路由到同一副本，使副本上的前缀缓存保持命中
+    sticky_sessions: bool = False
+    health_check_interval: float = 10.0
+    # 首个Token返回前失败时，最多换到其他副本重试的次数
+    max_failover: int = 1
+
+class HedgingConfig(BaseModel):
+    # 首Token在阈值内未返回时，向另一个副本发送同一请求，采用先返回的一方并取消另一方
+    enabled: bool = False
+    # 固定阈值 (秒)；为 null 时按最近观测到的首Token延迟分位数自适应
+    delay: Optional[float] = None
+    quantile: float = 95.0
+    min_delay: float = 0.05
+    # 自适应模式下样本不足 (少于 min_samples) 时使用的阈值
+    initial_delay: float = 1.0
+    min_samples: int = 20
+    window: int = 500
+
+class RateLimitConfig(BaseModel):
+    # 每个端点的客户端限流: 请求数/Token数令牌桶 + AIMD 自适应并发上限
+    enabled: bool = False
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None  # 按 prompt 估算Token数 + max_tokens 预扣，结束后归还未用部分
+    max_concurrency: int = 64
+    min_concurrency: int = 1
+    initial_concurrency: Optional[int] = None  # 默认从 max_concurrency 开始
+    # 首Token延迟超过该值 (秒) 时视为服务器排队，减小并发上限；null 表示只根据 429/503 调整
+    latency_target: Optional[float] = None
+    decrease_factor: float = 0.7
+    decrease_cooldown: float = 1.0
+
+class RetryConfig(BaseModel):
+    # 开始流式输出之前的失败 (连接错误、408/409/429/5xx) 按带抖动的指数退避重试
+    # 多副本时单个副本不重试，由负载均衡客户端故障转移到其他副本
+    max_retries: int = 2
+    base_delay: float = 0.5
+    max_delay: float = 20.0
 
 class OpenAICompatibleConfig(BaseModelConfig):
     provider: str = "openai_compatible"
-    api_base: str
+    # 多个副本时使用 api_bases 列出全部端点，api_base 默认取第一个
+    api_bases: List[str] = Field(default_factory=list)
+    api_base: Optional[str] = None
     api_key: str
+    load_balancing: LoadBalancingConfig = Field(default_factory=LoadBalancingConfig)
+    hedging: HedgingConfig = Field(default_factory=HedgingConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    # launch.py 的副本监控器发布的端点列表文件，存在、模型匹配且启动器仍在运行时代替 api_bases，
+    # 运行期间文件变化 (副本重启、健康状态变化) 会同步到客户端
+    endpoints_file: Optional[str] = None
+    retry: RetryConfig = Field(default_factory=RetryConfig)
+
+    @validator('api_base', always=True)
+    def resolve_api_bases(cls, v, values):
+        api_bases = values.get('api_bases') or []
+        if not v and not api_bases:
+            raise ConfigError("必须配置 'api_base' 或 'api_bases'。")
+        if not api_bases:
+            values['api_bases'] = [v]
+        return v or api_bases[0]
 
     @validator('api_key')
     def get_api_key_from_env(cls, v):
@@ -39,22 +114,100 @@ class OpenAICompatibleConfig(BaseModelConfig):
             return key
         return v
 
+# 已通过校验的配置缓存。以各 YAML 文件的 mtime、大小和内容哈希为键，命中时跳过 YAML 的导入与解析。
+# 缓存的是 YAML 的原始解析结果而不是校验后的模型，ENV: 形式的密钥每次启动仍从环境变量读取，不会落盘。
+CONFIG_CACHE_PATH = os.path.join("data", ".config_cache.msgpack")
+_CONFIG_CACHE_VERSION = 1
+
+
 class ConfigLoader:
-    def __init__(self, app_config_path: str, models_config_path: str):
+    def __init__(self, app_config_path: str, models_config_path: str,
+                 cache_path: Optional[str] = CONFIG_CACHE_PATH):
+        self.cache_path = cache_path
+        paths = (app_config_path, models_config_path)
+        (self.app_config, self.models_config_data), cache_entry = self._load_documents(paths)
+
+        self.models: Dict[str, BaseModelConfig] = self._parse_models()
+        # 直接解析instructions
+        self.instructions: Dict[str, InstructionTemplate] = self._parse_instructions()
+        if cache_entry is not None:
+            # 只有校验通过的配置才写入缓存
+            self._write_cache(cache_entry)
+        temp_logger.info(f"成功加载 {len(self.models)} 个模型配置和 {len(self.instructions)} 条指令。")
+
+    def _load_documents(self, paths: Sequence[str]) -> Tuple[List[Any], Optional[dict]]:
+        """
+        读取各配置文件的解析结果。mtime 与大小未变时直接使用缓存；
+        变了但内容哈希相同 (例如文件被 touch 或重新检出) 时同样复用，只刷新缓存中的 mtime。
+        返回解析结果以及需要写回的缓存条目 (无需写回时为 None)。
+        """
         try:
-            with open(app_config_path, 'r', encoding='utf-8') as f:
-                self.app_config = yaml.safe_load(f)
-            with open(models_config_path, 'r', encoding='utf-8') as f:
-                self.models_config_data = yaml.safe_load(f)
+            stats = [os.stat(path) for path in paths]
         except FileNotFoundError as e:
             raise ConfigError(f"配置文件未找到: {e.filename}")
+        files = [{"path": os.path.abspath(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+                 for path, st in zip(paths, stats)]
+
+        cached = self._read_cache()
+        cached_files = cached.get("files", []) if cached else []
+        same_paths = [f.get("path") for f in cached_files] == [f["path"] for f in files]
+        if same_paths and all(c.get("mtime_ns") == f["mtime_ns"] and c.get("size") == f["size"]
+                              for c, f in zip(cached_files, files)):
+            return cached["documents"], None
+
+        try:
+            contents = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    contents.append(f.read())
+        except FileNotFoundError as e:
+            raise ConfigError(f"配置文件未找到: {e.filename}")
+        for entry, content in zip(files, contents):
+            entry["sha256"] = hashlib.sha256(content).hexdigest()
+        if same_paths and all(c.get("sha256") == f["sha256"] for c, f in zip(cached_files, files)):
+            return cached["documents"], {**cached, "files": files}
+
+        import yaml
+
+        try:
+            documents = [yaml.safe_load(content) for content in contents]
         except yaml.YAMLError as e:
             raise ConfigError(f"YAML配置文件格式错误: {e}")
+        return documents, {"version": _CONFIG_CACHE_VERSION, "files": files, "documents": documents}
 
-        self.models: Dict[str, BaseModelConfig] = self._parse_models()
-        # 直接解析instructions
-        self.instructions: Dict[str, InstructionTemplate] = self._parse_instructions()
-        temp_logger.info(f"成功加载 {len(self.models)} 个模型配置和 {len(self.instructions)} 条指令。")
+    def _read_cache(self) -> Optional[dict]:
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached = msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # 缓存损坏或格式不兼容时视为未命中，稍后会被覆盖
+            temp_logger.debug(f"忽略无法读取的配置缓存 '{self.cache_path}': {e}")
+            return None
+        if not isinstance(cached, dict) or cached.get("version") != _CONFIG_CACHE_VERSION:
+            return None
+        return cached
+
+    def _write_cache(self, entry: dict):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(msgpack.packb(entry, use_bin_type=True))
+            # 原子替换，并发启动的多个进程不会读到写了一半的缓存
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, TypeError, ValueError) as e:
+            # 只读目录或 YAML 中含有 msgpack 无法表示的类型 (如日期) 时不使用缓存
+            temp_logger.debug(f"无法写入配置缓存 '{self.cache_path}': {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
     def _parse_instructions(self) -> Dict[str, InstructionTemplate]:
         instructions = {}
@@ -1,28 +1,114 @@
+import atexit
+import copy
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 
+# 当前进程的后台日志线程，重复调用 setup_logger 时先停止旧的
+_listener = None
+# RepeatFilter 记录的消息数超过该值时，清理窗口已过期且没有省略计数的记录
+_MAX_TRACKED_MESSAGES = 4096
+
+
+class RepeatFilter(logging.Filter):
+    """
+    限制重复的 WARNING 日志: 同一调用位置 (文件 + 行号) 的同一条消息模板每 interval 秒内最多放行 burst 条，
+    其余丢弃并计数，窗口过后放行的第一条日志会附上被省略的次数。
+    INFO 等常规日志和 ERROR 及以上级别的日志不受限制；同一位置的不同消息 (例如不同副本的故障) 分别计数。
+    """
+
+    def __init__(self, interval: float = 60.0, burst: int = 5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._sites = {}  # (文件, 行号, 消息模板) -> [窗口开始时间, 窗口内已放行条数, 已省略条数]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not logging.WARNING <= record.levelno < logging.ERROR or self.interval <= 0:
+            return True
+        # 项目中的日志大多用 f-string 记录，msg 已是最终文本; 使用 % 参数时按模板合并
+        key = (record.pathname, record.lineno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(key)
+            if state is None or now - state[0] >= self.interval:
+                suppressed = state[2] if state else 0
+                if state is None and len(self._sites) >= _MAX_TRACKED_MESSAGES:
+                    self._sites = {k: v for k, v in self._sites.items() if v[2] or now - v[0] < self.interval}
+                self._sites[key] = [now, 1, 0]
+            elif state[1] < self.burst:
+                state[1] += 1
+                return True
+            else:
+                state[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} (此前 {self.interval:g} 秒内另有 {suppressed} 条相同的日志已省略)"
+            record.args = None
+        return True
+
+
+class _NonBlockingHandler(QueueHandler):
+    """
+    在调用线程中只做最少的工作: 合并消息参数并把异常转成文本，然后放入队列。
+    与标准库的 QueueHandler 不同，这里不预先格式化整条日志，保留 extra 字段供 JSON 输出使用。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _json_formatter():
+    # 只有启用JSON输出时才导入
+    from pythonjsonlogger.json import JsonFormatter
+    return JsonFormatter(
+        '%(asctime)s %(name)s %(levelname)s %(message)s %(module)s %(lineno)d %(threadName)s',
+        rename_fields={'levelname': 'level'},
+        json_ensure_ascii=False,
+    )
+
+
+def shutdown_logger():
+    """停止后台日志线程，等待队列中剩余的日志写完。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logger(log_config):
+    global _listener
     log_dir = log_config.get('dir', 'logs')
     log_file = os.path.join(log_dir, log_config.get('filename', 'app.log'))
-    
+
     # 文件日志级别
     file_log_level_str = log_config.get('level', 'INFO').upper()
     file_log_level = getattr(logging, file_log_level_str, logging.INFO)
-    
+
     # [核心修改] 控制台日志级别
     console_log_level_str = log_config.get('console_level', 'WARNING').upper()
     console_log_level = getattr(logging, console_log_level_str, logging.WARNING)
 
     os.makedirs(log_dir, exist_ok=True)
-    
+
     logger = logging.getLogger("LLM_APP")
     # 将logger的最低级别设置为两者中更低的那个，以确保所有消息都能被处理器接收
     logger.setLevel(min(file_log_level, console_log_level))
 
     if logger.hasHandlers():
         logger.handlers.clear()
+    shutdown_logger()
 
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -30,14 +116,25 @@ def setup_logger(log_config):
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_handler.setFormatter(formatter)
     stream_handler.setLevel(console_log_level) # 应用控制台级别
-    logger.addHandler(stream_handler)
 
     # --- 文件处理器 (使用旧的 file_log_level) ---
     file_handler = RotatingFileHandler(
         log_file, maxBytes=5*1024*1024, backupCount=3, encoding='utf-8'
     )
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(_json_formatter() if log_config.get('format') == 'json' else formatter)
     file_handler.setLevel(file_log_level) # 应用文件级别
-    logger.addHandler(file_handler)
-    
-    return logger
\ No newline at end of file
+
+    # 两个处理器都由后台线程驱动，记录日志的线程 (包括事件循环) 只把记录放入队列，不做任何I/O
+    log_queue = queue.SimpleQueue()
+    queue_handler = _NonBlockingHandler(log_queue)
+    rate_limit = log_config.get('rate_limit') or {}
+    queue_handler.addFilter(RepeatFilter(rate_limit.get('interval', 60.0), rate_limit.get('burst', 5)))
+    logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    return logger
+
+
+atexit.register(shutdown_logger)
@@ -1,54 +1,191 @@
 # llm_client/core/memory.py
 
-import tiktoken
-from typing import List, Dict
+import os
+from bisect import bisect_left
+from typing import List, Dict, Optional, Tuple
 import logging
 
+from .exceptions import ConfigError
+from .tokenizer import BaseTokenizer, get_tokenizer
+
 logger = logging.getLogger("LLM_APP")
 
+
+def truncation_options(memory_config: Optional[dict]) -> dict:
+    """把 app_config.yaml 中 memory.truncation 段转换为 ConversationMemory 的构造参数。"""
+    truncation = (memory_config or {}).get('truncation') or {}
+    return {
+        "truncation_policy": truncation.get('policy', 'sliding'),
+        "low_watermark": truncation.get('low_watermark', 0.6),
+    }
+
+
 class ConversationMemory:
-    def __init__(self, system_prompt: str, token_limit: int = 3000):
-        self.system_prompt = {"role": "system", "content": system_prompt}
+    def __init__(self, system_prompt: str, token_limit: int = 3000,
+                 tokenizer: Optional[BaseTokenizer] = None,
+                 truncation_policy: str = "sliding", low_watermark: float = 0.6):
         self.token_limit = token_limit
+        # 标识这段对话，负载均衡的 sticky_sessions 据此把同一对话的请求固定到同一副本
+        # (不导入 uuid: 它会连带导入 platform，拖慢启动)
+        self.session_id = os.urandom(16).hex()
+        # sliding: 每轮只丢弃放不下的最早消息，窗口起点几乎每轮都在变化
+        # chunked: 超出限制时一次性丢弃到 low_watermark 比例，此后窗口起点保持不变直到再次超出，
+        #          使请求的前缀在多轮之间保持一致，能够命中推理服务器的前缀缓存
+        if truncation_policy not in ("sliding", "chunked"):
+            raise ConfigError(f"不支持的截断策略: '{truncation_policy}'")
+        self.truncation_policy = truncation_policy
+        self.low_watermark = low_watermark
+        self._window_floor = 0
         self.history: List[Dict[str, str]] = []
-        # 使用 tiktoken 初始化编码器，"cl100k_base" 适用于 gpt-4, gpt-3.5 等新模型
-        try:
-            self.encoding = tiktoken.get_encoding("cl100k_base")
-        except Exception:
-            # 如果下载失败，回退到按字符估算，并给出警告
-            logger.warning("无法加载 tiktoken 编码器，将回退到基于字符的Token估算。")
-            self.encoding = None
+        # 与 history 一一对应的Token数缓存，以及其前缀和 (_prefix_tokens[i] 为前 i 条消息的Token总数)
+        self._token_counts: List[int] = []
+        self._prefix_tokens: List[int] = [0]
+        # 分词器由进程级注册表共享并延迟加载，未指定时使用 cl100k_base
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.system_prompt = {"role": "system", "content": system_prompt}
+        self._system_prompt_tokens: Optional[int] = None
+        # 检索增强注入的参考资料 (一条额外的系统消息) 及其Token数
+        self.context_message: Optional[Dict[str, str]] = None
+        self.context_tokens = 0
+        # 摘要模式: summary_message 概括了 history[:summarized_upto]，发送时代替这些被截断的消息
+        self.summary_message: Optional[Dict[str, str]] = None
+        self.summary_tokens = 0
+        self.summarized_upto = 0
+        # 每次 clear() 递增，用于丢弃清空前发起的后台摘要结果
+        self.generation = 0
+        # 摘要代替原消息后节省的Token数 (最近一次请求 / 累计)
+        self.last_tokens_saved = 0
+        self.tokens_saved_total = 0
         logger.info(f"对话记忆已初始化，上下文Token限制: {self.token_limit}")
 
     def _count_tokens(self, text: str) -> int:
-        if self.encoding:
-            return len(self.encoding.encode(text))
-        # 回退逻辑
-        return len(text) // 3
+        return self.tokenizer.count(text)
+
+    @property
+    def system_prompt_tokens(self) -> int:
+        # 首次使用时才计数，避免在构造时触发分词器加载
+        if self._system_prompt_tokens is None:
+            self._system_prompt_tokens = self._count_tokens(self.system_prompt['content'])
+        return self._system_prompt_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        """全部对话历史 (不含系统提示词) 的Token总数。"""
+        return self._prefix_tokens[-1]
+
+    @property
+    def token_counts(self) -> List[int]:
+        """与 history 一一对应的Token数。"""
+        return self._token_counts
+
+    def add_message(self, role: str, content: str) -> int:
+        """加入一条消息并返回其Token数。"""
+        # Token数只在消息加入时计算一次，之后的每一轮都直接复用
+        tokens = self._count_tokens(content)
+        self._append(role, content, tokens)
+        return tokens
+
+    def add_messages(self, messages: List[Dict[str, str]], token_counts: Optional[List[int]] = None):
+        """
+        批量加入多条消息，所有消息的Token数通过一次批量编码得到。
+        已知Token数时 (例如从会话日志恢复) 可通过 token_counts 传入，不再重新分词。
+        """
+        counts = token_counts if token_counts is not None else self.tokenizer.count_batch([m['content'] for m in messages])
+        for message, tokens in zip(messages, counts):
+            self._append(message['role'], message['content'], tokens)
 
-    def add_message(self, role: str, content: str):
+    def _append(self, role: str, content: str, tokens: int):
         self.history.append({"role": role, "content": content})
+        self._token_counts.append(tokens)
+        self._prefix_tokens.append(self._prefix_tokens[-1] + tokens)
+
+    def set_context(self, chunks: List[str], max_tokens: Optional[int] = None,
+                    header: str = "以下是与用户问题相关的参考资料:"):
+        """
+        注入检索到的参考资料，按给定顺序 (通常为相关度降序) 尽可能多地放入 max_tokens 预算内。
+        未指定预算时最多占用上下文限制的一半。传入空列表可清除参考资料。
+        """
+        budget = max_tokens if max_tokens is not None else self.token_limit // 2
+        separator = "\n\n---\n\n"
+        header_tokens, separator_tokens = self.tokenizer.count_batch([header + "\n\n", separator])
+        used = header_tokens
+        selected = []
+        for chunk, tokens in zip(chunks, self.tokenizer.count_batch(list(chunks)) if chunks else []):
+            cost = tokens + (separator_tokens if selected else 0)
+            if used + cost > budget:
+                break
+            selected.append(chunk)
+            used += cost
+
+        if not selected:
+            self.context_message = None
+            self.context_tokens = 0
+            return
+        if len(selected) < len(chunks):
+            logger.info(f"参考资料超出Token预算，仅注入 {len(selected)}/{len(chunks)} 个文本块。")
+        content = header + "\n\n" + separator.join(selected)
+        self.context_message = {"role": "system", "content": content}
+        self.context_tokens = self._count_tokens(content)
+
+    def _window_start(self) -> int:
+        """
+        返回能放入上下文窗口的最早一条历史消息的下标。
+        后缀Token数 = total - _prefix_tokens[i]，随 i 单调递减，因此可以二分查找。
+        """
+        budget = self.token_limit - self.system_prompt_tokens - self.context_tokens - self.summary_tokens
+        start = bisect_left(self._prefix_tokens, self.total_tokens - budget)
+        if self.truncation_policy == "chunked":
+            if start > self._window_floor:
+                # 超出限制: 一次丢弃到只保留 low_watermark 比例的预算
+                self._window_floor = bisect_left(
+                    self._prefix_tokens, self.total_tokens - int(budget * self.low_watermark)
+                )
+            start = max(start, self._window_floor)
+        return start
+
+    def pending_summary(self) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        返回已被挤出窗口但尚未并入摘要的消息，以及摘要更新后应覆盖到的下标。
+        没有需要摘要的消息时返回空列表。
+        """
+        start = self._window_start()
+        if start <= self.summarized_upto:
+            return self.summarized_upto, []
+        return start, self.history[self.summarized_upto:start]
+
+    def apply_summary(self, summary: str, upto: int, generation: int,
+                      header: str = "以下是之前对话的摘要:"):
+        """用新的摘要代替 history[:upto]。generation 与当前不一致时 (期间执行过 clear) 丢弃结果。"""
+        if generation != self.generation or upto <= self.summarized_upto:
+            return
+        content = header + "\n\n" + summary.strip()
+        self.summary_message = {"role": "system", "content": content}
+        self.summary_tokens = self._count_tokens(content)
+        self.summarized_upto = upto
+        logger.info(f"对话摘要已更新，覆盖前 {upto} 条消息，摘要Token数: {self.summary_tokens}")
 
     def get_messages(self) -> List[Dict[str, str]]:
         """
         获取符合上下文窗口大小的对话历史。
         始终包含系统提示词，并从最近的对话开始向前追溯。
         """
-        messages_to_send = []
-        current_token_count = 0
-        
-        system_prompt_tokens = self._count_tokens(self.system_prompt['content'])
-        
-        for message in reversed(self.history):
-            message_tokens = self._count_tokens(message['content'])
-            if current_token_count + message_tokens + system_prompt_tokens > self.token_limit:
-                logger.warning(f"上下文窗口已满，对话历史将被截断。")
-                break
-            messages_to_send.insert(0, message)
-            current_token_count += message_tokens
-            
-        return [self.system_prompt] + messages_to_send
+        start = max(self._window_start(), self.summarized_upto)
+        if start > self.summarized_upto:
+            logger.warning(f"上下文窗口已满，对话历史将被截断。")
+        head = [self.system_prompt, self.context_message] if self.context_message else [self.system_prompt]
+        if self.summary_message:
+            head.append(self.summary_message)
+            self.last_tokens_saved = self._prefix_tokens[self.summarized_upto] - self.summary_tokens
+            self.tokens_saved_total += self.last_tokens_saved
+        return head + self.history[start:]
 
     def clear(self):
         self.history.clear()
-        logger.info("对话记忆已清空。")
\ No newline at end of file
+        self._token_counts.clear()
+        self._prefix_tokens = [0]
+        self.summary_message = None
+        self.summary_tokens = 0
+        self.summarized_upto = 0
+        self._window_floor = 0
+        self.generation += 1
+        logger.info("对话记忆已清空。")
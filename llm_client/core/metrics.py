@@ -0,0 +1,174 @@
+# llm_client/core/metrics.py
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+
+from .stats import summarize
+
+logger = logging.getLogger("LLM_APP")
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_ITL_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.04, 0.06, 0.08, 0.1, 0.25, 0.5, 1.0)
+
+
+class _Collectors:
+    """Prometheus 指标集合。第一次记录指标时才导入 prometheus_client 并注册，不占用启动路径。"""
+
+    def __init__(self):
+        from prometheus_client import Counter, Histogram
+
+        self.ttft_seconds = Histogram(
+            "llm_time_to_first_token_seconds", "请求发出到收到第一个Token的时间",
+            ["model", "endpoint"], buckets=_LATENCY_BUCKETS
+        )
+        self.inter_token_seconds = Histogram(
+            "llm_inter_token_latency_seconds", "相邻两个流式块之间的时间",
+            ["model", "endpoint"], buckets=_ITL_BUCKETS
+        )
+        self.e2e_seconds = Histogram(
+            "llm_request_duration_seconds", "流式请求的端到端耗时",
+            ["model", "endpoint"], buckets=_LATENCY_BUCKETS
+        )
+        self.requests_total = Counter(
+            "llm_requests_total", "流式请求数", ["model", "endpoint", "status"]
+        )
+        self.completion_tokens_total = Counter(
+            "llm_completion_tokens_total", "生成的Token数", ["model", "endpoint"]
+        )
+        self.hedges_total = Counter(
+            "llm_hedged_requests_total", "对冲请求数 (outcome=fired: 已触发, won: 对冲请求先返回)", ["model", "outcome"]
+        )
+
+
+_collectors: Optional[_Collectors] = None
+_collectors_lock = threading.Lock()
+
+
+def _prometheus() -> _Collectors:
+    global _collectors
+    if _collectors is None:
+        with _collectors_lock:
+            if _collectors is None:
+                _collectors = _Collectors()
+    return _collectors
+
+
+# 供 /stats 计算分位数的最近观测值 (Prometheus 直方图只有分桶计数)
+_RESERVOIR_SIZE = 10000
+_reservoirs: Dict[Tuple[str, str], Deque[float]] = {}
+_totals: Dict[str, Dict[str, float]] = {}
+_lock = threading.Lock()
+
+
+def _record(metric: str, model: str, values: List[float]):
+    key = (metric, model)
+    with _lock:
+        reservoir = _reservoirs.get(key)
+        if reservoir is None:
+            reservoir = _reservoirs[key] = deque(maxlen=_RESERVOIR_SIZE)
+        reservoir.extend(values)
+
+
+class RequestMetrics:
+    """
+    单次流式请求的计时器。流式过程中每个块只记录一次时间戳，
+    所有直方图观测都在请求结束时统一进行，不占用流式热路径。
+    """
+    __slots__ = ("model", "endpoint", "start", "first", "last", "gaps", "chunks")
+
+    def __init__(self, model: str, endpoint: str):
+        self.model = model
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        self.last = 0.0
+        self.gaps: List[float] = []
+        self.chunks = 0
+
+    def on_chunk(self):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        else:
+            self.gaps.append(now - self.last)
+        self.last = now
+        self.chunks += 1
+
+    def finish(self, status: str = "ok", completion_tokens: Optional[int] = None):
+        end = time.perf_counter()
+        labels = (self.model, self.endpoint)
+        collectors = _prometheus()
+        collectors.requests_total.labels(self.model, self.endpoint, status).inc()
+        if self.first is None:
+            return
+
+        ttft = self.first - self.start
+        duration = end - self.start
+        tokens = completion_tokens if completion_tokens is not None else self.chunks
+        collectors.ttft_seconds.labels(*labels).observe(ttft)
+        collectors.e2e_seconds.labels(*labels).observe(duration)
+        collectors.completion_tokens_total.labels(*labels).inc(tokens)
+        itl = collectors.inter_token_seconds.labels(*labels)
+        for gap in self.gaps:
+            itl.observe(gap)
+
+        decode_time = self.last - self.first
+        _record("ttft", self.model, [ttft])
+        _record("e2e", self.model, [duration])
+        _record("itl", self.model, self.gaps)
+        if decode_time > 0 and tokens > 1:
+            _record("tokens_per_second", self.model, [(tokens - 1) / decode_time])
+        with _lock:
+            totals = _totals.setdefault(self.model, {"requests": 0, "tokens": 0})
+            totals["requests"] += 1
+            totals["tokens"] += tokens
+
+
+def record_hedge(model: str, won: bool):
+    """记录一次已触发的对冲请求，以及它是否比原请求先返回。"""
+    hedges_total = _prometheus().hedges_total
+    hedges_total.labels(model, "fired").inc()
+    if won:
+        hedges_total.labels(model, "won").inc()
+    with _lock:
+        totals = _totals.setdefault(model, {"requests": 0, "tokens": 0})
+        totals["hedges_fired"] = totals.get("hedges_fired", 0) + 1
+        totals["hedges_won"] = totals.get("hedges_won", 0) + int(won)
+
+
+def snapshot() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """返回当前进程内各模型各指标的统计摘要 (count/mean/max/p50/p95/p99)。"""
+    with _lock:
+        items = [(key, list(values)) for key, values in _reservoirs.items()]
+        totals = {model: dict(t) for model, t in _totals.items()}
+    result: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for (metric, model), values in items:
+        result.setdefault(model, {})[metric] = summarize(values)
+    for model, t in totals.items():
+        result.setdefault(model, {})["totals"] = t
+    return result
+
+
+_server_started = False
+
+
+def start_metrics_server(metrics_config: Optional[dict]):
+    """按 app_config.yaml 中的 metrics 段启动 /metrics HTTP 端点 (可选)。"""
+    global _server_started
+    metrics_config = metrics_config or {}
+    if _server_started or not metrics_config.get('enabled', False):
+        return
+    host = metrics_config.get('host', '127.0.0.1')
+    port = metrics_config.get('port', 9400)
+    from prometheus_client import start_http_server
+
+    _prometheus()
+    try:
+        start_http_server(port, addr=host)
+        _server_started = True
+        logger.info(f"Prometheus 指标端点已启动: http://{host}:{port}/metrics")
+    except OSError as e:
+        logger.warning(f"无法启动 Prometheus 指标端点 ({host}:{port}): {e}")
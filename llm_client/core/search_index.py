@@ -0,0 +1,207 @@
+# llm_client/core/search_index.py
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from .exceptions import StorageError
+from .storage import JOURNAL_SUFFIX, read_journal
+
+logger = logging.getLogger("LLM_APP")
+
+INDEX_FILENAME = ".search_index.sqlite3"
+# trigram 分词器按三字符切分，中文等无空格的文本也能做子串检索；查询词不足三个字符时改用 LIKE
+MIN_TRIGRAM_TERM = 3
+INSERT_BATCH_SIZE = 5000
+# 片段中命中文本的起止标记，由显示层替换为具体样式
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    model TEXT,
+    timestamp TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    content, path UNINDEXED, role UNINDEXED, position UNINDEXED, tokenize='trigram'
+);
+"""
+
+
+@dataclass
+class SearchResult:
+    path: str
+    model: Optional[str]
+    timestamp: Optional[str]
+    role: str
+    snippet: str
+
+
+def load_conversation_file(path: str) -> Dict[str, Any]:
+    """读取一个历史文件 (.json 或日志模式的 .jsonl)，返回统一结构的数据。"""
+    if path.endswith(JOURNAL_SUFFIX):
+        return read_journal(path)[0]
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class HistorySearchIndex:
+    """
+    对话历史目录的 SQLite FTS5 全文索引。
+    只有新增或 mtime/大小发生变化的文件才会被重新索引，已删除的文件会从索引中移除。
+    """
+
+    def __init__(self, history_dir: str, db_path: Optional[str] = None):
+        self.history_dir = history_dir
+        self.db_path = db_path or os.path.join(history_dir, INDEX_FILENAME)
+        try:
+            with closing(self._connect()) as conn:
+                conn.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            raise StorageError(f"无法初始化历史搜索索引 '{self.db_path}': {e}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次调用使用独立连接，索引可以安全地在工作线程中更新和查询
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        return sqlite3.connect(self.db_path)
+
+    def _scan(self) -> Iterator[Tuple[str, float, int]]:
+        for root, _, files in os.walk(self.history_dir):
+            for name in files:
+                if name.endswith(".json") or name.endswith(JOURNAL_SUFFIX):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_mtime, stat.st_size
+
+    @staticmethod
+    def _message_rows(path: str, data: Dict[str, Any]) -> List[Tuple[str, str, str, int]]:
+        # 系统提示词在每个会话中重复出现，不参与索引
+        return [
+            (message.get("content", ""), path, message.get("role", ""), position)
+            for position, message in enumerate(data.get("conversation", []))
+            if message.get("role") != "system" and message.get("content")
+        ]
+
+    def update(self, rebuild: bool = False) -> Dict[str, int]:
+        """增量更新索引，rebuild=True 时清空后全量重建。返回各类文件的数量。"""
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0}
+        with closing(self._connect()) as conn, conn:
+            if rebuild:
+                conn.execute("DELETE FROM files")
+                conn.execute("DELETE FROM messages")
+            known = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT path, mtime, size FROM files")}
+
+            rows: List[Tuple[str, str, str, int]] = []
+            seen = set()
+            for path, mtime, size in self._scan():
+                seen.add(path)
+                if known.get(path) == (mtime, size):
+                    counts["unchanged"] += 1
+                    continue
+                try:
+                    data = load_conversation_file(path)
+                except (OSError, json.JSONDecodeError) as e:
+                    logger.warning(f"无法读取历史文件 '{path}'，已跳过索引: {e}")
+                    continue
+                if path in known:
+                    conn.execute("DELETE FROM messages WHERE path = ?", (path,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO files (path, mtime, size, model, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    (path, mtime, size, data.get("model"), data.get("timestamp_utc"))
+                )
+                rows.extend(self._message_rows(path, data))
+                counts["indexed"] += 1
+                if len(rows) >= INSERT_BATCH_SIZE:
+                    conn.executemany("INSERT INTO messages (content, path, role, position) VALUES (?, ?, ?, ?)", rows)
+                    rows = []
+            if rows:
+                conn.executemany("INSERT INTO messages (content, path, role, position) VALUES (?, ?, ?, ?)", rows)
+
+            for path in set(known) - seen:
+                conn.execute("DELETE FROM messages WHERE path = ?", (path,))
+                conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                counts["removed"] += 1
+        return counts
+
+    def search(self, query: str, limit: int = 10) -> List[SearchResult]:
+        terms = query.split()
+        if not terms:
+            return []
+        with closing(self._connect()) as conn:
+            if all(len(term) >= MIN_TRIGRAM_TERM for term in terms):
+                match = " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                cursor = conn.execute(
+                    """
+                    SELECT m.path, f.model, f.timestamp, m.role,
+                           snippet(messages, 0, char(2), char(3), '…', 16)
+                    FROM messages m JOIN files f ON f.path = m.path
+                    WHERE messages MATCH ? ORDER BY rank LIMIT ?
+                    """,
+                    (match, limit)
+                )
+            else:
+                # 短查询词无法使用 trigram 索引，退化为扫描，结果按时间倒序。
+                # 这里用 instr 而不是 LIKE: trigram 表会接管 LIKE，而不足三个字符的模式匹配不到任何行
+                where = " AND ".join("instr(lower(m.content), lower(?)) > 0" for _ in terms)
+                cursor = conn.execute(
+                    f"""
+                    SELECT m.path, f.model, f.timestamp, m.role, substr(m.content, 1, 120)
+                    FROM messages m JOIN files f ON f.path = m.path
+                    WHERE {where} ORDER BY f.timestamp DESC LIMIT ?
+                    """,
+                    terms + [limit]
+                )
+            return [SearchResult(*row) for row in cursor.fetchall()]
+
+    def refresh_and_search(self, query: str, limit: int = 10) -> List[SearchResult]:
+        self.update()
+        return self.search(query, limit)
+
+
+def main():
+    from .config_loader import ConfigLoader
+
+    parser = argparse.ArgumentParser(description="对话历史全文索引工具")
+    parser.add_argument("--rebuild", action="store_true", help="清空并全量重建索引")
+    parser.add_argument("--query", type=str, default=None, help="更新索引后执行一次搜索")
+    parser.add_argument("--limit", type=int, default=10, help="返回的最大结果数")
+    args = parser.parse_args()
+
+    config_loader = ConfigLoader(
+        app_config_path='configs/app_config.yaml',
+        models_config_path='configs/models_config.yaml'
+    )
+    storage_config = config_loader.app_config.get('storage', {})
+    index = HistorySearchIndex(
+        storage_config.get('history_dir', 'data/history'),
+        storage_config.get('search_index_path')
+    )
+
+    start = time.perf_counter()
+    counts = index.update(rebuild=args.rebuild)
+    print(f"索引更新完成 ({time.perf_counter() - start:.2f}s): "
+          f"新索引 {counts['indexed']} 个文件, 未变化 {counts['unchanged']} 个, 移除 {counts['removed']} 个。")
+
+    if args.query:
+        start = time.perf_counter()
+        results = index.search(args.query, args.limit)
+        print(f"找到 {len(results)} 条结果 ({(time.perf_counter() - start) * 1000:.1f}ms):")
+        for result in results:
+            snippet = result.snippet.replace(HIGHLIGHT_START, "**").replace(HIGHLIGHT_END, "**")
+            print(f"- {result.path} [{result.role}] {snippet}")
+
+
+if __name__ == "__main__":
+    main()
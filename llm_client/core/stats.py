@@ -0,0 +1,29 @@
+# llm_client/core/stats.py
+
+import math
+from typing import Dict, Iterable, List
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """对已排序的数据求 q 分位数 (0-100)，使用线性插值。空列表返回 0。"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(values: Iterable[float], quantiles=(50, 95, 99)) -> Dict[str, float]:
+    """返回一组观测值的样本数、均值、最大值以及各分位数。"""
+    data = sorted(values)
+    summary = {
+        "count": len(data),
+        "mean": sum(data) / len(data) if data else 0.0,
+        "max": data[-1] if data else 0.0,
+    }
+    for q in quantiles:
+        summary[f"p{q}"] = percentile(data, q)
+    return summary
@@ -1,28 +1,573 @@
 import os
 import json
+import queue
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from .exceptions import StorageError
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 logger = logging.getLogger("LLM_APP")
 
+JOURNAL_SUFFIX = ".jsonl"
+# 会话索引: 每个会话结束时追加一行摘要 (路径、模型、消息数、标题等)，列出最近的会话时只需读取文件末尾
+SESSION_INDEX_FILENAME = ".sessions.idx"
+TITLE_LENGTH = 60
+# 写入日志的进程各自持有 <history_dir>/.owners/<pid>.lock 上的文件锁，日志记录写入者的 pid，
+# 共用同一历史目录的其他进程 (例如同时运行的网关和命令行客户端) 据此跳过仍在写入中的日志
+OWNERS_DIRNAME = ".owners"
+# 没有 fcntl 的平台无法判断写入者是否存活，只恢复超过该时间 (秒) 未修改的日志
+RECOVER_MIN_AGE = 300
+
+
+class JournalWriter:
+    """
+    后台日志写入线程。记录先进入队列，按批次追加写入文件，
+    达到 max_batch 条或距上次写入超过 flush_interval 秒时落盘，事件循环线程从不等待磁盘。
+    """
+    _STOP = object()
+
+    def __init__(self, flush_interval: float = 1.0, max_batch: int = 64, fsync: bool = False):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="history-journal", daemon=True)
+        self._thread.start()
+
+    def write(self, path: str, record: Dict[str, Any]):
+        self._queue.put((path, json.dumps(record, ensure_ascii=False) + "\n"))
+
+    def flush(self, timeout: float = 5.0):
+        """阻塞直到此前提交的所有记录都已写入磁盘。"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        pending: Dict[str, List[str]] = {}
+        count = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                path, line = item
+                pending.setdefault(path, []).append(line)
+                count += 1
+                if count < self.max_batch and time.monotonic() < deadline:
+                    continue
+
+            # 批次已满、定时器到期、收到 flush 或停止请求: 把缓冲的记录写入磁盘
+            self._write_pending(pending)
+            pending = {}
+            count = 0
+            deadline = time.monotonic() + self.flush_interval
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._STOP:
+                return
+
+    def _write_pending(self, pending: Dict[str, List[str]]):
+        for path, lines in pending.items():
+            try:
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write("".join(lines))
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            except OSError as e:
+                logger.error(f"写入对话日志 '{path}' 失败: {e}")
+
+
+def _title(content: str) -> str:
+    return " ".join(content.split())[:TITLE_LENGTH]
+
+
+class SessionJournal:
+    """
+    一次会话的追加式日志文件 (JSONL)。第一行是会话元数据，随后每条消息一行，
+    正常结束时追加 end 记录；没有 end 记录的日志会在下次启动时被恢复。
+    消息记录带有写入时由对话记忆算出的Token数，恢复会话时无需重新分词；
+    元数据中的 tokenizer 标明这些Token数对应的分词器。
+    """
+
+    def __init__(self, writer: JournalWriter, path: str, model_name: str, started: datetime,
+                 role: Optional[str] = None, tokenizer: Optional[str] = None, write_meta: bool = True):
+        self.writer = writer
+        self.path = path
+        self.closed = False
+        self.model = model_name
+        self.role = role
+        self.started = started.isoformat()
+        # 写入会话索引的统计 (不含系统消息)
+        self.messages = 0
+        self.tokens = 0
+        self.title: Optional[str] = None
+        if write_meta:
+            self.writer.write(self.path, {
+                "type": "meta", "model": model_name, "timestamp_utc": self.started,
+                "role": role, "tokenizer": tokenizer, "owner": os.getpid(),
+            })
+
+    def append(self, message: Dict[str, str], tokens: Optional[int] = None):
+        record = {"type": "message", **message}
+        if tokens is not None:
+            record["tokens"] = tokens
+        self.writer.write(self.path, record)
+        if message.get("role") != "system":
+            self.messages += 1
+            self.tokens += tokens or 0
+            if self.title is None and message.get("role") == "user":
+                self.title = _title(message.get("content") or "")
+
+    def mark_cleared(self):
+        """记录一次 /clear，重建会话时会丢弃此前的非系统消息。"""
+        self.writer.write(self.path, {"type": "clear"})
+        self.messages = 0
+        self.tokens = 0
+
+    def close(self):
+        if not self.closed:
+            self.writer.write(self.path, {"type": "end"})
+            self.closed = True
+
+
+def read_journal(path: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    从日志重建会话，返回 (与 .json 历史文件相同结构的数据, 是否正常结束)。
+    末尾被截断或损坏的行会被忽略。
+    """
+    data: Dict[str, Any] = {"model": None, "timestamp_utc": None, "conversation": []}
+    ended = False
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            kind = record.pop("type", "message")
+            if kind == "meta":
+                data["model"] = record.get("model")
+                data["timestamp_utc"] = record.get("timestamp_utc")
+            elif kind == "message":
+                record.pop("tokens", None)
+                data["conversation"].append(record)
+            elif kind == "clear":
+                data["conversation"] = [m for m in data["conversation"] if m.get("role") == "system"]
+            elif kind == "end":
+                ended = True
+            elif kind == "resume":
+                # 恢复后继续写入的会话，需要新的 end 记录才算正常结束
+                ended = False
+    return data, ended
+
+
+def iter_lines_reversed(path: str, block_size: int = 65536) -> Iterator[bytes]:
+    """从文件末尾向前逐行返回 (不含换行符)，只读取调用方实际用到的部分。"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b"\n")
+            # 块的第一行可能不完整，与前一个块拼接后再返回
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if remainder:
+            yield remainder
+
+
+def _parse_records(lines: Iterator[bytes]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # 异常中断时写了一半的末行
+            continue
+
+
+@dataclass
+class SessionTail:
+    """恢复会话时载入的内容: 系统提示词与能放入上下文窗口的最近消息。"""
+    meta: Dict[str, Any]
+    system_prompt: Optional[Dict[str, str]]
+    messages: List[Dict[str, str]]
+    token_counts: List[int]
+    truncated: bool  # 是否有更早的消息因超出Token预算未被载入
+
+
+def load_session_tail(path: str, tokenizer, token_limit: int) -> SessionTail:
+    """
+    载入一个历史会话末尾的、Token总数 (含系统提示词) 不超过 token_limit 的消息。
+    日志文件从末尾向前读取，一旦超出预算就停止，不读取更早的部分；
+    日志中记录的Token数与当前分词器一致时直接使用，否则 (包括 .json 历史文件) 只对载入的消息重新计数。
+    """
+    if path.endswith(JOURNAL_SUFFIX):
+        meta, system_prompt = {}, None
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("type") == "meta":
+                    meta = record
+                elif record.get("type", "message") == "message":
+                    if record.get("role") == "system":
+                        system_prompt = {"role": "system", "content": record.get("content", "")}
+                    break
+        records = _parse_records(iter_lines_reversed(path))
+        saved_counts = meta.get("tokenizer") == tokenizer.name
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        meta = {"model": data.get("model"), "timestamp_utc": data.get("timestamp_utc")}
+        conversation = data.get("conversation", [])
+        system_prompt = conversation[0] if conversation and conversation[0].get("role") == "system" else None
+        records = reversed(conversation)
+        saved_counts = False
+
+    budget = token_limit - (tokenizer.count(system_prompt["content"]) if system_prompt else 0)
+    messages, counts, used, truncated = [], [], 0, False
+    for record in records:
+        kind = record.get("type", "message")
+        if kind in ("meta", "clear"):
+            break
+        if kind != "message" or record.get("role") == "system":
+            continue
+        content = record.get("content") or ""
+        tokens = record.get("tokens") if saved_counts else None
+        if tokens is None:
+            tokens = tokenizer.count(content)
+        if used + tokens > budget:
+            truncated = True
+            break
+        used += tokens
+        messages.append({"role": record.get("role"), "content": content})
+        counts.append(tokens)
+    messages.reverse()
+    counts.reverse()
+    return SessionTail(meta, system_prompt, messages, counts, truncated)
+
+
+def _journal_owner(path: str) -> Optional[int]:
+    """最近一次写入该日志的进程 pid (最后一条 meta 或 resume 记录中的 owner)。"""
+    owner = None
+    with open(path, 'rb') as f:
+        for raw_line in f:
+            if b'"owner"' not in raw_line:
+                continue
+            try:
+                record = json.loads(raw_line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("type") in ("meta", "resume"):
+                owner = record.get("owner", owner)
+    return owner
+
+
 class ConversationHistory:
-    def __init__(self, storage_dir: str):
+    def __init__(self, storage_dir: str, journal_config: Optional[dict] = None):
         self.storage_dir = storage_dir
         os.makedirs(self.storage_dir, exist_ok=True)
+        journal_config = journal_config or {}
+        self.journal_enabled = journal_config.get('enabled', False)
+        self.writer: Optional[JournalWriter] = None
+        self._active_paths = set()
+        self._owner_lock = None
+        if self.journal_enabled:
+            self._owner_lock = self._acquire_owner_lock()
+            self.writer = JournalWriter(
+                flush_interval=journal_config.get('flush_interval', 1.0),
+                max_batch=journal_config.get('max_batch', 64),
+                fsync=journal_config.get('fsync', False),
+            )
+            # 恢复上次异常退出留下的日志，在后台进行以免拖慢启动
+            threading.Thread(target=self.recover, name="history-recover", daemon=True).start()
         logger.info(f"对话历史存储已初始化，目录: {self.storage_dir}")
 
+    def _owner_lock_path(self, pid: int) -> str:
+        return os.path.join(self.storage_dir, OWNERS_DIRNAME, f"{pid}.lock")
+
+    def _acquire_owner_lock(self):
+        if fcntl is None:
+            return None
+        try:
+            os.makedirs(os.path.join(self.storage_dir, OWNERS_DIRNAME), exist_ok=True)
+            f = open(self._owner_lock_path(os.getpid()), 'a')
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f
+        except OSError as e:
+            logger.warning(f"无法创建日志写入锁，其他进程可能会误将本进程的日志当作中断的会话恢复: {e}")
+            return None
+
+    def _owner_alive(self, pid: Optional[int]) -> bool:
+        """写入日志的进程是否仍在运行 (其锁文件仍被锁定)。"""
+        if pid is None or fcntl is None or pid == os.getpid():
+            # 本进程正在写入的日志由 _active_paths 判断，这里的 pid 只可能属于已退出的同号进程
+            return False
+        path = self._owner_lock_path(pid)
+        try:
+            with open(path, 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            return True
+        # 写入者已退出，清理它遗留的锁文件
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+
+    def _journal_in_use(self, path: str) -> bool:
+        if path in self._active_paths:
+            return True
+        if fcntl is None:
+            return time.time() - os.path.getmtime(path) < RECOVER_MIN_AGE
+        return self._owner_alive(_journal_owner(path))
+
+    def _new_session_path(self, now: datetime, suffix: str) -> str:
+        day_path = os.path.join(self.storage_dir, now.strftime("%Y-%m-%d"))
+        os.makedirs(day_path, exist_ok=True)
+        return os.path.join(day_path, now.strftime("%H-%M-%S") + suffix)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.storage_dir, SESSION_INDEX_FILENAME)
+
+    def session_path(self, entry: Dict[str, Any]) -> str:
+        return os.path.join(self.storage_dir, entry["path"])
+
+    def _index_entry(self, path: str, model: Optional[str], role: Optional[str], started: Optional[str],
+                     messages: int, tokens: Optional[int], title: Optional[str]) -> Dict[str, Any]:
+        return {
+            "path": os.path.relpath(path, self.storage_dir), "model": model, "role": role,
+            "started": started, "updated": datetime.now().isoformat(timespec="seconds"),
+            "messages": messages, "tokens": tokens, "title": title or "",
+        }
+
+    def _entry_from_file(self, path: str) -> Dict[str, Any]:
+        """读取整个历史文件生成索引条目，只用于异常恢复和重建索引。"""
+        if path.endswith(JOURNAL_SUFFIX):
+            data = read_journal(path)[0]
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        messages = [m for m in data.get("conversation", []) if m.get("role") != "system"]
+        title = next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+        entry = self._index_entry(path, data.get("model"), None, data.get("timestamp_utc"),
+                                  len(messages), None, _title(title))
+        entry["updated"] = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")
+        return entry
+
+    def _append_index(self, entry: Dict[str, Any]):
+        if self.writer:
+            self.writer.write(self.index_path, entry)
+            return
+        try:
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"写入会话索引失败: {e}")
+
+    def rebuild_session_index(self) -> int:
+        """扫描历史目录重建会话索引，返回会话数。用于索引不存在 (例如升级前保存的历史) 的情况。"""
+        entries = []
+        for root, _, files in os.walk(self.storage_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if not (name.endswith(".json") or name.endswith(JOURNAL_SUFFIX)) or path in self._active_paths:
+                    continue
+                try:
+                    entries.append(self._entry_from_file(path))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"跳过无法读取的历史文件 '{path}': {e}")
+        entries.sort(key=lambda e: e["updated"])
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        os.replace(tmp_path, self.index_path)
+        logger.info(f"会话索引已重建，共 {len(entries)} 个会话。")
+        return len(entries)
+
+    def list_sessions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """从会话索引末尾读取最近结束的 limit 个会话 (最新的在前)，同一会话只保留最新的条目。"""
+        self.flush()
+        if not os.path.exists(self.index_path):
+            self.rebuild_session_index()
+        sessions, seen = [], set()
+        for entry in _parse_records(iter_lines_reversed(self.index_path)):
+            if entry.get("path") in seen:
+                continue
+            seen.add(entry.get("path"))
+            if os.path.exists(self.session_path(entry)):
+                sessions.append(entry)
+                if len(sessions) >= limit:
+                    break
+        return sessions
+
+    def start_session(self, model_name: str, role: Optional[str] = None,
+                      tokenizer: Optional[str] = None) -> SessionJournal:
+        """开始一个新的日志会话，之后的每条消息都会被追加写入。"""
+        if not self.writer:
+            raise StorageError("对话日志模式未启用。")
+        now = datetime.now()
+        try:
+            path = self._new_session_path(now, JOURNAL_SUFFIX)
+            # 同一秒内开始的多个会话 (例如连续切换角色) 不能写入同一个日志
+            base, n = path[:-len(JOURNAL_SUFFIX)], 1
+            while path in self._active_paths or os.path.exists(path):
+                path = f"{base}-{n}{JOURNAL_SUFFIX}"
+                n += 1
+        except OSError as e:
+            raise StorageError(f"无法创建对话日志: {e}")
+        self._active_paths.add(path)
+        logger.info(f"对话日志已开启: {path}")
+        return SessionJournal(self.writer, path, model_name, now, role, tokenizer)
+
+    def reopen_session(self, entry: Dict[str, Any]) -> SessionJournal:
+        """在索引条目对应的日志末尾继续写入恢复后的会话。"""
+        if not self.writer:
+            raise StorageError("对话日志模式未启用。")
+        path = self.session_path(entry)
+        try:
+            if path in self._active_paths or (
+                    not self._journal_ended(path) and self._owner_alive(_journal_owner(path))):
+                raise StorageError(f"对话日志 '{path}' 正在被其他会话写入。")
+            # 先补全异常中断的日志，再标记为活动日志，避免与后台恢复线程同时修改
+            if not self._journal_ended(path):
+                self._close_journal(path)
+        except OSError as e:
+            raise StorageError(f"无法打开对话日志 '{path}': {e}")
+        self._active_paths.add(path)
+        started = datetime.fromisoformat(entry["started"]) if entry.get("started") else datetime.now()
+        journal = SessionJournal(self.writer, path, entry.get("model"), started, entry.get("role"), write_meta=False)
+        journal.messages = entry.get("messages") or 0
+        journal.tokens = entry.get("tokens") or 0
+        journal.title = entry.get("title") or None
+        self.writer.write(path, {"type": "resume", "timestamp_utc": datetime.now().isoformat(), "owner": os.getpid()})
+        logger.info(f"对话日志已恢复: {path}")
+        return journal
+
+    def end_session(self, journal: SessionJournal):
+        journal.close()
+        self._append_index(self._index_entry(
+            journal.path, journal.model, journal.role, journal.started,
+            journal.messages, journal.tokens, journal.title
+        ))
+        self.flush()
+        self._active_paths.discard(journal.path)
+        logger.info(f"对话历史已保存至: {journal.path}")
+
+    def flush(self):
+        if self.writer:
+            self.writer.flush()
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        if self._owner_lock is not None:
+            self._owner_lock.close()
+            self._owner_lock = None
+            try:
+                os.remove(self._owner_lock_path(os.getpid()))
+            except OSError:
+                pass
+
+    def recover(self) -> int:
+        """
+        为没有 end 记录的日志截掉残缺的末行并补上 end 记录，返回恢复的会话数。
+        写入者仍在运行的日志 (本进程或共用历史目录的其他进程的活动会话) 会被跳过。
+        """
+        recovered = 0
+        for root, _, files in os.walk(self.storage_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if not name.endswith(JOURNAL_SUFFIX) or path in self._active_paths:
+                    continue
+                try:
+                    if self._journal_ended(path) or self._journal_in_use(path):
+                        continue
+                    if self._close_journal(path):
+                        recovered += 1
+                        self._append_index(self._entry_from_file(path))
+                except (OSError, ValueError) as e:
+                    logger.error(f"恢复对话日志 '{path}' 失败: {e}")
+        if recovered:
+            logger.warning(f"已从异常中断的日志中恢复 {recovered} 个会话。")
+        return recovered
+
+    @staticmethod
+    def _journal_ended(path: str) -> bool:
+        # 绝大多数日志都正常结束，只需读取文件末尾确认最后一行是 end 记录
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            tail = f.read()
+        if tail.endswith(b"\n"):
+            try:
+                return json.loads(tail.rstrip(b"\n").rsplit(b"\n", 1)[-1]).get("type") == "end"
+            except (json.JSONDecodeError, AttributeError):
+                pass
+        return False
+
+    @staticmethod
+    def _close_journal(path: str) -> bool:
+        """
+        截掉残缺的末行，未正常结束时补上 end 记录。
+        只有最后一条 resume 之后的 end 记录才表示正常结束；已正常结束时返回 False。
+        """
+        valid_size = 0
+        ended = False
+        with open(path, 'rb') as f:
+            lines = f.readlines()
+        for raw_line in lines:
+            if not raw_line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw_line)
+            except json.JSONDecodeError:
+                break
+            if record.get("type") == "end":
+                ended = True
+            elif record.get("type") == "resume":
+                ended = False
+            valid_size += len(raw_line)
+
+        if ended and valid_size == os.path.getsize(path):
+            return False
+        with open(path, 'r+b') as f:
+            f.truncate(valid_size)
+            if ended:
+                return False
+            f.seek(valid_size)
+            f.write((json.dumps({"type": "end", "recovered": True}) + "\n").encode('utf-8'))
+        return True
+
     def save(self, messages: List[Dict[str, str]], model_name: str):
         try:
             now = datetime.now()
-            date_dir = now.strftime("%Y-%m-%d")
-            time_filename = now.strftime("%H-%M-%S") + ".json"
-            
-            day_path = os.path.join(self.storage_dir, date_dir)
-            os.makedirs(day_path, exist_ok=True)
-            
-            filepath = os.path.join(day_path, time_filename)
+            filepath = self._new_session_path(now, ".json")
 
             data_to_save = {
                 "model": model_name,
@@ -32,9 +577,10 @@ class ConversationHistory:
 
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(data_to_save, f, ensure_ascii=False, indent=2)
-            
+            self._append_index(self._entry_from_file(filepath))
+
             logger.info(f"对话历史已保存至: {filepath}")
 
         except Exception as e:
             logger.error(f"保存对话历史失败: {e}", exc_info=True)
-            raise StorageError(f"无法保存对话历史: {e}")
\ No newline at end of file
+            raise StorageError(f"无法保存对话历史: {e}")
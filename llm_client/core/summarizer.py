@@ -0,0 +1,77 @@
+# llm_client/core/summarizer.py
+
+import asyncio
+from typing import Dict, List, Optional
+import logging
+
+from .memory import ConversationMemory
+from llm_client.clients.base_client import BaseLLMClient, CLIENT_ERROR_PREFIX
+
+logger = logging.getLogger("LLM_APP")
+
+DEFAULT_SUMMARY_PROMPT = (
+    "你是一个对话摘要助手。请把已有摘要与新的对话内容合并为一份简洁的摘要，"
+    "保留用户的目标、偏好、已确定的事实与结论以及尚未解决的问题，省略寒暄与重复内容。"
+    "摘要不超过 {max_words} 字，直接输出摘要正文。"
+)
+
+
+class HistorySummarizer:
+    """
+    在后台把被挤出上下文窗口的对话轮次合并为一份滚动摘要。
+
+    在每轮回复结束后调用 schedule()，摘要请求与用户输入下一条消息并行进行，
+    不会增加当前回复的延迟。摘要完成前发出的请求仍按普通窗口截断。
+    """
+
+    def __init__(self, client: BaseLLMClient, summary_config: Optional[dict] = None):
+        summary_config = summary_config or {}
+        self.client = client
+        self.max_words = summary_config.get('max_words', 300)
+        self.prompt = summary_config.get('prompt') or DEFAULT_SUMMARY_PROMPT
+        # 每个 ConversationMemory 同时最多一个摘要任务
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def schedule(self, memory: ConversationMemory):
+        """若有尚未摘要的被截断消息，启动后台摘要任务。"""
+        key = id(memory)
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            return
+        upto, messages = memory.pending_summary()
+        if not messages:
+            return
+        self._tasks[key] = asyncio.create_task(self._summarize(memory, upto, messages, memory.generation))
+
+    def _build_request(self, previous: Optional[str], messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        content = f"已有摘要:\n{previous or '(无)'}\n\n新的对话内容:\n{transcript}"
+        return [
+            {"role": "system", "content": self.prompt.format(max_words=self.max_words)},
+            {"role": "user", "content": content},
+        ]
+
+    async def _summarize(self, memory: ConversationMemory, upto: int,
+                         messages: List[Dict[str, str]], generation: int):
+        previous = memory.summary_message['content'] if memory.summary_message else None
+        try:
+            parts = []
+            async for chunk in self.client.get_streaming_chat_completion(self._build_request(previous, messages)):
+                parts.append(chunk)
+            summary = "".join(parts)
+            if not summary.strip() or parts[-1].startswith(CLIENT_ERROR_PREFIX):
+                logger.warning("生成对话摘要失败，被截断的消息将直接丢弃。")
+                return
+            memory.apply_summary(summary, upto, generation)
+        except Exception as e:
+            logger.error(f"生成对话摘要时发生错误: {e}", exc_info=True)
+        finally:
+            self._tasks.pop(id(memory), None)
+
+    async def close(self):
+        """取消所有未完成的摘要任务。"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
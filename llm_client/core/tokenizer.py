@@ -0,0 +1,145 @@
+# llm_client/core/tokenizer.py
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from .exceptions import ConfigError
+
+logger = logging.getLogger("LLM_APP")
+
+DEFAULT_TIKTOKEN_ENCODING = "cl100k_base"
+
+
+class BaseTokenizer(ABC):
+    """
+    分词器的统一接口，只提供Token计数 (上下文截断、分块等只需要计数)。
+    调用方应优先使用批量接口，一次性处理多条文本。
+    """
+    name: str = "base"
+
+    @abstractmethod
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """批量统计Token数。"""
+        pass
+
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+
+
+class TiktokenTokenizer(BaseTokenizer):
+    def __init__(self, encoding_name: str):
+        import tiktoken
+        self.name = f"tiktoken:{encoding_name}"
+        self._encoding = tiktoken.get_encoding(encoding_name)
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        # 使用 ordinary 编码，用户文本中出现特殊Token字面量时不会抛出异常
+        return [len(ids) for ids in self._encoding.encode_ordinary_batch(texts)]
+
+
+class HuggingFaceTokenizer(BaseTokenizer):
+    """从本地 tokenizer.json 文件加载的 HuggingFace `tokenizers` 分词器。"""
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+        self.name = f"huggingface:{path}"
+        self._tokenizer = Tokenizer.from_file(path)
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        encodings = self._tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [len(encoding.ids) for encoding in encodings]
+
+
+class CharEstimateTokenizer(BaseTokenizer):
+    """无法加载任何真实分词器时的最后回退方案：按字符数估算Token数。"""
+    name = "char_estimate"
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [len(text) // 3 for text in texts]
+
+
+class LazyTokenizer(BaseTokenizer):
+    """
+    延迟加载的分词器代理。
+    真实分词器在第一次使用时才加载，也可以通过 preload() 提前在后台线程中加载，
+    从而把词表读取移出启动路径。加载失败时先回退到 tiktoken 的 cl100k_base，仍然失败时回退到字符估算。
+    """
+
+    def __init__(self, name: str, loader: Callable[[], BaseTokenizer]):
+        self.configured_name = name
+        self._loader = loader
+        self._tokenizer: Optional[BaseTokenizer] = None
+        self._lock = threading.Lock()
+
+    def _resolve(self) -> BaseTokenizer:
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    try:
+                        self._tokenizer = self._loader()
+                        logger.info(f"分词器 '{self.configured_name}' 加载完成。")
+                    except Exception as e:
+                        self._tokenizer = self._fallback(e)
+        return self._tokenizer
+
+    def _fallback(self, error: Exception) -> BaseTokenizer:
+        if self.configured_name != f"tiktoken:{DEFAULT_TIKTOKEN_ENCODING}":
+            try:
+                tokenizer = TiktokenTokenizer(DEFAULT_TIKTOKEN_ENCODING)
+                logger.warning(f"无法加载分词器 '{self.configured_name}' ({error})，"
+                               f"将回退到 tiktoken 的 {DEFAULT_TIKTOKEN_ENCODING} 编码。")
+                return tokenizer
+            except Exception as e:
+                error = e
+        logger.warning(f"无法加载分词器 '{self.configured_name}' ({error})，将回退到基于字符的Token估算。")
+        return CharEstimateTokenizer()
+
+    @property
+    def name(self) -> str:
+        """实际使用的分词器名称 (可能是回退方案)，随Token数一起保存，用于判断保存的计数是否仍然适用。"""
+        return self._resolve().name
+
+    @property
+    def loaded(self) -> bool:
+        return self._tokenizer is not None
+
+    def preload(self):
+        """在后台线程中加载分词器，不阻塞调用方。"""
+        if not self.loaded:
+            threading.Thread(target=self._resolve, name=f"tokenizer-preload-{self.configured_name}", daemon=True).start()
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return self._resolve().count_batch(texts)
+
+
+# 进程级分词器缓存: 同一个分词器在整个进程中只加载一次
+_registry: Dict[Tuple[str, str], LazyTokenizer] = {}
+_registry_lock = threading.Lock()
+
+
+def get_tokenizer(tokenizer_config=None) -> LazyTokenizer:
+    """
+    根据模型配置中的 `tokenizer` 段获取共享的分词器实例。
+    未配置时使用 tiktoken 的 cl100k_base 编码。huggingface 类型的相对路径相对于当前工作目录 (项目根目录)。
+    """
+    kind = getattr(tokenizer_config, 'type', None) or "tiktoken"
+    if kind == "tiktoken":
+        source = getattr(tokenizer_config, 'name', None) or DEFAULT_TIKTOKEN_ENCODING
+        loader = lambda: TiktokenTokenizer(source)
+    elif kind == "huggingface":
+        source = getattr(tokenizer_config, 'path', None)
+        if not source:
+            raise ConfigError("huggingface 类型的分词器必须配置 'path'。")
+        loader = lambda: HuggingFaceTokenizer(source)
+    else:
+        raise ConfigError(f"不支持的分词器类型: '{kind}'")
+
+    key = (kind, source)
+    with _registry_lock:
+        tokenizer = _registry.get(key)
+        if tokenizer is None:
+            tokenizer = LazyTokenizer(f"{kind}:{source}", loader)
+            _registry[key] = tokenizer
+    return tokenizer
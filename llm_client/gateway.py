@@ -0,0 +1,324 @@
+# llm_client/gateway.py
+
+import asyncio
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, List, Optional
+import logging
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from .clients.base_client import BaseLLMClient, CLIENT_ERROR_PREFIX
+from .clients.generation import FINISH_CANCELLED, Generation
+from .clients.http_pool import close_all_clients
+from .clients.openai_client import client_factory
+from .core.config_loader import ConfigLoader
+from .core.exceptions import LLMAppError
+from .core.memory import ConversationMemory, truncation_options
+from .core.storage import ConversationHistory
+from .core.summarizer import HistorySummarizer
+from .core.tokenizer import get_tokenizer
+
+logger = logging.getLogger("LLM_APP")
+
+_STREAM_END = object()
+
+
+class CreateSessionRequest(BaseModel):
+    model: Optional[str] = None
+    role: str = "default"
+
+
+class MessageRequest(BaseModel):
+    content: str
+    timeout: Optional[float] = None   # 生成的最长时间 (秒)，超时后停止并保留部分回复
+    max_tokens: Optional[int] = None  # 生成约该数量的Token后停止
+
+
+class Session:
+    """一个HTTP会话: 对话记忆、可选的会话日志，以及用于空闲淘汰的活跃时间。"""
+
+    def __init__(self, session_id: str, model_id: str, role_id: str, memory: ConversationMemory):
+        self.id = session_id
+        self.model_id = model_id
+        self.role_id = role_id
+        self.memory = memory
+        self.journal = None
+        self.last_active = time.monotonic()
+        self.approx_bytes = len(memory.system_prompt['content'])
+        # 同一会话同时只允许一个生成请求
+        self.lock = asyncio.Lock()
+        self.generation: Optional[Generation] = None  # 正在进行的生成，可由 /stop 接口取消
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+
+class SessionManager:
+    """
+    在单个事件循环中管理大量会话。
+    会话按空闲时间与内存上限被淘汰，淘汰前会被持久化到对话历史。
+    """
+
+    def __init__(self, config_loader: ConfigLoader, history_saver: ConversationHistory,
+                 gateway_config: Optional[dict] = None):
+        self.config_loader = config_loader
+        self.history_saver = history_saver
+        self.memory_config = config_loader.app_config.get('memory', {})
+        self.client_config = config_loader.app_config.get('client', {})
+        gateway_config = gateway_config or {}
+        self.idle_timeout = gateway_config.get('idle_timeout', 1800)
+        self.max_sessions = gateway_config.get('max_sessions', 10000)
+        self.max_memory_bytes = gateway_config.get('max_memory_mb', 512) * 2**20
+        self.eviction_interval = gateway_config.get('eviction_interval', 30)
+        self.stream_buffer_chunks = gateway_config.get('stream_buffer_chunks', 64)
+        self.sessions: Dict[str, Session] = {}
+        self.total_bytes = 0
+        self.clients: Dict[str, BaseLLMClient] = {}
+        # 摘要模式下每个模型一个摘要器，与会话共享该模型的客户端
+        self.summarizers: Dict[str, HistorySummarizer] = {}
+        self._eviction_task: Optional[asyncio.Task] = None
+
+    # --- 生命周期 ---
+    def start(self):
+        self._eviction_task = asyncio.create_task(self._eviction_loop())
+
+    async def shutdown(self):
+        if self._eviction_task:
+            self._eviction_task.cancel()
+        for session_id in list(self.sessions):
+            await self.evict(session_id, reason="shutdown")
+        for summarizer in self.summarizers.values():
+            await summarizer.close()
+        for client in self.clients.values():
+            await client.close()
+        await close_all_clients()
+
+    def get_client(self, model_id: str) -> BaseLLMClient:
+        # 同一模型的所有会话共享一个客户端 (及其连接池)
+        client = self.clients.get(model_id)
+        if client is None:
+            client = client_factory(self.config_loader.get_model_config(model_id), self.client_config)
+            self.clients[model_id] = client
+            if self.memory_config.get('mode', 'window') == 'summary':
+                self.summarizers[model_id] = HistorySummarizer(client, self.memory_config.get('summary'))
+        return client
+
+    # --- 会话管理 ---
+    async def create(self, model_id: Optional[str], role_id: str) -> Session:
+        model_id = model_id or next(iter(self.config_loader.models), None)
+        if model_id is None:
+            raise LLMAppError("配置文件中未定义任何模型。")
+        model_config = self.config_loader.get_model_config(model_id)
+        instruction = self.config_loader.get_instruction(role_id)
+        self.get_client(model_id)
+        tokenizer = get_tokenizer(model_config.tokenizer)
+        tokenizer.preload()
+        memory = ConversationMemory(
+            instruction.template, self.memory_config.get('max_context_tokens', 3000), tokenizer,
+            **truncation_options(self.memory_config)
+        )
+        session = Session(uuid.uuid4().hex, model_id, role_id, memory)
+        self.sessions[session.id] = session
+        self.total_bytes += session.approx_bytes
+        await self._enforce_limits()
+        return session
+
+    def get(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        session.touch()
+        return session
+
+    def remember(self, session: Session, role: str, content: str) -> bool:
+        """把一条消息加入会话记忆和会话日志。会话已被淘汰 (已持久化并移出管理器) 时忽略并返回 False。"""
+        if self.sessions.get(session.id) is not session:
+            logger.info(f"会话 {session.id} 已被淘汰，丢弃其之后的 {role} 消息。")
+            return False
+        tokens = session.memory.add_message(role, content)
+        size = len(content)
+        session.approx_bytes += size
+        self.total_bytes += size
+        if self.history_saver.journal_enabled:
+            if session.journal is None:
+                session.journal = self.history_saver.start_session(
+                    session.model_id, session.role_id, session.memory.tokenizer.name
+                )
+                session.journal.append(session.memory.system_prompt, session.memory.system_prompt_tokens)
+            session.journal.append({"role": role, "content": content}, tokens)
+        return True
+
+    def _persist(self, session: Session):
+        """持久化一个会话，在工作线程中执行。"""
+        if session.journal is not None:
+            self.history_saver.end_session(session.journal)
+        elif session.memory.history and not self.history_saver.journal_enabled:
+            self.history_saver.save([session.memory.system_prompt] + session.memory.history, session.model_id)
+
+    async def evict(self, session_id: str, reason: str = "idle"):
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+        self.total_bytes -= session.approx_bytes
+        if session.generation is not None:
+            session.generation.cancel()
+        try:
+            await asyncio.to_thread(self._persist, session)
+        except LLMAppError as e:
+            logger.error(f"持久化会话 {session_id} 失败: {e}")
+        logger.info(f"会话 {session_id} 已淘汰 ({reason})。")
+
+    async def _enforce_limits(self):
+        """超出会话数或内存上限时，按最近最少活跃的顺序淘汰空闲会话。"""
+        if len(self.sessions) <= self.max_sessions and self.total_bytes <= self.max_memory_bytes:
+            return
+        for session in sorted(self.sessions.values(), key=lambda s: s.last_active):
+            if len(self.sessions) <= self.max_sessions and self.total_bytes <= self.max_memory_bytes:
+                break
+            if not session.lock.locked():
+                await self.evict(session.id, reason="memory")
+
+    async def _eviction_loop(self):
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            deadline = time.monotonic() - self.idle_timeout
+            for session in [s for s in self.sessions.values() if s.last_active < deadline]:
+                if not session.lock.locked():
+                    await self.evict(session.id, reason="idle")
+            await self._enforce_limits()
+
+    # --- 生成 ---
+    async def stream_reply(self, session: Session, content: str, timeout: Optional[float] = None,
+                           max_tokens: Optional[int] = None) -> AsyncGenerator[str, None]:
+        """
+        以 SSE 事件的形式流式返回回复。
+        上游读取与下游发送之间是一个有界队列: 客户端读得慢时队列填满，
+        生产者停止从上游读取，积压的数据被限制在 stream_buffer_chunks 个块以内。
+        生成因 /stop、timeout 或 max_tokens 提前结束时，已生成的部分照常保存，
+        结束原因在 [DONE] 之前的 finish 事件中返回。
+        """
+        client = self.get_client(session.model_id)
+        if not self.remember(session, "user", content):
+            # 请求到达后、开始生成前会话已被淘汰
+            message = f"{CLIENT_ERROR_PREFIX}: 会话已被淘汰]"
+            yield f"event: error\ndata: {json.dumps({'delta': message}, ensure_ascii=False)}\n\n"
+            yield f"event: finish\ndata: {json.dumps({'finish_reason': FINISH_CANCELLED})}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.stream_buffer_chunks)
+        parts: List[str] = []
+        generation = client.generate(session.memory.get_messages(), timeout, max_tokens, session.id)
+        session.generation = generation
+
+        async def produce():
+            try:
+                async for chunk in generation:
+                    parts.append(chunk)
+                    await queue.put(chunk)
+            except Exception as e:
+                logger.error(f"会话 {session.id} 生成回复失败: {e}", exc_info=True)
+            finally:
+                # 被取消时立即关闭上游流，而不是等待垃圾回收
+                await generation.aclose()
+            await queue.put(_STREAM_END)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is _STREAM_END:
+                    break
+                event = "error" if chunk.startswith(CLIENT_ERROR_PREFIX) else "message"
+                yield f"event: {event}\ndata: {json.dumps({'delta': chunk}, ensure_ascii=False)}\n\n"
+                session.touch()
+            yield f"event: finish\ndata: {json.dumps({'finish_reason': generation.finish_reason})}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            session.generation = None
+            # 客户端断开时取消生产者，关闭上游流以释放推理服务器的算力
+            if not producer.done():
+                producer.cancel()
+            reply = "".join(parts)
+            # 生成期间会话可能已被 DELETE 或内存淘汰，此时日志已结束、占用已扣除，不再写入部分回复
+            if reply and not reply.startswith(CLIENT_ERROR_PREFIX) and self.remember(session, "assistant", reply):
+                summarizer = self.summarizers.get(session.model_id)
+                if summarizer is not None:
+                    summarizer.schedule(session.memory)
+            session.touch()
+
+
+def create_gateway_app(config_loader: ConfigLoader, history_saver: ConversationHistory) -> FastAPI:
+    manager = SessionManager(config_loader, history_saver, config_loader.app_config.get('gateway', {}))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        manager.start()
+        yield
+        await manager.shutdown()
+
+    app = FastAPI(title="LLM App Gateway", lifespan=lifespan)
+    app.state.sessions = manager
+
+    def lookup(session_id: str) -> Session:
+        try:
+            return manager.get(session_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="会话不存在或已被淘汰。")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "sessions": len(manager.sessions)}
+
+    @app.post("/sessions")
+    async def create_session(request: CreateSessionRequest):
+        try:
+            session = await manager.create(request.model, request.role)
+        except LLMAppError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"session_id": session.id, "model": session.model_id, "role": session.role_id}
+
+    @app.get("/sessions/{session_id}")
+    async def get_session(session_id: str):
+        session = lookup(session_id)
+        return {
+            "session_id": session.id, "model": session.model_id, "role": session.role_id,
+            "messages": [session.memory.system_prompt] + session.memory.history,
+            "summarized_messages": session.memory.summarized_upto,
+            "tokens_saved": session.memory.tokens_saved_total,
+        }
+
+    @app.post("/sessions/{session_id}/messages")
+    async def send_message(session_id: str, request: MessageRequest):
+        session = lookup(session_id)
+        if session.lock.locked():
+            raise HTTPException(status_code=409, detail="该会话正在生成回复。")
+
+        async def events():
+            async with session.lock:
+                async for event in manager.stream_reply(session, request.content, request.timeout, request.max_tokens):
+                    yield event
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.post("/sessions/{session_id}/stop")
+    async def stop_generation(session_id: str):
+        session = lookup(session_id)
+        if session.generation is None:
+            return {"status": "idle"}
+        # 流式响应随即以 finish_reason=cancelled 结束，部分回复保留在会话中
+        session.generation.cancel()
+        return {"status": "stopping"}
+
+    @app.delete("/sessions/{session_id}")
+    async def delete_session(session_id: str):
+        lookup(session_id)
+        await manager.evict(session_id, reason="closed")
+        return {"status": "closed"}
+
+    return app
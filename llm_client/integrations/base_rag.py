@@ -0,0 +1,37 @@
+# llm_client/integrations/base_rag.py
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence
+
+
+@dataclass
+class RetrievedChunk:
+    """一次检索命中的文本块"""
+    id: int
+    score: float
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class BaseVectorStore(ABC):
+    """向量存储的抽象接口。向量按余弦相似度检索。"""
+
+    @abstractmethod
+    def add(self, embeddings, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]] = None) -> List[int]:
+        """追加一批向量及其对应的文本与元数据，返回分配的ID。"""
+        pass
+
+    @abstractmethod
+    def delete(self, ids: Sequence[int]):
+        """删除一批向量，其余向量的ID保持不变。"""
+        pass
+
+    @abstractmethod
+    def search(self, queries, k: int = 5) -> List[List[RetrievedChunk]]:
+        """对一批查询向量分别返回最相似的 k 个文本块。"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
@@ -0,0 +1,566 @@
+# llm_client/integrations/ingest.py
+"""
+文档导入流水线: 遍历目录 -> 进程池中流式读取并按Token分块 -> 分批计算嵌入 -> 写入向量存储。
+
+重复运行时按文件的 mtime/大小 与内容哈希跳过未变化的文件；变化的文件重新分块后，
+内容未变的块直接复用已有向量，只为新增或修改的块计算嵌入，被移除的块和已删除的文件在存储中标记删除。
+
+用法 (在项目根目录):
+    python -m llm_client.integrations.ingest docs/
+    python -m llm_client.integrations.ingest docs/ --model qwen3-4b-local --query "如何配置副本"
+"""
+import argparse
+import asyncio
+import codecs
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+import logging
+
+import msgpack
+
+from .vector_store import HEADER_FILE, MmapVectorStore
+from llm_client.core.exceptions import StorageError
+from llm_client.core.tokenizer import BaseTokenizer, get_tokenizer
+
+logger = logging.getLogger("LLM_APP")
+
+MANIFEST_FILE = "ingest_manifest.msgpack"
+_MANIFEST_VERSION = 1
+DEFAULT_EXTENSIONS = (".txt", ".md", ".markdown", ".rst")
+# 文件按块读取，单次读取的字节数
+READ_SIZE = 1 << 20
+# 没有换行符的超长文本 (如压缩过的单行文件) 累积到该字符数时强制切分
+MAX_LINE_CHARS = 1 << 16
+
+
+class TokenChunker:
+    """
+    流式分块器: 文本以任意大小的片段 feed() 进来，按行切分并批量统计Token数，
+    贪心地把行拼成不超过 chunk_tokens 个Token的块，优先在空行 (段落边界) 处断开。
+    相邻块之间保留约 chunk_overlap 个Token的重叠。拼块时按各行的Token数相加估算，
+    输出前再对拼接后的文本计数复核，因此除无法再切分的单行外，每块都不超过 chunk_tokens。
+    """
+
+    def __init__(self, tokenizer: BaseTokenizer, chunk_tokens: int = 512, chunk_overlap: int = 64):
+        self.tokenizer = tokenizer
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.chunk_overlap = max(0, min(chunk_overlap, self.chunk_tokens // 2))
+        self._buffer = ""
+        self._pieces: List[Tuple[str, int]] = []  # 当前块中的 (行, Token数)
+        self._tokens = 0
+        self._overlap = 0  # _pieces 开头从上一块保留的重叠行数
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        cut = self._buffer.rfind("\n") + 1
+        if not cut and len(self._buffer) < MAX_LINE_CHARS:
+            return []
+        if not cut:
+            cut = len(self._buffer)
+        complete, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self._consume(complete)
+
+    def finish(self) -> List[str]:
+        chunks = self._consume(self._buffer) if self._buffer else []
+        self._buffer = ""
+        while len(self._pieces) > 1 and self.tokenizer.count(self._text(self._pieces)) > self.chunk_tokens:
+            chunks.append(self._emit(0))
+        # 只剩上一块的重叠部分时不再单独输出
+        if len(self._pieces) > self._overlap and any(line.strip() for line, _ in self._pieces):
+            chunks.append(self._text(self._pieces))
+        self._pieces, self._tokens, self._overlap = [], 0, 0
+        return [c for c in chunks if c.strip()]
+
+    @staticmethod
+    def _text(pieces: List[Tuple[str, int]]) -> str:
+        return "".join(line for line, _ in pieces)
+
+    def _split_lines(self, text: str) -> List[Tuple[str, int]]:
+        lines = text.splitlines(keepends=True)
+        counts = self.tokenizer.count_batch(lines)
+        pieces = []
+        for line, count in zip(lines, counts):
+            if count <= self.chunk_tokens:
+                pieces.append((line, count))
+                continue
+            # 超长的行按字符等分，使每段约为半个块
+            parts = -(-count * 2 // self.chunk_tokens)
+            size = -(-len(line) // parts)
+            segments = [line[i:i + size] for i in range(0, len(line), size)]
+            pieces.extend(zip(segments, self.tokenizer.count_batch(segments)))
+        return pieces
+
+    def _consume(self, text: str) -> List[str]:
+        chunks = []
+        for piece in self._split_lines(text):
+            # 保留的重叠部分放不下新的行时会被丢弃，保证每块都不超过 chunk_tokens
+            while self._pieces and self._tokens + piece[1] > self.chunk_tokens:
+                chunks.append(self._emit(piece[1]))
+            self._pieces.append(piece)
+            self._tokens += piece[1]
+        return [c for c in chunks if c.strip()]
+
+    def _emit(self, incoming: int) -> str:
+        """输出一块，incoming 为下一行的Token数: 留给下一块的行与重叠部分加上它不超过 chunk_tokens。"""
+        # 在后半部分寻找最后一个空行，在段落边界处断开，剩余的行留给下一块
+        split, total = len(self._pieces), 0
+        for i, (line, count) in enumerate(self._pieces):
+            total += count
+            if not line.strip() and total >= self.chunk_tokens // 2 and i >= self._overlap:
+                split = i + 1
+        if self._tokens - sum(count for _, count in self._pieces[:split]) + incoming > self.chunk_tokens:
+            split = len(self._pieces)
+        emitted, rest = self._pieces[:split], self._pieces[split:]
+
+        # 拼接后的Token数可能大于各行之和 (跨行合并、估算取整)，按实际文本复核:
+        # 超出时先去掉开头的重叠行 (上一块已包含)，仍超出再把末尾的行退回给下一块
+        overlap_lines = self._overlap
+        text = self._text(emitted)
+        while len(emitted) > 1 and self.tokenizer.count(text) > self.chunk_tokens:
+            if overlap_lines:
+                emitted.pop(0)
+                overlap_lines -= 1
+            else:
+                rest.insert(0, emitted.pop())
+            text = self._text(emitted)
+
+        budget = min(self.chunk_overlap, self.chunk_tokens - incoming - sum(count for _, count in rest))
+        overlap, total = [], 0
+        for line, count in reversed(emitted):
+            if total + count > budget:
+                break
+            overlap.insert(0, (line, count))
+            total += count
+        self._pieces = overlap + rest
+        self._tokens = sum(count for _, count in self._pieces)
+        self._overlap = len(overlap)
+        return text
+
+
+# 分块工作进程中的分词器，由进程池的 initializer 创建
+_worker_tokenizer: Optional[BaseTokenizer] = None
+
+
+def _init_worker(tokenizer_config):
+    global _worker_tokenizer
+    _worker_tokenizer = get_tokenizer(tokenizer_config)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_file(path: str, chunk_tokens: int, chunk_overlap: int) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    在工作进程中运行: 按块读取文件，边读边计算内容哈希并分块。
+    返回 (文件内容哈希, [(块内容哈希, 块文本), ...])。
+    """
+    tokenizer = _worker_tokenizer or get_tokenizer()
+    chunker = TokenChunker(tokenizer, chunk_tokens, chunk_overlap)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    hasher = hashlib.sha256()
+    chunks: List[str] = []
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            chunks.extend(chunker.feed(decoder.decode(block)))
+    chunks.extend(chunker.feed(decoder.decode(b"", final=True)))
+    chunks.extend(chunker.finish())
+    return hasher.hexdigest(), [(content_hash(c.encode('utf-8')), c) for c in chunks]
+
+
+def iter_documents(root: str, extensions: Sequence[str]) -> Iterator[str]:
+    """按确定的顺序逐个返回目录下扩展名匹配的文件 (绝对路径)，跳过隐藏目录。"""
+    extensions = tuple(e.lower() for e in extensions)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            if name.lower().endswith(extensions):
+                yield os.path.join(dirpath, name)
+
+
+@dataclass
+class IngestReport:
+    files_scanned: int = 0
+    files_indexed: int = 0       # 新增或内容变化后重新索引的文件
+    files_unchanged: int = 0
+    files_removed: int = 0
+    files_skipped: int = 0       # 过大或读取失败的文件
+    chunks: int = 0              # 变化的文件分出的块数
+    chunks_embedded: int = 0
+    chunks_reused: int = 0       # 内容未变、直接复用已有向量的块
+    chunks_deleted: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.files_scanned / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class _FileJob:
+    """一个已分块、正在等待嵌入结果的文件。"""
+    path: str
+    mtime_ns: int
+    size: int
+    sha256: str
+    hashes: List[str]
+    rows: List[Optional[int]]
+    unused_rows: List[int]
+    remaining: int = 0
+
+
+class DocumentIngestor:
+    """
+    把目录中的文档增量导入到 MmapVectorStore。store_dir 中的向量存储由导入清单独占管理:
+    清单之外的行 (例如上次运行中途退出时写入的行) 会在下次运行开始时被标记删除。
+
+    embedder 需要提供 `async embed(texts) -> np.ndarray`，可以是任意客户端或 HashingEmbedder；
+    embedder_name 记录在清单中，换用不同的嵌入模型时需要重建存储。
+    """
+
+    def __init__(self, store_dir: str, embedder, embedder_name: str, tokenizer_config=None,
+                 chunk_tokens: int = 512, chunk_overlap: int = 64,
+                 extensions: Sequence[str] = DEFAULT_EXTENSIONS, workers: Optional[int] = None,
+                 embed_batch_size: int = 128, embed_concurrency: int = 4, max_file_mb: float = 64.0,
+                 checkpoint_interval: float = 10.0):
+        self.store_dir = store_dir
+        self.embedder = embedder
+        self.embedder_name = embedder_name
+        self.tokenizer_config = tokenizer_config
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.extensions = extensions
+        self.workers = workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.max_file_bytes = int(max_file_mb * 2**20)
+        self.checkpoint_interval = checkpoint_interval
+        self.manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+
+        self.store: Optional[MmapVectorStore] = None
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.report = IngestReport()
+        self._chunker_changed = False
+        self._buffer: List[Tuple[_FileJob, int, str]] = []  # 等待嵌入的块
+        self._embed_tasks: Set[asyncio.Task] = set()
+        self._pending_deletes: List[int] = []
+        self._last_checkpoint = 0.0
+
+    @property
+    def _chunker_settings(self) -> Dict[str, Any]:
+        return {
+            "chunk_tokens": self.chunk_tokens,
+            "chunk_overlap": self.chunk_overlap,
+            "tokenizer": get_tokenizer(self.tokenizer_config).name,
+        }
+
+    # ---- 清单与存储 ----
+
+    def _load(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'rb') as f:
+                    manifest = msgpack.unpackb(f.read(), raw=False)
+            except Exception as e:
+                logger.warning(f"导入清单 '{self.manifest_path}' 无法读取 ({e})，将重新索引全部文件。")
+        if manifest.get("version") != _MANIFEST_VERSION:
+            manifest = {}
+        self.files = manifest.get("files", {})
+        if self.files and manifest.get("embedder") != self.embedder_name:
+            raise StorageError(
+                f"向量存储 '{self.store_dir}' 由嵌入模型 '{manifest.get('embedder')}' 构建，"
+                f"当前为 '{self.embedder_name}'，请使用 --rebuild 重建。"
+            )
+        self._chunker_changed = bool(self.files) and manifest.get("chunker") != self._chunker_settings
+
+        if os.path.exists(os.path.join(self.store_dir, HEADER_FILE)):
+            self.store = MmapVectorStore(self.store_dir)
+            self._reconcile()
+        else:
+            self.files = {}
+
+    def _reconcile(self):
+        """让存储与清单一致: 引用了已删除行的文件重新索引，清单之外的行标记删除。"""
+        live = set(self.store.live_ids().tolist())
+        referenced = set()
+        for path, entry in list(self.files.items()):
+            rows = [row for _, row in entry["chunks"]]
+            if not all(row in live for row in rows):
+                del self.files[path]
+                continue
+            referenced.update(rows)
+        orphans = live - referenced
+        if orphans:
+            logger.warning(f"向量存储中有 {len(orphans)} 行不在导入清单中 (可能来自中断的运行)，已标记删除。")
+            self.store.delete(sorted(orphans))
+
+    def _open_store(self, dim: int) -> MmapVectorStore:
+        if self.store is None:
+            self.store = MmapVectorStore(self.store_dir, dim=dim)
+        elif self.store.dim != dim:
+            raise StorageError(
+                f"向量存储 '{self.store_dir}' 的维度为 {self.store.dim}，嵌入模型 '{self.embedder_name}' "
+                f"输出的维度为 {dim}，请使用 --rebuild 重建。"
+            )
+        return self.store
+
+    def _checkpoint(self, force: bool = False):
+        """先写清单再执行删除: 两步之间中断只会留下清单之外的行，下次运行时会被清理。"""
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.checkpoint_interval:
+            return
+        self._last_checkpoint = now
+        manifest = {
+            "version": _MANIFEST_VERSION,
+            "embedder": self.embedder_name,
+            "chunker": self._chunker_settings,
+            "files": self.files,
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(msgpack.packb(manifest, use_bin_type=True))
+        os.replace(tmp_path, self.manifest_path)
+        if self._pending_deletes and self.store is not None:
+            self.store.delete(self._pending_deletes)
+            self.report.chunks_deleted += len(self._pending_deletes)
+        self._pending_deletes = []
+
+    # ---- 分块结果与嵌入 ----
+
+    def _accept(self, path: str, st: os.stat_result, sha256: str, chunks: List[Tuple[str, str]]):
+        entry = self.files.get(path)
+        if entry is not None and entry["sha256"] == sha256 and not self._chunker_changed:
+            # 只是 mtime 变了 (例如被 touch 或重新检出)
+            entry.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+            self.report.files_unchanged += 1
+            return
+        self.report.chunks += len(chunks)
+
+        available: Dict[str, List[int]] = {}
+        for chunk_hash, row in (entry["chunks"] if entry else []):
+            available.setdefault(chunk_hash, []).append(row)
+        job = _FileJob(path, st.st_mtime_ns, st.st_size, sha256,
+                       [h for h, _ in chunks], [None] * len(chunks), [])
+        for index, (chunk_hash, text) in enumerate(chunks):
+            if available.get(chunk_hash):
+                job.rows[index] = available[chunk_hash].pop()
+                self.report.chunks_reused += 1
+            else:
+                self._buffer.append((job, index, text))
+                job.remaining += 1
+        job.unused_rows = [row for rows in available.values() for row in rows]
+        if job.remaining == 0:
+            self._finish(job)
+        self._pump()
+
+    def _finish(self, job: _FileJob):
+        self.files[job.path] = {
+            "mtime_ns": job.mtime_ns, "size": job.size, "sha256": job.sha256,
+            "chunks": [[h, row] for h, row in zip(job.hashes, job.rows)],
+        }
+        self._pending_deletes.extend(job.unused_rows)
+        self.report.files_indexed += 1
+        self._checkpoint()
+
+    def _pump(self, final: bool = False):
+        """在并发上限内，把缓冲区中的块按批发给嵌入。"""
+        while self._buffer and len(self._embed_tasks) < self.embed_concurrency and (
+                final or len(self._buffer) >= self.embed_batch_size):
+            batch, self._buffer = self._buffer[:self.embed_batch_size], self._buffer[self.embed_batch_size:]
+            task = asyncio.ensure_future(self._embed(batch))
+            self._embed_tasks.add(task)
+            task.add_done_callback(self._embed_tasks.discard)
+
+    async def _embed(self, batch: List[Tuple[_FileJob, int, str]]):
+        texts = [text for _, _, text in batch]
+        vectors = await self.embedder.embed(texts)
+        metadatas = [{"source": job.path, "chunk": index, "hash": job.hashes[index]} for job, index, _ in batch]
+        ids = self._open_store(vectors.shape[1]).add(vectors, texts, metadatas)
+        self.report.chunks_embedded += len(batch)
+        for (job, index, _), row in zip(batch, ids):
+            job.rows[index] = row
+            job.remaining -= 1
+            if job.remaining == 0:
+                self._finish(job)
+
+    async def _wait_embeds(self, final: bool = False):
+        """等待至少一个 (final 时为全部) 嵌入批次完成，并把失败抛给调用方。"""
+        while self._embed_tasks:
+            done, _ = await asyncio.wait(self._embed_tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+            self._pump(final)
+            if not final:
+                return
+
+    # ---- 主流程 ----
+
+    async def run(self, root: str) -> IngestReport:
+        start = time.perf_counter()
+        self.report = IngestReport()
+        self._load()
+        root = os.path.abspath(root)
+        seen: Set[str] = set()
+        loop = asyncio.get_running_loop()
+        # 分块结果与待嵌入的块都有上限，内存占用不随文档总量增长
+        max_pending_files = self.workers * 2
+        max_buffered_chunks = self.embed_batch_size * self.embed_concurrency * 2
+
+        async def process(path: str, st: os.stat_result):
+            try:
+                sha256, chunks = await loop.run_in_executor(
+                    pool, chunk_file, path, self.chunk_tokens, self.chunk_overlap
+                )
+            except OSError as e:
+                logger.warning(f"读取文件 '{path}' 失败: {e}")
+                self.report.files_skipped += 1
+                return
+            self._accept(path, st, sha256, chunks)
+
+        # spawn 启动的工作进程不继承事件循环和后台线程的状态
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(self.tokenizer_config,)) as pool:
+            chunk_tasks: Set[asyncio.Task] = set()
+            try:
+                for path in iter_documents(root, self.extensions):
+                    seen.add(path)
+                    self.report.files_scanned += 1
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entry = self.files.get(path)
+                    if (entry is not None and not self._chunker_changed
+                            and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size):
+                        self.report.files_unchanged += 1
+                        continue
+                    if st.st_size > self.max_file_bytes:
+                        logger.warning(f"跳过过大的文件 '{path}' ({st.st_size / 2**20:.1f} MB)")
+                        self.report.files_skipped += 1
+                        continue
+
+                    while len(chunk_tasks) >= max_pending_files:
+                        done, chunk_tasks = await asyncio.wait(chunk_tasks, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+                    while len(self._buffer) >= max_buffered_chunks:
+                        await self._wait_embeds()
+                    chunk_tasks.add(asyncio.ensure_future(process(path, st)))
+
+                if chunk_tasks:
+                    for task in await asyncio.gather(*chunk_tasks, return_exceptions=True):
+                        if isinstance(task, BaseException):
+                            raise task
+                self._pump(final=True)
+                await self._wait_embeds(final=True)
+            finally:
+                for task in chunk_tasks | self._embed_tasks:
+                    task.cancel()
+
+        for path, entry in list(self.files.items()):
+            if path.startswith(root + os.sep) and path not in seen:
+                self._pending_deletes.extend(row for _, row in entry["chunks"])
+                del self.files[path]
+                self.report.files_removed += 1
+        self._checkpoint(force=True)
+        self.report.elapsed = time.perf_counter() - start
+        return self.report
+
+
+def main():
+    from llm_client.clients.embeddings import HashingEmbedder
+    from llm_client.clients.http_pool import close_all_clients
+    from llm_client.clients.openai_client import client_factory
+    from llm_client.core.config_loader import ConfigLoader
+
+    parser = argparse.ArgumentParser(description="把目录中的文档导入向量存储")
+    parser.add_argument("root", help="要导入的文档目录")
+    parser.add_argument("--model", type=str, default=None,
+                        help="用于计算嵌入的模型ID，默认取 ingest.embedding_model，为空时使用本地 HashingEmbedder")
+    parser.add_argument("--store", type=str, default=None, help="向量存储目录，默认取 ingest.store_dir")
+    parser.add_argument("--workers", type=int, default=None, help="分块进程数")
+    parser.add_argument("--rebuild", action="store_true", help="清空向量存储和导入清单后全量导入")
+    parser.add_argument("--query", type=str, default=None, help="导入完成后执行一次检索")
+    parser.add_argument("-k", type=int, default=5, help="检索返回的块数")
+    args = parser.parse_args()
+
+    config_loader = ConfigLoader(
+        app_config_path='configs/app_config.yaml',
+        models_config_path='configs/models_config.yaml'
+    )
+    ingest_config = config_loader.app_config.get('ingest', {})
+    store_dir = args.store or ingest_config.get('store_dir', 'data/vector_storage/')
+    model_id = args.model or ingest_config.get('embedding_model')
+    if model_id:
+        model_config = config_loader.get_model_config(model_id)
+        embedder = client_factory(model_config, config_loader.app_config.get('client', {}))
+        embedder_name = f"{model_id}:{model_config.embedding.model_name or model_config.model_name}"
+        tokenizer_config = model_config.tokenizer
+    else:
+        dim = ingest_config.get('hashing_dim', 256)
+        embedder = HashingEmbedder(dim)
+        embedder_name = f"hashing:{dim}"
+        tokenizer_config = None
+
+    if args.rebuild:
+        MmapVectorStore.remove(store_dir)
+        if os.path.exists(os.path.join(store_dir, MANIFEST_FILE)):
+            os.remove(os.path.join(store_dir, MANIFEST_FILE))
+
+    ingestor = DocumentIngestor(
+        store_dir, embedder, embedder_name, tokenizer_config,
+        chunk_tokens=ingest_config.get('chunk_tokens', 512),
+        chunk_overlap=ingest_config.get('chunk_overlap', 64),
+        extensions=ingest_config.get('extensions') or DEFAULT_EXTENSIONS,
+        workers=args.workers or ingest_config.get('workers'),
+        embed_batch_size=ingest_config.get('embed_batch_size', 128),
+        embed_concurrency=ingest_config.get('embed_concurrency', 4),
+        max_file_mb=ingest_config.get('max_file_mb', 64),
+    )
+
+    async def run():
+        try:
+            report = await ingestor.run(args.root)
+            results = None
+            if args.query and ingestor.store is not None:
+                query_vector = await embedder.embed([args.query])
+                results = ingestor.store.search(query_vector, k=args.k)[0]
+            return report, results
+        finally:
+            if model_id:
+                await embedder.close()
+                await close_all_clients()
+
+    report, results = asyncio.run(run())
+    print(f"导入完成 ({report.elapsed:.2f}s): 扫描 {report.files_scanned} 个文件, "
+          f"重新索引 {report.files_indexed} 个, 未变化 {report.files_unchanged} 个, "
+          f"移除 {report.files_removed} 个, 跳过 {report.files_skipped} 个。")
+    print(f"分块 {report.chunks} 个: 新计算嵌入 {report.chunks_embedded} 个, "
+          f"复用 {report.chunks_reused} 个, 删除 {report.chunks_deleted} 个。")
+    print(f"吞吐量: {report.docs_per_second:,.1f} docs/s, {report.chunks_per_second:,.1f} chunks/s")
+
+    if results is not None:
+        print(f"\n检索 '{args.query}':")
+        for chunk in results:
+            preview = " ".join(chunk.text.split())[:100]
+            print(f"- [{chunk.score:.3f}] {chunk.metadata.get('source')}#{chunk.metadata.get('chunk')}: {preview}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# llm_client/integrations/vector_store.py
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+
+import msgpack
+import numpy as np
+
+from .base_rag import BaseVectorStore, RetrievedChunk
+from llm_client.core.exceptions import StorageError
+
+logger = logging.getLogger("LLM_APP")
+
+HEADER_FILE = "store.json"
+VECTORS_FILE = "vectors.bin"
+SCALES_FILE = "scales.f32"
+META_FILE = "meta.msgpack"
+OFFSETS_FILE = "meta.idx"
+TOMBSTONES_FILE = "deleted.u64"
+# 分块计算相似度，限制 int8 反量化等临时数组的内存占用
+SEARCH_BLOCK_ROWS = 32768
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class MmapVectorStore(BaseVectorStore):
+    """
+    基于内存映射文件的向量存储。
+
+    - 向量归一化后以 float32 (或按行对称量化的 int8) 行矩阵追加写入 vectors.bin，
+      检索时通过 np.memmap 映射，由操作系统按需分页，常驻内存远小于矩阵本身。
+    - 文本与元数据以 msgpack 记录追加写入 meta.msgpack，meta.idx 保存每条记录的偏移量，
+      检索结果只需按偏移读取命中的记录。
+    - 追加只写入文件末尾，从不重写已有数据。vectors.bin 最后写入；打开存储时和每次追加前，
+      各文件都会被截断到一致的行数，因此写入中途崩溃留下的不完整的行会被丢弃，不会与之后追加的行错位。
+    - 删除同样是追加: 被删除行的ID写入 deleted.u64 (墓碑)，检索时跳过，行ID保持不变。
+    """
+
+    def __init__(self, directory: str, dim: Optional[int] = None, dtype: str = "float32"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        header_path = os.path.join(directory, HEADER_FILE)
+        if os.path.exists(header_path):
+            with open(header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            if dim is not None and dim != header["dim"]:
+                raise StorageError(f"向量维度不匹配: 存储为 {header['dim']}，请求为 {dim}")
+            self.dim, self.dtype = header["dim"], header["dtype"]
+        else:
+            if dim is None:
+                raise StorageError(f"向量存储 '{directory}' 不存在，创建时必须指定维度。")
+            if dtype not in ("float32", "int8"):
+                raise StorageError(f"不支持的向量类型: '{dtype}'")
+            self.dim, self.dtype = dim, dtype
+            with open(header_path, 'w', encoding='utf-8') as f:
+                json.dump({"dim": dim, "dtype": dtype, "version": 1}, f)
+
+        self._np_dtype = np.float32 if self.dtype == "float32" else np.int8
+        self._row_bytes = self.dim * np.dtype(self._np_dtype).itemsize
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._deleted: Optional[np.ndarray] = None  # 按行的删除标记
+        self._mapped_count = -1
+        self._mapped_tombstones = -1
+        self._repair()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _rows(self) -> int:
+        """已写入的完整行数 (包括已删除的行)。"""
+        rows = min(self._file_size(self._path(VECTORS_FILE)) // self._row_bytes,
+                   self._file_size(self._path(OFFSETS_FILE)) // 8)
+        if self.dtype == "int8":
+            rows = min(rows, self._file_size(self._path(SCALES_FILE)) // 4)
+        return rows
+
+    def _repair(self) -> int:
+        """把各文件截断到一致的行数，丢弃上次写入中途崩溃留下的部分行。返回一致的行数。"""
+        count = self._rows()
+        sizes = [(VECTORS_FILE, count * self._row_bytes), (OFFSETS_FILE, count * 8)]
+        if self.dtype == "int8":
+            sizes.append((SCALES_FILE, count * 4))
+        sizes.append((META_FILE, self._meta_end(count)))
+        for name, size in sizes:
+            path = self._path(name)
+            if self._file_size(path) > size:
+                logger.warning(f"向量存储 '{self.directory}' 的 {name} 含有未完成的写入，已截断到 {count} 行。")
+                os.truncate(path, size)
+
+        # 指向被丢弃行的墓碑也要移除，否则会误删之后追加到同一ID的行
+        tombstones_path = self._path(TOMBSTONES_FILE)
+        tombstones = self._file_size(tombstones_path)
+        if tombstones:
+            ids = np.fromfile(tombstones_path, dtype=np.uint64, count=tombstones // 8)
+            if tombstones % 8 or (ids >= count).any():
+                tmp_path = tombstones_path + ".tmp"
+                ids[ids < count].tofile(tmp_path)
+                os.replace(tmp_path, tombstones_path)
+        return count
+
+    def _meta_end(self, count: int) -> int:
+        """前 count 行元数据记录的结束位置。"""
+        if count == 0:
+            return 0
+        offsets_path = self._path(OFFSETS_FILE)
+        if self._file_size(offsets_path) >= (count + 1) * 8:
+            return int(np.fromfile(offsets_path, dtype=np.uint64, count=1, offset=count * 8)[0])
+        last = int(np.fromfile(offsets_path, dtype=np.uint64, count=1, offset=(count - 1) * 8)[0])
+        with open(self._path(META_FILE), 'rb') as f:
+            f.seek(last)
+            unpacker = msgpack.Unpacker(f, raw=False)
+            next(unpacker)
+            return last + unpacker.tell()
+
+    def __len__(self) -> int:
+        self._refresh()
+        return self._mapped_count - int(self._deleted.sum())
+
+    def _refresh(self):
+        """行数或墓碑变化后重新建立内存映射和删除标记。"""
+        count = self._rows()
+        tombstones = self._file_size(self._path(TOMBSTONES_FILE))
+        if count == self._mapped_count and tombstones == self._mapped_tombstones:
+            return
+        self._mapped_tombstones = tombstones
+        self._deleted = np.zeros(count, dtype=bool)
+        if tombstones:
+            ids = np.fromfile(self._path(TOMBSTONES_FILE), dtype=np.uint64, count=tombstones // 8)
+            self._deleted[ids[ids < count].astype(np.int64)] = True
+        if count == self._mapped_count:
+            return
+        self._mapped_count = count
+        if count == 0:
+            self._matrix = np.empty((0, self.dim), dtype=self._np_dtype)
+            self._scales = np.empty(0, dtype=np.float32)
+            self._offsets = np.empty(0, dtype=np.uint64)
+            return
+        self._matrix = np.memmap(self._path(VECTORS_FILE), dtype=self._np_dtype, mode='r', shape=(count, self.dim))
+        self._offsets = np.memmap(self._path(OFFSETS_FILE), dtype=np.uint64, mode='r', shape=(count,))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._path(SCALES_FILE), dtype=np.float32, mode='r', shape=(count,))
+
+    def add(self, embeddings, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]] = None) -> List[int]:
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) != len(texts):
+            raise StorageError("向量数量与文本数量不一致。")
+        metadatas = metadatas or [{}] * len(texts)
+        if len(metadatas) != len(texts):
+            raise StorageError("元数据数量与文本数量不一致。")
+        vectors = _normalize(vectors)
+        start = self._repair()
+
+        # 1. 元数据记录与偏移量
+        meta_path = self._path(META_FILE)
+        offset = self._file_size(meta_path)
+        offsets = np.empty(len(texts), dtype=np.uint64)
+        packer = msgpack.Packer(use_bin_type=True)
+        with open(meta_path, 'ab') as f:
+            for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+                record = packer.pack({"text": text, "metadata": metadata})
+                offsets[i] = offset
+                f.write(record)
+                offset += len(record)
+        with open(self._path(OFFSETS_FILE), 'ab') as f:
+            f.write(offsets.tobytes())
+
+        # 2. 向量 (int8 模式下按行对称量化，并记录每行的缩放系数)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            rows = np.round(vectors / scales[:, None]).astype(np.int8)
+            with open(self._path(SCALES_FILE), 'ab') as f:
+                f.write(scales.astype(np.float32).tobytes())
+        else:
+            rows = vectors
+        with open(self._path(VECTORS_FILE), 'ab') as f:
+            f.write(rows.tobytes())
+
+        return list(range(start, start + len(texts)))
+
+    def delete(self, ids: Sequence[int]):
+        """把一批行标记为已删除。已删除的行不再出现在检索结果中，其余行的ID不变。"""
+        ids = np.asarray(list(ids), dtype=np.uint64)
+        if not len(ids):
+            return
+        if int(ids.max()) >= self._rows():
+            raise StorageError(f"要删除的行ID {int(ids.max())} 不存在。")
+        with open(self._path(TOMBSTONES_FILE), 'ab') as f:
+            f.write(ids.tobytes())
+
+    def live_ids(self) -> np.ndarray:
+        """所有未删除行的ID。"""
+        self._refresh()
+        return np.flatnonzero(~self._deleted)
+
+    @staticmethod
+    def remove(directory: str):
+        """删除目录中的存储文件，目录本身及其他文件保留。"""
+        for name in (HEADER_FILE, VECTORS_FILE, SCALES_FILE, META_FILE, OFFSETS_FILE, TOMBSTONES_FILE):
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _read_record(self, meta_file, row: int) -> Dict[str, Any]:
+        meta_file.seek(int(self._offsets[row]))
+        unpacker = msgpack.Unpacker(meta_file, raw=False)
+        return next(unpacker)
+
+    def search(self, queries, k: int = 5) -> List[List[RetrievedChunk]]:
+        self._refresh()
+        q = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        count = self._mapped_count
+        if count == 0 or k <= 0:
+            return [[] for _ in range(len(q))]
+        k = min(k, count)
+
+        best_scores = np.empty((len(q), 0), dtype=np.float32)
+        best_ids = np.empty((len(q), 0), dtype=np.int64)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            block = self._matrix[start:start + SEARCH_BLOCK_ROWS]
+            if self.dtype == "int8":
+                scores = (q @ block.T.astype(np.float32)) * self._scales[start:start + len(block)]
+            else:
+                scores = q @ block.T
+            deleted = self._deleted[start:start + len(block)]
+            if deleted.any():
+                scores[:, deleted] = -np.inf
+            # 每个分块只保留 top-k 候选，再与之前的候选合并
+            kk = min(k, scores.shape[1])
+            idx = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, idx, axis=1)], axis=1)
+            best_ids = np.concatenate([best_ids, idx + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+
+        results: List[List[RetrievedChunk]] = []
+        with open(self._path(META_FILE), 'rb') as meta_file:
+            for row_ids, row_scores in zip(best_ids, best_scores):
+                chunks = []
+                for row, score in zip(row_ids, row_scores):
+                    if score == -np.inf:
+                        # 未删除的行不足 k 条
+                        break
+                    record = self._read_record(meta_file, int(row))
+                    chunks.append(RetrievedChunk(int(row), float(score), record["text"], record["metadata"]))
+                results.append(chunks)
+        return results
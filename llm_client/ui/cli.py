@@ -1,12 +1,122 @@
 # llm_client/ui/cli.py
+import asyncio
+import time
+from typing import TYPE_CHECKING, List, Optional
 from rich.console import Console
-from rich.markdown import Markdown
+from rich.markup import escape
 from rich.panel import Panel
 from rich.table import Table
 
+if TYPE_CHECKING:
+    from rich.live import Live
+
+class StreamRenderer:
+    """
+    流式回复的渲染器。块先缓存在列表中，按固定帧率批量输出，避免逐块写终端。
+    markdown 模式下，已经完整的段落 (代码块之外的空行之前的内容) 只渲染一次并固定在上方，
+    Live 区域只重绘仍在变化的末尾段落。
+    帧内到达的块在事件循环中用定时器补刷，服务器停顿时已收到的文本最多延迟一帧显示。
+    """
+
+    def __init__(self, console: Console, markdown: bool = False, refresh_per_second: float = 20):
+        self.console = console
+        self.markdown = markdown
+        self.frame_interval = 1.0 / refresh_per_second if refresh_per_second > 0 else 0.0
+        self._parts: List[str] = []      # 全部回复块，结束时一次性拼接
+        self._pending: List[str] = []    # 上一帧之后新到达的块
+        self._tail = ""                  # markdown 模式下尚未固定的末尾段落
+        self._last_flush = 0.0
+        self._live: Optional["Live"] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.frames = 0
+
+    def __enter__(self) -> "StreamRenderer":
+        if self.markdown:
+            # Markdown 渲染依赖 markdown-it，仅在 markdown 模式下才导入
+            from rich.live import Live
+
+            self._live = Live(console=self.console, auto_refresh=False, transient=False)
+            self._live.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._flush()
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        else:
+            self.console.out("")
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str):
+        self._parts.append(chunk)
+        self._pending.append(chunk)
+        now = time.perf_counter()
+        if now - self._last_flush >= self.frame_interval:
+            self._flush()
+            self._last_flush = now
+        elif self._timer is None:
+            # 下一块可能迟迟不到，到帧结束时补刷一次
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._timer = loop.call_later(self.frame_interval - (now - self._last_flush), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._flush()
+        self._last_flush = time.perf_counter()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        new_text = "".join(self._pending)
+        self._pending.clear()
+        self.frames += 1
+        if self._live is None:
+            self.console.out(new_text, end="", highlight=False)
+            return
+
+        from rich.markdown import Markdown
+
+        self._tail += new_text
+        split = self._stable_prefix_length(self._tail)
+        if split:
+            # 完整的段落渲染一次后固定输出，不再参与重绘
+            self._live.console.print(Markdown(self._tail[:split]))
+            self._tail = self._tail[split:]
+        self._live.update(Markdown(self._tail), refresh=True)
+
+    @staticmethod
+    def _stable_prefix_length(text: str) -> int:
+        """返回可以安全固定的前缀长度: 最后一个位于代码块之外的空行之后的位置。"""
+        in_fence = False
+        split = 0
+        pos = 0
+        for line in text.splitlines(keepends=True):
+            pos += len(line)
+            if line.lstrip().startswith("```"):
+                in_fence = not in_fence
+            elif not in_fence and not line.strip() and line.endswith("\n") and pos < len(text):
+                split = pos
+        return split
+
 class RichCLI_UI:
-    def __init__(self):
+    def __init__(self, ui_config: Optional[dict] = None):
         self.console = Console()
+        stream_config = (ui_config or {}).get('stream_render', {})
+        self.stream_markdown = stream_config.get('mode', 'plain') == 'markdown'
+        self.stream_refresh_per_second = stream_config.get('refresh_per_second', 20)
+
+    def create_stream_renderer(self) -> StreamRenderer:
+        return StreamRenderer(self.console, self.stream_markdown, self.stream_refresh_per_second)
 
     def display_system_message(self, message: str, title: str = "System"):
         self.console.print(Panel(message, title=f"[bold yellow]{title}[/bold yellow]", border_style="yellow"))
@@ -23,6 +133,68 @@ class RichCLI_UI:
         """打印助手的回复头部，并确保换行"""
         self.console.print("\n[bold magenta]Assistant:[/bold magenta]")
 
+    def display_search_results(self, query: str, results: list, elapsed_ms: float):
+        if not results:
+            self.display_system_message(f"没有找到与 '{escape(query)}' 相关的历史对话。", "Search")
+            return
+        table = Table(title=f"[bold]搜索 '{escape(query)}': {len(results)} 条结果 ({elapsed_ms:.1f}ms)[/bold]")
+        table.add_column("时间", style="cyan", no_wrap=True)
+        table.add_column("模型", style="green")
+        table.add_column("角色")
+        table.add_column("片段")
+        for result in results:
+            # 先转义原文中的方括号，再把命中标记替换为高亮样式
+            snippet = escape(result.snippet.replace("\n", " "))
+            snippet = snippet.replace("\x02", "[bold yellow]").replace("\x03", "[/bold yellow]")
+            table.add_row((result.timestamp or "")[:19], result.model or "", result.role, snippet)
+        self.console.print(table)
+
+    def display_stats(self, stats: dict):
+        if not stats:
+            self.display_system_message("当前进程还没有完成的请求。", "Stats")
+            return
+        table = Table(title="[bold]请求延迟与吞吐量 (当前进程)[/bold]")
+        table.add_column("模型", style="green")
+        table.add_column("指标", style="cyan")
+        for column in ("样本数", "p50", "p95", "p99"):
+            table.add_column(column, justify="right")
+        metric_names = [
+            ("ttft", "首Token延迟 (ms)", 1000), ("itl", "Token间隔 (ms)", 1000),
+            ("e2e", "端到端延迟 (ms)", 1000), ("tokens_per_second", "生成速度 (tokens/s)", 1),
+        ]
+        for model, metrics in stats.items():
+            totals = metrics.get("totals", {})
+            table.add_row(model, "请求数 / Token数", f"{totals.get('requests', 0)} / {totals.get('tokens', 0)}", "", "", "")
+            if "hedges_fired" in totals:
+                table.add_row("", "对冲触发 / 获胜", f"{totals['hedges_fired']} / {totals['hedges_won']}", "", "", "")
+            for key, label, scale in metric_names:
+                summary = metrics.get(key)
+                if summary:
+                    table.add_row("", label, str(summary["count"]),
+                                  *(f"{summary[q] * scale:.1f}" for q in ("p50", "p95", "p99")))
+        self.console.print(table)
+
+    def display_sessions(self, sessions: list):
+        if not sessions:
+            self.display_system_message("还没有保存的历史会话。", "Sessions")
+            return
+        table = Table(title="[bold]最近的会话 ( /resume <编号> 恢复 )[/bold]")
+        table.add_column("#", justify="right", style="cyan")
+        table.add_column("时间", no_wrap=True)
+        table.add_column("模型", style="green")
+        table.add_column("角色")
+        table.add_column("消息数", justify="right")
+        table.add_column("标题")
+        for number, entry in enumerate(sessions, 1):
+            table.add_row(str(number), (entry.get("updated") or "")[:16].replace("T", " "), entry.get("model") or "",
+                          entry.get("role") or "", str(entry.get("messages", "")), escape(entry.get("title") or ""))
+        self.console.print(table)
+
+    def display_last_reply(self, content: str):
+        """恢复会话后显示上一条助手回复，便于接着对话。"""
+        self.display_assistant_header()
+        self.console.out(content, highlight=False)
+
     def get_user_input(self) -> str:
         # 在用户输入前也加一个换行，让布局更宽松
         return self.console.input("\n[bold green]You: [/bold green]")
@@ -33,10 +205,15 @@ class RichCLI_UI:
         table.add_column("描述")
         
         table.add_row("/exit, /quit", "退出程序并保存当前对话。")
+        table.add_row("/stop, Ctrl-C", "停止正在进行的生成，保留已收到的部分回复。")
         table.add_row("/clear", "清空当前对话历史。")
         table.add_row("/save", "手动保存当前对话。")
         table.add_row("/role <角色ID>", "切换一个新的系统角色并开始新对话。")
         table.add_row("/roles", "列出所有可用的系统角色。")
+        table.add_row("/cache", "显示补全缓存的命中统计。")
+        table.add_row("/search <关键词>", "全文搜索已保存的历史对话。")
+        table.add_row("/resume [编号]", "列出最近的会话，或恢复指定编号的会话。")
+        table.add_row("/stats", "显示当前进程的请求延迟与吞吐量分位数。")
         table.add_row("/help", "显示此帮助信息。")
         
         self.console.print(table)
@@ -19,14 +19,20 @@ def main():
         logger = setup_logger(app_config.get('logging', {}))
         
         # 3. 初始化存储和记忆模块配置
+        storage_config = app_config.get('storage', {})
         history_saver = ConversationHistory(
-            storage_dir=app_config.get('storage', {}).get('history_dir', 'data/history')
+            storage_dir=storage_config.get('history_dir', 'data/history'),
+            journal_config=storage_config.get('journal')
         )
         memory_config = app_config.get('memory', {})
 
         # 4. 创建并运行应用
         app = CommandLineApp(config_loader, history_saver, memory_config)
-        app.run()
+        try:
+            app.run()
+        finally:
+            # 等待后台日志线程把剩余记录写入磁盘
+            history_saver.close()
 
     except LLMAppError as e:
         print(f"\n[应用启动失败]: {e}")
@@ -0,0 +1,43 @@
+# serve.py
+import argparse
+import uvicorn
+from llm_client.gateway import create_gateway_app
+from llm_client.core.config_loader import ConfigLoader
+from llm_client.core.storage import ConversationHistory
+from llm_client.core.logger import setup_logger
+from llm_client.core.exceptions import LLMAppError
+import logging
+
+def main():
+    try:
+        config_loader = ConfigLoader(
+            app_config_path='configs/app_config.yaml',
+            models_config_path='configs/models_config.yaml'
+        )
+        app_config = config_loader.app_config
+        setup_logger(app_config.get('logging', {}))
+        gateway_config = app_config.get('gateway', {})
+
+        parser = argparse.ArgumentParser(description="以HTTP网关模式运行，为多个并发会话提供流式对话接口")
+        parser.add_argument("--host", type=str, default=gateway_config.get('host', '127.0.0.1'))
+        parser.add_argument("--port", type=int, default=gateway_config.get('port', 8080))
+        args = parser.parse_args()
+
+        storage_config = app_config.get('storage', {})
+        history_saver = ConversationHistory(
+            storage_dir=storage_config.get('history_dir', 'data/history'),
+            journal_config=storage_config.get('journal')
+        )
+        app = create_gateway_app(config_loader, history_saver)
+        try:
+            uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+        finally:
+            history_saver.close()
+
+    except LLMAppError as e:
+        print(f"\n[网关启动失败]: {e}")
+        logging.basicConfig()
+        logging.critical(f"网关启动失败: {e}", exc_info=True)
+
+if __name__ == "__main__":
+    main()